@@ -10,17 +10,25 @@
 ╚════════════════════════════════════════════════════════════════════════════════════════════════════╝
 """
 
+import time
+
+# Riferimento per i tempi di avvio mostrati nella sidebar
+_SCRIPT_START = time.perf_counter()
+
 import streamlit as st
-import yfinance as yf
 import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 from datetime import datetime, timedelta
-from pypfopt import expected_returns, risk_models, EfficientFrontier, EfficientSemivariance, HRPOpt
-from scipy.optimize import minimize, Bounds
+import sqlite3
 import warnings
 
+from optimizer_core import (
+    DEFAULT_SECTOR_LIMITS, IMPORT_TIMINGS, CORR_ANNOTATE_MAX_ASSETS,
+    PriceStore, PriceWindowCache, load_prices, build_weekly_panel,
+    BenchmarkAnalyzer, PortfolioOptimizer, ResultCache, FigureCache, results_fingerprint,
+)
+
+_IMPORT_SECONDS = time.perf_counter() - _SCRIPT_START
+
 warnings.filterwarnings('ignore')
 
 # ════════════════════════════════════════════════════════════════════════════════
@@ -216,44 +224,31 @@ FTXL
 CTEK
 HNSC"""
 
-BENCHMARK_CANDIDATES = [
-    {'ticker': 'SPY', 'name': 'S&P 500'},
-    {'ticker': 'QQQ', 'name': 'NASDAQ 100'},
-    {'ticker': 'VTI', 'name': 'Total US'},
-    {'ticker': 'XLK', 'name': 'Tech SPDR'},
-    {'ticker': 'SMH', 'name': 'Semiconductor'},
-    {'ticker': 'VUG', 'name': 'Growth'},
-]
 
-DEFAULT_SECTOR_MAP = {
-    'SXLK': 'Technology', 'XDWT': 'Technology', 'XLK': 'Technology', 'VGT': 'Technology', 'IYW': 'Technology',
-    'CSNDX': 'NASDAQ', 'NQSE': 'NASDAQ', 'QQQ': 'NASDAQ', 'TQQQ': 'NASDAQ',
-    'AIQ': 'AI', 'WTAI': 'AI', 'BOTZ': 'AI', 'ROBO': 'AI', 'IRBO': 'AI',
-    'SMH': 'Semiconductor', 'SOXX': 'Semiconductor', 'FTXL': 'Semiconductor', 'HNSC': 'Semiconductor', 'PSI': 'Semiconductor',
-    'WTEC': 'Cloud', 'SKYY': 'Cloud', 'CLOU': 'Cloud', 'XNGI': 'Cloud', 'WCLD': 'Cloud',
-    'SIXG': 'EmergingTech', 'QTUM': 'EmergingTech', 'ARKQ': 'EmergingTech', 'ARKG': 'EmergingTech',
-    'CTEK': 'CleanEnergy', 'ICLN': 'CleanEnergy', 'TAN': 'CleanEnergy', 'QCLN': 'CleanEnergy',
-    'SEME': 'EmergingMarkets', 'EEM': 'EmergingMarkets', 'VWO': 'EmergingMarkets', 'IEMG': 'EmergingMarkets',
-    'CIBR': 'Cybersecurity', 'HACK': 'Cybersecurity', 'BUG': 'Cybersecurity',
-    'FINX': 'Fintech', 'ARKF': 'Fintech',
-    'IBB': 'HealthTech', 'XBI': 'HealthTech',
+# Calendari di ribilanciamento per le curve di equity (vedi PortfolioOptimizer.simulate)
+REBALANCE_SCHEDULES = {
+    'weekly': "Settimanale",
+    'monthly': "Mensile",
+    'quarterly': "Trimestrale",
+    'threshold': "A soglia (±5%)",
+    'none': "Nessuno (buy & hold)",
 }
 
-DEFAULT_SECTOR_LIMITS = {
-    'Technology': 0.35,
-    'NASDAQ': 0.30,
-    'AI': 0.25,
-    'Semiconductor': 0.30,
-    'Cloud': 0.25,
-    'EmergingTech': 0.20,
-    'CleanEnergy': 0.20,
-    'EmergingMarkets': 0.15,
-    'Cybersecurity': 0.20,
-    'Fintech': 0.15,
-    'HealthTech': 0.20,
-    'Other': 0.25,
+# Modelli dei rendimenti per la simulazione Monte Carlo (vedi PortfolioOptimizer.monte_carlo)
+MONTE_CARLO_METHODS = {
+    'normal': "Normale (μ, Σ stimati)",
+    'bootstrap': "Block bootstrap storico",
 }
 
+# Schede della vista risultati
+RESULT_TABS = [
+    "📊 Dashboard & Metriche",
+    "🎯 Allocazione",
+    "📈 Analisi Grafica",
+    "📚 Glossario"
+]
+
+
 # ════════════════════════════════════════════════════════════════════════════════
 # GLOSSARIO FINANZIARIO
 # ════════════════════════════════════════════════════════════════════════════════
@@ -485,773 +480,84 @@ Mantiene il rischio complessivo sotto una soglia predefinita.
 # FUNZIONI DI DOWNLOAD CON CACHE
 # ════════════════════════════════════════════════════════════════════════════════
 
+@st.cache_resource(show_spinner=False)
+def get_price_store():
+    """Archivio prezzi condiviso tra le sessioni (None se il disco non è scrivibile)."""
+    try:
+        return PriceStore()
+    except (OSError, sqlite3.Error):
+        return None
+
+
+@st.cache_resource(show_spinner=False)
+def get_price_cache():
+    """Cache in memoria delle finestre già caricate, condivisa tra le sessioni."""
+    return PriceWindowCache()
+
+
 @st.cache_data(ttl=3600, show_spinner=False)
 def download_data(tickers, start_date, end_date):
     """
     Scarica i dati storici degli ETF da Yahoo Finance.
-    Utilizza cache per evitare download ripetuti.
+    Utilizza cache per evitare download ripetuti: una finestra contenuta in
+    dati già caricati viene ricavata in memoria, senza accesso alla rete.
     """
-    all_data = {}
-    errors = []
-    
-    for t in tickers:
-        try:
-            data = yf.Ticker(t).history(start=start_date, end=end_date, auto_adjust=True)
-            if data.empty or len(data) < 50:
-                # Prova con suffissi europei
-                for sfx in ['.L', '.DE', '.MI']:
-                    try:
-                        data = yf.Ticker(t + sfx).history(start=start_date, end=end_date, auto_adjust=True)
-                        if not data.empty and len(data) >= 50:
-                            break
-                    except:
-                        continue
-            
-            if data.empty or len(data) < 50:
-                errors.append(t)
-                continue
-                
-            prices = data['Close'].squeeze()
-            prices.index = pd.to_datetime(
-                prices.index.tz_localize(None) if prices.index.tz else prices.index
-            ).normalize()
-            all_data[t] = prices
-            
-        except Exception as e:
-            errors.append(t)
+    all_data, errors = load_prices(tickers, start_date, end_date,
+                                   store=get_price_store(), cache=get_price_cache())
     
     if len(all_data) < 2:
         return None, None, errors
     
-    df = pd.DataFrame(all_data).ffill(limit=5).bfill(limit=5).dropna()
-    prices = df.resample('W').last().dropna()
-    returns = prices.pct_change().dropna() * 100
+    prices, returns = build_weekly_panel(all_data)
     
     return prices, returns, errors
 
 
-@st.cache_data(ttl=3600, show_spinner=False)
-def download_benchmark_data(ticker, start_date, end_date):
-    """Scarica i dati del benchmark con cache."""
-    try:
-        data = yf.Ticker(ticker).history(start=start_date, end=end_date, auto_adjust=True)
-        if data.empty or len(data) < 50:
-            return None, None
-        
-        prices = data['Close'].squeeze()
-        prices.index = pd.to_datetime(
-            prices.index.tz_localize(None) if prices.index.tz else prices.index
-        ).normalize()
-        weekly = prices.resample('W').last().dropna()
-        
-        if isinstance(weekly, pd.DataFrame):
-            weekly = weekly.squeeze()
-        
-        returns = weekly.pct_change().dropna() * 100
-        return weekly, returns
-    except:
-        return None, None
-
-
-# ════════════════════════════════════════════════════════════════════════════════
-# CLASSE BENCHMARK ANALYZER
-# ════════════════════════════════════════════════════════════════════════════════
+@st.cache_resource(show_spinner=False)
+def get_result_cache():
+    """Cache dei risultati condivisa tra le sessioni."""
+    return ResultCache()
 
-class BenchmarkAnalyzer:
-    """Analizza e seleziona automaticamente il benchmark più appropriato."""
-    
-    def __init__(self, start_date, end_date, risk_free_rate=0.02):
-        self.start_date = start_date
-        self.end_date = end_date
-        self.risk_free_rate = risk_free_rate
-        self.benchmark_prices = {}
-        self.benchmark_returns = {}
-        self.benchmark_metrics = {}
-        self.best_benchmark = None
-
-    def download_benchmark_data(self, ticker):
-        """Scarica dati benchmark con cache."""
-        if ticker in self.benchmark_prices:
-            return True
-        
-        prices, returns = download_benchmark_data(ticker, self.start_date, self.end_date)
-        if prices is None:
-            return False
-        
-        self.benchmark_prices[ticker] = prices
-        self.benchmark_returns[ticker] = returns
-        return len(returns) >= 20
-
-    def calculate_metrics(self, ticker):
-        """Calcola le metriche di performance per un benchmark."""
-        if not self.download_benchmark_data(ticker):
-            return None
-        
-        ret = self.benchmark_returns[ticker]
-        prices = self.benchmark_prices[ticker]
-        
-        # Rendimento annualizzato
-        mu = float(expected_returns.mean_historical_return(
-            pd.DataFrame({ticker: prices}), frequency=52
-        ).iloc[0]) * 100
-        
-        rd = ret / 100
-        vol = float(rd.std() * np.sqrt(52) * 100)
-        excess = mu - self.risk_free_rate * 100
-        sharpe = excess / vol if vol > 0 else 0
-        
-        ds = rd[rd < self.risk_free_rate/52]
-        dd = float(np.sqrt(((ds - self.risk_free_rate/52)**2).mean()) * np.sqrt(52) * 100) if len(ds) > 0 else vol * 0.7
-        sortino = excess / dd if dd > 0 else 0
-        
-        cum = (1 + rd).cumprod()
-        mdd = float(abs(((cum - cum.expanding().max()) / cum.expanding().max()).min()) * 100)
-        
-        self.benchmark_metrics[ticker] = {
-            'ticker': ticker,
-            'mean_return': mu,
-            'volatility': vol,
-            'sharpe': sharpe,
-            'sortino': sortino,
-            'max_drawdown': mdd,
-            'calmar': mu/mdd if mdd > 0 else 0
-        }
-        return self.benchmark_metrics[ticker]
-
-    def find_best(self, port_returns, port_metrics):
-        """Trova il benchmark più appropriato."""
-        results = []
-        
-        for b in BENCHMARK_CANDIDATES:
-            m = self.calculate_metrics(b['ticker'])
-            if not m:
-                continue
-            
-            br = self.benchmark_returns[b['ticker']].copy()
-            pr = port_returns.copy()
-            pr.index = pd.to_datetime(pr.index).normalize()
-            br.index = pd.to_datetime(br.index).normalize()
-            common = pr.index.intersection(br.index)
-            
-            if len(common) < 20:
-                continue
-            
-            corr = float(pr.loc[common].corr(br.loc[common]))
-            te = float((pr.loc[common] - br.loc[common]).std() * np.sqrt(52))
-            
-            cov = np.cov(pr.loc[common]/100, br.loc[common]/100)
-            beta = cov[0,1]/cov[1,1] if cov[1,1] > 0 else 1.0
-            
-            score = (corr * 0.5 + 
-                    (1/(1+te/10)) * 0.35 + 
-                    (1/(1+abs(m['volatility']-port_metrics['vol'])/10)) * 0.15)
-            
-            results.append({
-                **m,
-                'name': b['name'],
-                'correlation': corr,
-                'tracking_error': te,
-                'beta': beta,
-                'score': score
-            })
-        
-        if not results:
-            return None
-        
-        self.best_benchmark = max(results, key=lambda x: x['score'])
-        return self.best_benchmark
 
+@st.cache_resource(show_spinner=False)
+def get_figure_cache():
+    """Cache dei grafici renderizzati condivisa tra le sessioni."""
+    return FigureCache()
 
-# ════════════════════════════════════════════════════════════════════════════════
-# CLASSE PORTFOLIO OPTIMIZER
-# ════════════════════════════════════════════════════════════════════════════════
 
-class PortfolioOptimizer:
-    """Classe principale per l'ottimizzazione del portafoglio."""
-    
-    def __init__(self, tickers, prices, returns, min_weight=0.01, max_concentration=0.25,
-                 risk_free_rate=0.02, sector_map=None, sector_limits=None, 
-                 target_volatility=None, start_date=None, end_date=None):
-        
-        self.tickers = list(prices.columns)
-        self.n_assets = len(self.tickers)
-        self.prices = prices
-        self.returns = returns
-        self.min_weight = min_weight
-        self.max_concentration = max_concentration
-        self.risk_free_rate = risk_free_rate
-        self.start_date = start_date
-        self.end_date = end_date
-        
-        self.mu = expected_returns.mean_historical_return(prices, frequency=52)
-        self.S = risk_models.sample_cov(prices, frequency=52)
-        
-        self.sector_map = sector_map if sector_map else DEFAULT_SECTOR_MAP.copy()
-        
-        if sector_limits is False:
-            self.sector_limits = None
-            self.use_sector_constraints = False
-        elif sector_limits is None:
-            self.sector_limits = DEFAULT_SECTOR_LIMITS.copy()
-            self.use_sector_constraints = True
-        else:
-            self.sector_limits = sector_limits
-            self.use_sector_constraints = True
-        
-        self.target_volatility = target_volatility
-        self.use_volatility_constraint = target_volatility is not None
-        
-        self.bench = BenchmarkAnalyzer(start_date, end_date, risk_free_rate)
-        self.best_benchmark = None
-        self.results = {}
-
-    def _build_sector_mapper(self):
-        """Costruisce il mapping ticker->settore."""
-        return {ticker: self.sector_map.get(ticker, 'Other') for ticker in self.tickers}
-
-    def _get_active_sectors(self):
-        """Ottiene i settori attivi nel portafoglio."""
-        sector_mapper = self._build_sector_mapper()
-        sectors = {}
-        for ticker, sector in sector_mapper.items():
-            if sector not in sectors:
-                sectors[sector] = []
-            sectors[sector].append(ticker)
-        return sectors
-
-    def _apply_sector_constraints(self, ef):
-        """Applica vincoli settoriali a EfficientFrontier."""
-        if not self.use_sector_constraints:
-            return ef
-        
-        sector_mapper = self._build_sector_mapper()
-        sector_lower = {}
-        sector_upper = {}
-        active_sectors = set(sector_mapper.values())
-        
-        for sector in active_sectors:
-            sector_lower[sector] = 0
-            sector_upper[sector] = self.sector_limits.get(sector, self.sector_limits.get('Other', 1.0))
-        
-        try:
-            ef.add_sector_constraints(sector_mapper, sector_lower, sector_upper)
-        except Exception:
-            pass
-        
-        return ef
-
-    def stats(self, w):
-        """Calcola le statistiche del portafoglio."""
-        pr = (self.returns * w).sum(axis=1) / 100
-        tot = (1 + pr).prod()
-        n = len(pr) / 52
-        ret = (tot ** (1/n) - 1) * 100 if n > 0 else 0
-        vol = float(pr.std() * np.sqrt(52) * 100)
-        excess = ret - self.risk_free_rate * 100
-        sharpe = excess / vol if vol > 0 else 0
-        
-        ds = pr[pr < self.risk_free_rate/52]
-        dd = float(np.sqrt(((ds - self.risk_free_rate/52)**2).mean()) * np.sqrt(52) * 100) if len(ds) > 0 else vol * 0.7
-        sortino = excess / dd if dd > 0 else 0
-        
-        cum = (1 + pr).cumprod()
-        mdd = float(abs(((cum - cum.expanding().max()) / cum.expanding().max()).min()) * 100)
-        
-        return {
-            'ret': ret, 'vol': vol, 'sharpe': sharpe,
-            'sortino': sortino, 'mdd': mdd,
-            'calmar': ret/mdd if mdd > 0 else 0
-        }
-
-    def optimize_max_sharpe(self):
-        """Ottimizzazione Max Sharpe."""
-        ef = EfficientFrontier(self.mu, self.S, 
-                              weight_bounds=(self.min_weight, self.max_concentration))
-        
-        if self.use_sector_constraints:
-            ef = self._apply_sector_constraints(ef)
-        
-        if self.use_volatility_constraint:
-            try:
-                ef.efficient_risk(target_volatility=self.target_volatility)
-            except:
-                ef = EfficientFrontier(self.mu, self.S, 
-                                      weight_bounds=(self.min_weight, self.max_concentration))
-                if self.use_sector_constraints:
-                    ef = self._apply_sector_constraints(ef)
-                ef.max_sharpe(risk_free_rate=self.risk_free_rate)
-        else:
-            ef.max_sharpe(risk_free_rate=self.risk_free_rate)
-        
-        w = np.array([ef.clean_weights().get(t, 0) for t in self.tickers])
-        s = self.stats(w)
-        self.results['sharpe'] = {'weights': w, **s}
-        return w
-
-    def optimize_max_sortino(self):
-        """Ottimizzazione Max Sortino."""
-        es = EfficientSemivariance(
-            self.mu, self.prices.pct_change().dropna(), frequency=52,
-            weight_bounds=(self.min_weight, self.max_concentration)
-        )
-        
-        if self.use_sector_constraints:
-            es = self._apply_sector_constraints(es)
-        
-        if self.use_volatility_constraint:
-            try:
-                target_semidev = self.target_volatility * 0.8
-                es.efficient_risk(target_semideviation=target_semidev)
-            except:
-                es = EfficientSemivariance(
-                    self.mu, self.prices.pct_change().dropna(), frequency=52,
-                    weight_bounds=(self.min_weight, self.max_concentration)
-                )
-                if self.use_sector_constraints:
-                    es = self._apply_sector_constraints(es)
-                es.max_quadratic_utility(risk_aversion=1)
-        else:
-            es.max_quadratic_utility(risk_aversion=1)
-        
-        w = np.array([es.clean_weights().get(t, 0) for t in self.tickers])
-        s = self.stats(w)
-        self.results['sortino'] = {'weights': w, **s}
-        return w
-
-    def optimize_risk_parity(self):
-        """Ottimizzazione Risk Parity."""
-        cov = self.S.values * 10000
-        cov_annual = self.S.values
-        
-        def obj(w):
-            pv = np.sqrt(w.T @ cov @ w)
-            if pv < 1e-10:
-                return 1e10
-            rc = w * (cov @ w) / pv
-            return np.sum((rc - pv/self.n_assets)**2)
-        
-        iv = 1 / np.sqrt(np.diag(cov))
-        init = iv / iv.sum()
-        
-        constraints = [{'type': 'eq', 'fun': lambda w: np.sum(w) - 1}]
-        
-        if self.use_sector_constraints:
-            active_sectors = self._get_active_sectors()
-            for sector, tickers_in_sector in active_sectors.items():
-                max_weight = self.sector_limits.get(sector, self.sector_limits.get('Other', 1.0))
-                indices = [self.tickers.index(t) for t in tickers_in_sector if t in self.tickers]
-                if indices:
-                    constraints.append({
-                        'type': 'ineq',
-                        'fun': lambda w, idx=indices, mw=max_weight: mw - np.sum(w[idx])
-                    })
-        
-        if self.use_volatility_constraint:
-            constraints.append({
-                'type': 'ineq',
-                'fun': lambda w: self.target_volatility**2 - (w.T @ cov_annual @ w)
-            })
-        
-        res = minimize(
-            obj, init, method='SLSQP',
-            bounds=Bounds([self.min_weight]*self.n_assets, [self.max_concentration]*self.n_assets),
-            constraints=constraints
-        )
-        
-        w = res.x
-        s = self.stats(w)
-        self.results['rp'] = {'weights': w, **s}
-        return w
-
-    def optimize_hrp(self):
-        """Ottimizzazione HRP."""
-        hrp = HRPOpt(self.prices.pct_change().dropna())
-        hrp.optimize()
-        w = np.array([hrp.clean_weights().get(t, 0) for t in self.tickers])
-        
-        if self.use_volatility_constraint:
-            cov_annual = self.S.values
-            port_vol = np.sqrt(w.T @ cov_annual @ w)
-            if port_vol > self.target_volatility:
-                scale_factor = self.target_volatility / port_vol
-                w = w * scale_factor
-                w = w / w.sum()
-        
-        s = self.stats(w)
-        self.results['hrp'] = {'weights': w, **s}
-        return w
-
-    def find_benchmark(self):
-        """Trova il benchmark migliore."""
-        eq = np.array([1/self.n_assets] * self.n_assets)
-        pr = (self.returns * eq).sum(axis=1)
-        s = self.stats(eq)
-        self.best_benchmark = self.bench.find_best(pr, {'vol': s['vol'], 'ret': s['ret']})
-
-    def calc_bench_metrics(self):
-        """Calcola le metriche relative al benchmark."""
-        if not self.best_benchmark:
-            return
-        
-        br = self.bench.benchmark_returns[self.best_benchmark['ticker']].copy()
-        br.index = pd.to_datetime(br.index).normalize()
-        
-        for name, data in self.results.items():
-            pr = (self.returns * data['weights']).sum(axis=1)
-            pr.index = pd.to_datetime(pr.index).normalize()
-            common = pr.index.intersection(br.index)
-            
-            if len(common) < 20:
-                continue
-            
-            pa, ba = pr.loc[common], br.loc[common]
-            cov = np.cov(pa/100, ba/100)
-            beta = cov[0,1]/cov[1,1] if cov[1,1] > 0 else 1.0
-            te = float((pa - ba).std() * np.sqrt(52))
-            n = len(pa)/52
-            pc = ((1+pa/100).prod()**(1/n)-1)*100
-            bc = ((1+ba/100).prod()**(1/n)-1)*100
-            alpha = pc - bc
-            ir = alpha/te if te > 0 else 0
-            excess_return = data['ret'] - self.risk_free_rate * 100
-            treynor = excess_return / beta if beta != 0 else 0
-            calmar = data['ret'] / data['mdd'] if data['mdd'] > 0 else 0
-            
-            self.results[name].update({
-                'beta': beta, 'te': te, 'alpha': alpha, 'ir': ir,
-                'treynor': treynor, 'calmar': calmar, 'n_weeks': len(common)
-            })
-
-    # ════════════════════════════════════════════════════════════════════════════
-    # METODI DI PLOTTING (restituiscono oggetti figure)
-    # ════════════════════════════════════════════════════════════════════════════
-
-    def plot_frontier(self):
-        """Genera il grafico della frontiera efficiente."""
-        pts = []
-        for t in np.linspace(float(self.mu.min()), float(self.mu.max()), 40):
-            try:
-                ef = EfficientFrontier(self.mu, self.S, 
-                                      weight_bounds=(self.min_weight, self.max_concentration))
-                ef.efficient_return(t)
-                w = np.array([ef.clean_weights().get(tk, 0) for tk in self.tickers])
-                s = self.stats(w)
-                pts.append((s['vol'], s['ret'], s['sharpe']))
-            except:
-                pass
-        
-        if not pts:
-            return None
-        
-        v, r, sh = zip(*pts)
-        fig, ax = plt.subplots(figsize=(12, 8))
-        fig.patch.set_facecolor('#0f172a')
-        ax.set_facecolor('#1e293b')
-        
-        sc = ax.scatter(v, r, c=sh, cmap='viridis', s=50, alpha=0.7)
-        cbar = plt.colorbar(sc, ax=ax)
-        cbar.set_label('Sharpe Ratio', color='white')
-        cbar.ax.yaxis.set_tick_params(color='white')
-        plt.setp(plt.getp(cbar.ax.axes, 'yticklabels'), color='white')
-        
-        colors = {
-            'sharpe': ('#2ecc71', '*', 'MAX SHARPE'),
-            'sortino': ('#9b59b6', 'P', 'MAX SORTINO'),
-            'rp': ('#f39c12', 'D', 'RISK PARITY'),
-            'hrp': ('#00bcd4', 'H', 'HRP')
-        }
-        
-        for name, data in self.results.items():
-            c, m, label = colors.get(name, ('gray', 'o', name.upper()))
-            ax.scatter(data['vol'], data['ret'], c=c, s=300, marker=m,
-                      edgecolors='white', linewidth=2, label=label, zorder=10)
-        
-        ax.set_xlabel('Volatilità Annualizzata (%)', color='white', fontsize=12)
-        ax.set_ylabel('Rendimento Annualizzato (%)', color='white', fontsize=12)
-        ax.set_title('FRONTIERA EFFICIENTE', color='#00d4ff', fontsize=14, fontweight='bold')
-        ax.legend(facecolor='#1e293b', edgecolor='#334155', labelcolor='white',
-                 loc='upper left', bbox_to_anchor=(0.02, 0.98), fontsize=10)
-        ax.tick_params(colors='white')
-        ax.grid(True, alpha=0.3, color='#334155')
-        
-        for spine in ax.spines.values():
-            spine.set_color('#334155')
-        
-        plt.tight_layout()
-        return fig
-
-    def plot_cumulative(self):
-        """Genera il grafico dei rendimenti cumulativi."""
-        fig, ax = plt.subplots(figsize=(12, 7))
-        fig.patch.set_facecolor('#0f172a')
-        ax.set_facecolor('#1e293b')
-        
-        norm = self.prices / self.prices.iloc[0] * 100
-        colors = {
-            'sharpe': '#2ecc71',
-            'sortino': '#9b59b6',
-            'rp': '#f39c12',
-            'hrp': '#00bcd4'
-        }
-        
-        for name, data in self.results.items():
-            ax.plot((norm * data['weights']).sum(axis=1),
-                   color=colors.get(name, 'gray'), linewidth=2, label=name.upper())
-        
-        if self.best_benchmark and self.best_benchmark['ticker'] in self.bench.benchmark_prices:
-            bp = self.bench.benchmark_prices[self.best_benchmark['ticker']]
-            common = norm.index.intersection(bp.index)
-            if len(common) > 0:
-                ax.plot(bp.loc[common]/bp.loc[common].iloc[0]*100,
-                       'w--', linewidth=2, alpha=0.7,
-                       label=f"Benchmark: {self.best_benchmark['ticker']}")
-        
-        ax.axhline(100, color='gray', linestyle=':', alpha=0.5, label='Base 100')
-        ax.set_xlabel('Data', color='white', fontsize=12)
-        ax.set_ylabel('Valore Portafoglio (Base 100€)', color='white', fontsize=12)
-        ax.set_title('RENDIMENTI CUMULATIVI', color='#00d4ff', fontsize=14, fontweight='bold')
-        ax.legend(facecolor='#1e293b', edgecolor='#334155', labelcolor='white',
-                 loc='upper left', bbox_to_anchor=(0.02, 0.98), fontsize=10)
-        ax.tick_params(colors='white')
-        ax.grid(True, alpha=0.3, color='#334155')
-        
-        for spine in ax.spines.values():
-            spine.set_color('#334155')
-        
-        plt.tight_layout()
-        return fig
-
-    def plot_drawdown(self):
-        """Genera il grafico del drawdown."""
-        fig, ax = plt.subplots(figsize=(12, 6))
-        fig.patch.set_facecolor('#0f172a')
-        ax.set_facecolor('#1e293b')
-        
-        colors = {
-            'sharpe': '#2ecc71',
-            'sortino': '#9b59b6',
-            'rp': '#f39c12',
-            'hrp': '#00bcd4'
-        }
-        
-        for name, data in self.results.items():
-            pr = (self.returns * data['weights']).sum(axis=1)/100
-            cum = (1+pr).cumprod()
-            dd = (cum - cum.expanding().max())/cum.expanding().max()*100
-            ax.fill_between(dd.index, dd.values, 0, alpha=0.3, color=colors.get(name, 'gray'))
-            ax.plot(dd.index, dd.values, color=colors.get(name, 'gray'),
-                   label=f"{name.upper()} (Max: {dd.min():.1f}%)")
-        
-        ax.set_xlabel('Data', color='white', fontsize=12)
-        ax.set_ylabel('Drawdown (%)', color='white', fontsize=12)
-        ax.set_title('DRAWDOWN NEL TEMPO', color='#00d4ff', fontsize=14, fontweight='bold')
-        ax.legend(facecolor='#1e293b', edgecolor='#334155', labelcolor='white',
-                 loc='lower left', bbox_to_anchor=(0.02, 0.02), fontsize=10)
-        ax.tick_params(colors='white')
-        ax.grid(True, alpha=0.3, color='#334155')
-        
-        for spine in ax.spines.values():
-            spine.set_color('#334155')
-        
-        plt.tight_layout()
-        return fig
-
-    def plot_correlation_matrix(self):
-        """Genera la matrice di correlazione."""
-        corr_matrix = self.returns.corr()
-        n_assets = len(self.tickers)
-        
-        fig_width = max(12, n_assets * 0.6)
-        fig_height = max(10, n_assets * 0.5)
-        
-        fig, ax = plt.subplots(figsize=(fig_width, fig_height))
-        fig.patch.set_facecolor('#0f172a')
-        ax.set_facecolor('#1e293b')
-        
-        sns.heatmap(
-            corr_matrix,
-            annot=True,
-            fmt='.2f',
-            cmap='RdBu_r',
-            center=0,
-            vmin=-1, vmax=1,
-            square=True,
-            linewidths=0.5,
-            linecolor='#334155',
-            cbar_kws={'label': 'Correlazione', 'shrink': 0.8},
-            annot_kws={'size': max(6, 10 - n_assets // 4), 'color': 'white'},
-            ax=ax
-        )
-        
-        ax.set_xticklabels(ax.get_xticklabels(), rotation=45, ha='right', color='white')
-        ax.set_yticklabels(ax.get_yticklabels(), rotation=0, color='white')
-        ax.set_title('MATRICE DI CORRELAZIONE', color='#00d4ff', fontsize=14, fontweight='bold', pad=20)
-        
-        cbar = ax.collections[0].colorbar
-        cbar.ax.yaxis.set_tick_params(color='white')
-        plt.setp(plt.getp(cbar.ax.axes, 'yticklabels'), color='white')
-        cbar.set_label('Correlazione', color='white')
-        
-        plt.tight_layout()
-        return fig
-
-    def plot_risk_return_map(self):
-        """Genera la mappa risk-return."""
-        if not self.best_benchmark:
-            return None
-        
-        fig, ax = plt.subplots(figsize=(14, 10))
-        fig.patch.set_facecolor('#0f172a')
-        ax.set_facecolor('#1e293b')
-        
-        colors = {
-            'sharpe': ('#2ecc71', '*', 'MAX SHARPE'),
-            'sortino': ('#9b59b6', 'P', 'MAX SORTINO'),
-            'rp': ('#f39c12', 'D', 'RISK PARITY'),
-            'hrp': ('#00bcd4', 'H', 'HRP')
-        }
-        
-        # Risk-free point
-        ax.scatter(0, self.risk_free_rate * 100, c='gray', s=200, marker='s',
-                  edgecolors='white', linewidth=2,
-                  label=f'Risk-Free ({self.risk_free_rate*100:.1f}%)', zorder=5)
-        
-        # Benchmark
-        b = self.best_benchmark
-        ax.scatter(b['volatility'], b['mean_return'], c='#3b82f6', s=400, marker='X',
-                  edgecolors='white', linewidth=2,
-                  label=f"BENCHMARK ({b['ticker']})", zorder=10)
-        
-        # CML line
-        if b['sharpe'] > 0:
-            vol_range = np.linspace(0, max(b['volatility'] * 1.5, 40), 100)
-            cml_returns = self.risk_free_rate * 100 + b['sharpe'] * vol_range
-            ax.plot(vol_range, cml_returns, 'w--', alpha=0.3, linewidth=1.5,
-                   label=f"CML (Sharpe = {b['sharpe']:.2f})")
-        
-        # Strategie
-        for name, data in self.results.items():
-            c, m, label = colors.get(name, ('gray', 'o', name.upper()))
-            ax.scatter(data['vol'], data['ret'], c=c, s=350, marker=m,
-                      edgecolors='white', linewidth=2, label=label, zorder=10)
-        
-        ax.set_xlabel('Volatilità Annualizzata (%)', color='white', fontsize=12)
-        ax.set_ylabel('Rendimento Annualizzato (%)', color='white', fontsize=12)
-        ax.set_title('MAPPA RISK-RETURN', color='#00d4ff', fontsize=14, fontweight='bold')
-        ax.legend(facecolor='#1e293b', edgecolor='#334155', labelcolor='white', 
-                 loc='upper left', bbox_to_anchor=(0.02, 0.98), fontsize=10)
-        ax.tick_params(colors='white')
-        ax.grid(True, alpha=0.3, color='#334155')
-        ax.axhline(0, color='gray', linestyle='-', alpha=0.3)
-        
-        for spine in ax.spines.values():
-            spine.set_color('#334155')
-        
-        plt.tight_layout()
-        return fig
-
-    def plot_allocation_pie(self):
-        """Genera i pie chart dell'allocazione."""
-        MIN_WEIGHT_THRESHOLD = 0.02
-        colors_palette = ['#2ecc71', '#3498db', '#9b59b6', '#f39c12', '#1abc9c',
-                         '#e74c3c', '#34495e', '#e67e22', '#27ae60', '#8e44ad',
-                         '#2980b9', '#c0392b', '#16a085', '#d35400', '#7f8c8d']
-        others_color = '#bdc3c7'
-        
-        strategy_styles = {
-            'sharpe': {'title': 'MAX SHARPE', 'color': '#2ecc71'},
-            'sortino': {'title': 'MAX SORTINO', 'color': '#9b59b6'},
-            'rp': {'title': 'RISK PARITY', 'color': '#f39c12'},
-            'hrp': {'title': 'HRP', 'color': '#00bcd4'}
-        }
-        
-        fig, axes = plt.subplots(2, 2, figsize=(16, 14))
-        fig.patch.set_facecolor('#0f172a')
-        axes = axes.flatten()
-        
-        for idx, (name, data) in enumerate(self.results.items()):
-            ax = axes[idx]
-            ax.set_facecolor('#1e293b')
-            
-            weights = data['weights']
-            sorted_indices = np.argsort(weights)[::-1]
-            labels, sizes, colors, explode_list = [], [], [], []
-            others_weight = 0
-            color_idx = 0
-            
-            for i in sorted_indices:
-                w = weights[i]
-                if w < 0.001:
-                    continue
-                if w < MIN_WEIGHT_THRESHOLD:
-                    others_weight += w
-                else:
-                    labels.append(self.tickers[i])
-                    sizes.append(w * 100)
-                    colors.append(colors_palette[color_idx % len(colors_palette)])
-                    explode_list.append(0.03 if color_idx < 3 else 0)
-                    color_idx += 1
-            
-            if others_weight > 0.001:
-                labels.append('Altri')
-                sizes.append(others_weight * 100)
-                colors.append(others_color)
-                explode_list.append(0)
-            
-            wedges, texts, autotexts = ax.pie(
-                sizes, labels=None, colors=colors,
-                autopct=lambda pct: f'{pct:.1f}%' if pct >= 3 else '',
-                explode=explode_list, startangle=90, pctdistance=0.75,
-                wedgeprops={'edgecolor': 'white', 'linewidth': 2},
-                textprops={'fontsize': 9, 'fontweight': 'bold', 'color': 'white'}
-            )
-            
-            for autotext in autotexts:
-                autotext.set_color('white')
-            
-            centre_circle = plt.Circle((0, 0), 0.4, fc='#1e293b', ec='#334155', linewidth=2)
-            ax.add_patch(centre_circle)
-            
-            style = strategy_styles.get(name, {'title': name.upper(), 'color': 'gray'})
-            center_text = f"Sharpe\n{data['sharpe']:.2f}"
-            ax.text(0, 0, center_text, ha='center', va='center',
-                   fontsize=12, fontweight='bold', color='white')
-            
-            ax.set_title(style['title'], fontsize=14, fontweight='bold',
-                        color=style['color'], pad=10)
-            
-            legend_labels = [f"{l} ({s:.1f}%)" for l, s in zip(labels, sizes)]
-            leg = ax.legend(wedges, legend_labels, title="Asset", loc='center left',
-                           bbox_to_anchor=(1, 0, 0.5, 1), fontsize=8, title_fontsize=9)
-            leg.get_frame().set_facecolor('#1e293b')
-            leg.get_frame().set_edgecolor('#334155')
-            for text in leg.get_texts():
-                text.set_color('white')
-            leg.get_title().set_color('white')
-        
-        fig.suptitle('ALLOCAZIONE PORTAFOGLIO', fontsize=16, fontweight='bold',
-                    color='#00d4ff', y=0.98)
-        
-        plt.tight_layout(rect=[0, 0.02, 1, 0.95])
-        return fig
-
-    def run_full_optimization(self, progress_callback=None):
-        """Esegue l'ottimizzazione completa."""
-        steps = [
-            ("Ottimizzazione Max Sharpe...", self.optimize_max_sharpe),
-            ("Ottimizzazione Max Sortino...", self.optimize_max_sortino),
-            ("Ottimizzazione Risk Parity...", self.optimize_risk_parity),
-            ("Ottimizzazione HRP...", self.optimize_hrp),
-            ("Ricerca benchmark...", self.find_benchmark),
-            ("Calcolo metriche benchmark...", self.calc_bench_metrics),
-        ]
-        
-        for i, (msg, func) in enumerate(steps):
-            if progress_callback:
-                progress_callback((i + 1) / len(steps), msg)
-            func()
-        
-        return self.results
+def show_chart(optimizer, name, **options):
+    """
+    Mostra un grafico; False se non disponibile. I bytes restano in sessione
+    per tutta la durata dei risultati, indipendentemente dalla cache condivisa.
+    """
+    charts = st.session_state.setdefault('charts', {})
+    key = (name, tuple(sorted(options.items())))
+    if key not in charts:
+        charts[key] = get_figure_cache().render(
+            optimizer, name, fingerprint=st.session_state.get('results_fingerprint'), **options)
+    image = charts[key]
+    if image is None:
+        return False
+    st.image(image, use_container_width=True)
+    return True
+
+
+@st.cache_resource(show_spinner=False)
+def get_startup_timings():
+    """Tempi del primo avvio del processo (a freddo), condivisi tra le sessioni."""
+    return {'import': _IMPORT_SECONDS}
+
+
+def format_startup_timings(sidebar_seconds):
+    """Riepilogo dei tempi di avvio per la sidebar."""
+    cold = get_startup_timings()
+    cold.setdefault('sidebar', sidebar_seconds)
+    text = (f"⏱️ Avvio a freddo: import {cold['import']:.2f}s · sidebar {cold['sidebar']:.2f}s "
+            f"· questa esecuzione {sidebar_seconds * 1000:.0f} ms")
+    if IMPORT_TIMINGS:
+        loaded = sorted(IMPORT_TIMINGS.items(), key=lambda kv: -kv[1])
+        text += "  \n📦 Caricati su richiesta: " + ", ".join(f"{name} {sec:.2f}s" for name, sec in loaded)
+    return text
 
 
 # ════════════════════════════════════════════════════════════════════════════════
@@ -1354,6 +660,35 @@ def main():
                      "forzando diversificazione. Valore consigliato: 20-30%."
             ) / 100
         
+        parallel_run = st.checkbox(
+            "Esecuzione Parallela",
+            value=False,
+            help="Esegue le 4 strategie contemporaneamente su processi separati, "
+                 "mentre la ricerca del benchmark procede in parallelo. "
+                 "Il tempo totale si riduce a circa quello della strategia più lenta; "
+                 "utile su macchine con più core."
+        )
+        
+        use_resampled = st.checkbox(
+            "Frontiera Ricampionata (Michaud)",
+            value=False,
+            help="Aggiunge la strategia RESAMPLED: il Max Sharpe viene risolto su "
+                 "molti campioni bootstrap delle settimane storiche, con gli stessi "
+                 "vincoli, e i pesi vengono mediati. Allocazioni più stabili e meno "
+                 "concentrate rispetto al Max Sharpe sulla media campionaria."
+        )
+        n_resamples = 0
+        if use_resampled:
+            n_resamples = st.number_input(
+                "Campioni bootstrap",
+                min_value=100,
+                max_value=2000,
+                value=500,
+                step=100,
+                help="Numero di ricampionamenti. Più campioni riducono il rumore "
+                     "della media; i campioni vengono risolti in parallelo sui core."
+            )
+        
         st.markdown("---")
         
         # Vincoli Settoriali
@@ -1426,6 +761,12 @@ def main():
             type="primary",
             use_container_width=True
         )
+        
+        # Riempiti dopo l'eventuale analisi, così i contatori sono aggiornati
+        cache_info = st.empty()
+        startup_info = st.empty()
+    
+    sidebar_seconds = time.perf_counter() - _SCRIPT_START
     
     # ════════════════════════════════════════════════════════════════════════════
     # AREA PRINCIPALE
@@ -1447,6 +788,27 @@ def main():
         status_text.text("📥 Download dati da Yahoo Finance...")
         progress_bar.progress(10)
         
+        previous = st.session_state.get('optimizer')
+        previous_key = st.session_state.get('cache_key')
+        
+        def make_benchmark_analyzer():
+            return BenchmarkAnalyzer(
+                start_date.strftime('%Y-%m-%d'),
+                end_date.strftime('%Y-%m-%d'),
+                risk_free_rate,
+                store=get_price_store(),
+                cache=get_price_cache()
+            )
+        
+        # I benchmark si scaricano in background mentre si scaricano gli asset,
+        # ma non quando stesso periodo e risk-free faranno riusare quelli precedenti
+        same_period = previous_key is not None and ResultCache.data_part(previous_key)[1:] == (
+            round(float(risk_free_rate), 6), start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+        bench = None
+        if not same_period:
+            bench = make_benchmark_analyzer()
+            bench.start_prefetch()
+        
         prices, returns, errors = download_data(
             tickers,
             start_date.strftime('%Y-%m-%d'),
@@ -1461,38 +823,81 @@ def main():
             st.warning(f"⚠️ Ticker non trovati o con dati insufficienti: {', '.join(errors)}")
         
         progress_bar.progress(30)
-        status_text.text("🔄 Inizializzazione ottimizzatore...")
         
-        # Crea ottimizzatore
-        optimizer = PortfolioOptimizer(
-            tickers=tickers,
-            prices=prices,
-            returns=returns,
-            min_weight=min_weight,
-            max_concentration=max_weight,
-            risk_free_rate=risk_free_rate,
-            sector_limits=sector_limits,
-            target_volatility=target_volatility,
-            start_date=start_date.strftime('%Y-%m-%d'),
-            end_date=end_date.strftime('%Y-%m-%d')
+        # Stessi prezzi e stessi parametri: il risultato è già in cache
+        result_cache = get_result_cache()
+        cache_key = ResultCache.make_key(
+            prices, min_weight, max_weight, risk_free_rate, sector_limits, target_volatility,
+            start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'), n_resamples
         )
+        optimizer = result_cache.get(cache_key)
         
         # Callback per progress
         def update_progress(pct, msg):
             progress_bar.progress(int(30 + pct * 60))
             status_text.text(f"🔄 {msg}")
         
-        # Esegui ottimizzazione
-        results = optimizer.run_full_optimization(progress_callback=update_progress)
-        
-        progress_bar.progress(100)
-        status_text.text("✅ Analisi completata!")
+        if optimizer is not None:
+            results = optimizer.results
+            progress_bar.progress(100)
+            status_text.text("✅ Analisi completata! (risultati dalla cache)")
+        elif previous is not None and previous_key is not None and \
+                ResultCache.data_part(previous_key) == ResultCache.data_part(cache_key):
+            # Cambiano solo i vincoli: si riparte dai momenti e dai pesi precedenti
+            optimizer = previous.reoptimize(
+                progress_callback=update_progress,
+                parallel=parallel_run,
+                min_weight=min_weight,
+                max_concentration=max_weight,
+                sector_limits=sector_limits,
+                target_volatility=target_volatility,
+                n_resamples=n_resamples
+            )
+            results = optimizer.results
+            result_cache.put(cache_key, optimizer)
+            
+            progress_bar.progress(100)
+            status_text.text("✅ Analisi completata! (ri-ottimizzazione incrementale)")
+        else:
+            status_text.text("🔄 Inizializzazione ottimizzatore...")
+            
+            # Crea ottimizzatore
+            optimizer = PortfolioOptimizer(
+                tickers=tickers,
+                prices=prices,
+                returns=returns,
+                min_weight=min_weight,
+                max_concentration=max_weight,
+                risk_free_rate=risk_free_rate,
+                sector_limits=sector_limits,
+                target_volatility=target_volatility,
+                start_date=start_date.strftime('%Y-%m-%d'),
+                end_date=end_date.strftime('%Y-%m-%d'),
+                benchmark_analyzer=bench or make_benchmark_analyzer(),
+                n_resamples=n_resamples
+            )
+            
+            # Esegui ottimizzazione
+            results = optimizer.run_full_optimization(progress_callback=update_progress,
+                                                      parallel=parallel_run)
+            result_cache.put(cache_key, optimizer)
+            
+            progress_bar.progress(100)
+            status_text.text("✅ Analisi completata!")
         
         # Store in session state
         st.session_state['optimizer'] = optimizer
         st.session_state['results'] = results
+        st.session_state['cache_key'] = cache_key
+        st.session_state['results_fingerprint'] = results_fingerprint(optimizer)
+        st.session_state['charts'] = {}
         st.session_state['analysis_done'] = True
     
+    cache_stats = get_result_cache().stats()
+    cache_info.caption(f"🗄️ Cache risultati: {cache_stats['hits']} hit · {cache_stats['misses']} miss "
+                       f"· {cache_stats['size']}/{cache_stats['maxsize']} analisi")
+    startup_info.caption(format_startup_timings(sidebar_seconds))
+    
     # ════════════════════════════════════════════════════════════════════════════
     # VISUALIZZAZIONE RISULTATI
     # ════════════════════════════════════════════════════════════════════════════
@@ -1501,19 +906,22 @@ def main():
         optimizer = st.session_state['optimizer']
         results = st.session_state['results']
         
-        # Tabs
-        tab1, tab2, tab3, tab4 = st.tabs([
-            "📊 Dashboard & Metriche",
-            "🎯 Allocazione",
-            "📈 Analisi Grafica",
-            "📚 Glossario"
-        ])
+        # Schede: a differenza di st.tabs si costruisce solo quella aperta,
+        # così grafici e solve della frontiera partono alla prima apertura
+        tab1, tab2, tab3, tab4 = RESULT_TABS
+        active_tab = st.radio(
+            "Sezione",
+            RESULT_TABS,
+            horizontal=True,
+            key='results_tab',
+            label_visibility="collapsed"
+        )
         
         # ════════════════════════════════════════════════════════════════════════
         # TAB 1: DASHBOARD & METRICHE
         # ════════════════════════════════════════════════════════════════════════
         
-        with tab1:
+        if active_tab == tab1:
             st.markdown("### 🎯 Benchmark Selezionato")
             
             if optimizer.best_benchmark:
@@ -1579,6 +987,11 @@ def main():
 - **Obiettivo:** Allocazione robusta basata su clustering gerarchico
 - **Pro:** NON richiede inversione della matrice di covarianza, robusto a errori
 - **Contro:** Non ottimizza esplicitamente rendimento o Sharpe
+
+**RESAMPLED (Frontiera Ricampionata di Michaud)** *(opzionale)*
+- **Obiettivo:** Media dei pesi Max Sharpe ottenuti su centinaia di campioni bootstrap dello storico
+- **Pro:** Riduce l'instabilità del Max Sharpe dovuta agli errori di stima, allocazioni più diversificate
+- **Contro:** Più lenta; non ha una giustificazione teorica di ottimalità
                 """)
             
             # Trova la strategia migliore
@@ -1675,7 +1088,7 @@ def main():
         # TAB 2: ALLOCAZIONE
         # ════════════════════════════════════════════════════════════════════════
         
-        with tab2:
+        if active_tab == tab2:
             st.markdown("### 🥧 Allocazione del Portafoglio")
             
             with st.expander("ℹ️ Come leggere l'allocazione", expanded=False):
@@ -1694,9 +1107,7 @@ def main():
                 """)
             
             # Pie charts
-            fig_pie = optimizer.plot_allocation_pie()
-            st.pyplot(fig_pie)
-            plt.close(fig_pie)
+            show_chart(optimizer, 'allocation_pie')
             st.caption("🥧 **Grafici Donut:** Distribuzione percentuale del capitale. "
                       "Il valore al centro è lo Sharpe Ratio. Asset con peso <2% sono raggruppati in 'Altri'.")
             
@@ -1724,26 +1135,49 @@ def main():
         # TAB 3: ANALISI GRAFICA
         # ════════════════════════════════════════════════════════════════════════
         
-        with tab3:
+        if active_tab == tab3:
             st.markdown("### 📈 Grafici di Analisi")
             
             # Frontiera Efficiente
             st.markdown("#### Frontiera Efficiente")
-            fig_frontier = optimizer.plot_frontier()
-            if fig_frontier:
-                st.pyplot(fig_frontier)
-                plt.close(fig_frontier)
+            show_chart(optimizer, 'frontier')
             st.caption("📊 **Frontiera Efficiente di Markowitz:** Ogni punto rappresenta un portafoglio ottimale "
                       "per quel livello di rischio. Il colore indica lo Sharpe Ratio (più chiaro = migliore). "
                       "I marker colorati mostrano le 4 strategie di ottimizzazione.")
             
             st.markdown("---")
             
+            # Ribilanciamento e costi usati da rendimenti cumulativi e drawdown
+            col_schedule, col_cost = st.columns(2)
+            with col_schedule:
+                schedule = st.selectbox(
+                    "Ribilanciamento",
+                    list(REBALANCE_SCHEDULES),
+                    format_func=REBALANCE_SCHEDULES.get,
+                    help="Ogni quanto i pesi tornano ai valori target. Tra un ribilanciamento "
+                         "e l'altro i pesi derivano con i prezzi. Settimanale = stesse ipotesi "
+                         "delle metriche in dashboard."
+                )
+            with col_cost:
+                cost_bps = st.number_input(
+                    "Costi di transazione (bps)",
+                    min_value=0.0,
+                    max_value=200.0,
+                    value=0.0,
+                    step=5.0,
+                    help="Costo per ogni euro scambiato, in punti base (10 bps = 0,10%)."
+                )
+            
+            simulation = optimizer.simulate(schedule, cost_bps)
+            turnover = simulation['turnover'].sum() / (len(simulation['turnover']) / 52)
+            st.caption("🔁 **Turnover annuo:** " + " · ".join(
+                f"{name.upper()} {turnover[name]:.0%}" for name in turnover.index))
+            
+            st.markdown("---")
+            
             # Rendimenti Cumulativi
             st.markdown("#### Rendimenti Cumulativi")
-            fig_cumulative = optimizer.plot_cumulative()
-            st.pyplot(fig_cumulative)
-            plt.close(fig_cumulative)
+            show_chart(optimizer, 'cumulative', schedule=schedule, cost_bps=cost_bps)
             st.caption("📈 **Evoluzione di 100€ investiti:** Mostra come sarebbe cresciuto il capitale "
                       "nel periodo analizzato per ogni strategia. La linea tratteggiata bianca è il benchmark. "
                       "La linea grigia orizzontale indica il valore iniziale (base 100).")
@@ -1752,9 +1186,7 @@ def main():
             
             # Drawdown
             st.markdown("#### Drawdown")
-            fig_drawdown = optimizer.plot_drawdown()
-            st.pyplot(fig_drawdown)
-            plt.close(fig_drawdown)
+            show_chart(optimizer, 'drawdown', schedule=schedule, cost_bps=cost_bps)
             st.caption("📉 **Drawdown nel tempo:** Rappresenta la perdita percentuale dal massimo storico. "
                       "Un drawdown del -20% significa che il portafoglio ha perso il 20% dal suo picco. "
                       "È la metrica più importante per valutare la tolleranza psicologica al rischio.")
@@ -1763,10 +1195,7 @@ def main():
             
             # Risk-Return Map
             st.markdown("#### Mappa Risk-Return")
-            fig_rr = optimizer.plot_risk_return_map()
-            if fig_rr:
-                st.pyplot(fig_rr)
-                plt.close(fig_rr)
+            show_chart(optimizer, 'risk_return_map')
             st.caption("🎯 **Risk-Return Map:** Confronto diretto tra strategie e benchmark. "
                       "L'asse X è la volatilità (rischio), l'asse Y il rendimento. "
                       "La linea tratteggiata è la Capital Market Line (CML) - punti sopra la linea "
@@ -1776,19 +1205,75 @@ def main():
             
             # Matrice di Correlazione
             st.markdown("#### Matrice di Correlazione")
-            fig_corr = optimizer.plot_correlation_matrix()
-            st.pyplot(fig_corr)
-            plt.close(fig_corr)
+            top_k = None
+            if optimizer.n_assets > CORR_ANNOTATE_MAX_ASSETS:
+                top_k = st.number_input(
+                    "Correlazioni più forti per asset (0 = tutte)",
+                    min_value=0,
+                    max_value=optimizer.n_assets - 1,
+                    value=0,
+                    help="Con molti asset mostra per ciascuno solo le k correlazioni "
+                         "più forti in valore assoluto; le altre celle restano vuote."
+                ) or None
+            show_chart(optimizer, 'correlation_matrix', top_k=top_k)
             st.caption("🔗 **Matrice di Correlazione:** Misura la relazione lineare tra i rendimenti degli asset. "
                       "🔴 **Rosso** (+1) = si muovono insieme (nessuna diversificazione). "
                       "⚪ **Bianco** (0) = movimenti indipendenti (buona diversificazione). "
                       "🔵 **Blu** (-1) = si muovono in direzioni opposte (hedge naturale).")
+            
+            st.markdown("---")
+            
+            # Simulazione Monte Carlo
+            st.markdown("#### Simulazione Monte Carlo")
+            col_h, col_n, col_m = st.columns(3)
+            with col_h:
+                mc_years = st.number_input(
+                    "Orizzonte (anni)",
+                    min_value=1,
+                    max_value=10,
+                    value=1,
+                    help="Durata dei percorsi simulati, con ribilanciamento settimanale."
+                )
+            with col_n:
+                mc_paths = st.selectbox(
+                    "Percorsi",
+                    [10_000, 50_000, 100_000, 200_000],
+                    index=2,
+                    format_func=lambda n: f"{n:,}".replace(',', '.'),
+                    help="Numero di percorsi futuri simulati per strategia."
+                )
+            with col_m:
+                mc_method = st.selectbox(
+                    "Modello",
+                    list(MONTE_CARLO_METHODS),
+                    format_func=MONTE_CARLO_METHODS.get,
+                    help="Normale: rendimenti estratti dai momenti stimati (μ, Σ). "
+                         "Block bootstrap: blocchi di 4 settimane ricampionati dallo storico, "
+                         "conservano code grasse e autocorrelazione di breve periodo."
+                )
+            
+            if st.checkbox("Esegui simulazione", value=False, key='run_monte_carlo'):
+                mc_options = {'horizon': int(mc_years) * 52, 'n_paths': mc_paths, 'method': mc_method}
+                show_chart(optimizer, 'monte_carlo', **mc_options)
+                summary = optimizer.monte_carlo(**mc_options)['summary']
+                st.dataframe(
+                    summary.rename(index=str.upper, columns={
+                        'mean': 'Media', 'median': 'Mediana', 'p5': 'Perc. 5%', 'p95': 'Perc. 95%',
+                        'prob_loss': 'P. perdita (%)', 'mdd_median': 'Max DD mediano (%)',
+                        'mdd_p95': 'Max DD perc. 95% (%)',
+                    }).round(2),
+                    use_container_width=True
+                )
+                st.caption("🎲 **Monte Carlo:** Distribuzione del valore finale di 100€ investiti e del "
+                          "massimo drawdown lungo l'orizzonte scelto. La probabilità di perdita è la quota "
+                          "di percorsi che terminano sotto 100. Le ipotesi sono quelle del modello "
+                          "selezionato: non è una previsione.")
         
         # ════════════════════════════════════════════════════════════════════════
         # TAB 4: GLOSSARIO
         # ════════════════════════════════════════════════════════════════════════
         
-        with tab4:
+        if active_tab == tab4:
             st.markdown(GLOSSARIO)
     
     else:
@@ -0,0 +1,279 @@
+"""
+╔════════════════════════════════════════════════════════════════════════════════════════════════════╗
+║                      PORTFOLIO OPTIMIZER - BATCH HEADLESS                                          ║
+║                                                                                                    ║
+║  Esegue l'ottimizzazione completa su uno o più portafogli da riga di comando, senza Streamlit,    ║
+║  e salva pesi e metriche su disco. Pensato per job schedulati e confronti tra liste di ETF.       ║
+║                                                                                                    ║
+║  Uso:                                                                                              ║
+║      python batch.py tech.txt value.txt --params params.json --out risultati/                      ║
+║      python batch.py tech.txt --prices prezzi.csv --out risultati/      (offline)                  ║
+╚════════════════════════════════════════════════════════════════════════════════════════════════════╝
+"""
+
+import argparse
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from optimizer_core import (
+    LocalPriceSource, PriceStore, PriceWindowCache,
+    load_prices, build_weekly_panel, BenchmarkAnalyzer, PortfolioOptimizer,
+)
+
+
+# ════════════════════════════════════════════════════════════════════════════════
+# PARAMETRI
+# ════════════════════════════════════════════════════════════════════════════════
+
+# Stessi valori di default della sidebar della web app
+DEFAULT_PARAMS = {
+    'start_date': '2022-01-01',
+    'end_date': None,
+    'min_weight': 0.01,
+    'max_weight': 0.25,
+    'risk_free_rate': 0.037,
+    'sector_limits': None,
+    'target_volatility': None,
+    'parallel': False,
+    # campioni bootstrap della strategia Resampled; 0 = strategia disattivata
+    'n_resamples': 0,
+    # es. {"lookback": 156, "rebalance_every": 4}; None = nessun backtest
+    'walk_forward': None,
+    # es. {"horizon": 52, "n_paths": 100000, "method": "bootstrap"}; None = nessuna simulazione
+    'monte_carlo': None,
+}
+
+STRATEGY_NAMES = {
+    'sharpe': 'Max Sharpe',
+    'sortino': 'Max Sortino',
+    'rp': 'Risk Parity',
+    'hrp': 'HRP',
+    'resampled': 'Resampled',
+}
+
+# Opzioni accettate nei parametri "walk_forward" (vedi PortfolioOptimizer.walk_forward)
+WALK_FORWARD_OPTIONS = {'lookback', 'rebalance_every', 'max_workers'}
+MONTE_CARLO_OPTIONS = {'horizon', 'n_paths', 'method', 'block_size', 'seed', 'max_workers'}
+
+METRIC_KEYS = ['ret', 'vol', 'sharpe', 'sortino', 'mdd', 'calmar',
+               'beta', 'te', 'alpha', 'ir', 'treynor', 'n_weeks']
+
+
+def read_tickers(path):
+    """Legge una lista di ticker (uno per riga o separati da spazi; '#' commenta)."""
+    tickers = []
+    for line in Path(path).read_text().splitlines():
+        tickers.extend(line.split('#', 1)[0].upper().split())
+    return list(dict.fromkeys(tickers))
+
+
+def read_params(path):
+    """
+    Parametri comuni a tutti i portafogli, con eventuali override per nome
+    nella chiave "portfolios": {"tech": {"max_weight": 0.3}, ...}.
+    """
+    params = dict(DEFAULT_PARAMS)
+    overrides = {}
+    if path:
+        raw = json.loads(Path(path).read_text())
+        overrides = raw.pop('portfolios', {})
+        unknown = set(raw) - set(DEFAULT_PARAMS)
+        if unknown:
+            raise ValueError(f"Parametri sconosciuti: {', '.join(sorted(unknown))}")
+        params.update(raw)
+    if not params['end_date']:
+        params['end_date'] = datetime.today().strftime('%Y-%m-%d')
+    return params, overrides
+
+
+def check_options(name, options, allowed):
+    """Verifica che il dizionario di opzioni `name` usi solo chiavi ammesse."""
+    if not isinstance(options, dict):
+        raise ValueError(f"'{name}' deve essere un oggetto JSON")
+    unknown = set(options) - allowed
+    if unknown:
+        raise ValueError(f"Opzioni sconosciute in '{name}': {', '.join(sorted(unknown))}")
+
+
+def read_prices(path):
+    """Prezzi giornalieri da CSV (prima colonna date, una colonna per simbolo)."""
+    prices = pd.read_csv(path, index_col=0, parse_dates=True)
+    return LocalPriceSource(prices)
+
+
+# ════════════════════════════════════════════════════════════════════════════════
+# ESECUZIONE
+# ════════════════════════════════════════════════════════════════════════════════
+
+def run_portfolio(tickers, params, source=None, store=None, cache=None):
+    """
+    Scarica i dati ed esegue l'ottimizzazione completa di un portafoglio.
+    Restituisce (optimizer, errori di download); optimizer è None se restano
+    meno di 2 asset validi.
+    """
+    start, end = params['start_date'], params['end_date']
+    all_data, errors = load_prices(tickers, start, end, source=source, store=store, cache=cache)
+    if len(all_data) < 2:
+        return None, errors
+
+    prices, returns = build_weekly_panel(all_data)
+    bench = BenchmarkAnalyzer(start, end, params['risk_free_rate'],
+                              store=store, cache=cache, source=source)
+    bench.start_prefetch()
+
+    optimizer = PortfolioOptimizer(
+        list(prices.columns), prices, returns,
+        min_weight=params['min_weight'],
+        max_concentration=params['max_weight'],
+        risk_free_rate=params['risk_free_rate'],
+        sector_limits=params['sector_limits'],
+        target_volatility=params['target_volatility'],
+        start_date=start,
+        end_date=end,
+        benchmark_analyzer=bench,
+        n_resamples=params['n_resamples'],
+    )
+    optimizer.run_full_optimization(parallel=params['parallel'])
+    return optimizer, errors
+
+
+def result_tables(optimizer):
+    """Pesi (asset x strategia) e metriche (strategia x metrica) come DataFrame."""
+    weights = pd.DataFrame(
+        {STRATEGY_NAMES[k]: r['weights'] for k, r in optimizer.results.items()},
+        index=optimizer.tickers,
+    )
+    metrics = pd.DataFrame(
+        {STRATEGY_NAMES[k]: {m: r.get(m) for m in METRIC_KEYS} for k, r in optimizer.results.items()}
+    ).T
+    return weights, metrics
+
+
+def write_results(out_dir, name, optimizer, errors, params):
+    """Salva <nome>_weights.csv e <nome>.json; restituisce le metriche."""
+    weights, metrics = result_tables(optimizer)
+    weights.to_csv(out_dir / f"{name}_weights.csv", float_format='%.6f')
+
+    benchmark = optimizer.best_benchmark or {}
+    report = {
+        'portfolio': name,
+        'params': params,
+        'tickers': optimizer.tickers,
+        'download_errors': errors,
+        'benchmark': benchmark.get('ticker'),
+        'benchmark_name': benchmark.get('name'),
+        'strategies': {
+            STRATEGY_NAMES[k]: {
+                'weights': dict(zip(optimizer.tickers, map(float, r['weights']))),
+                **{m: float(r[m]) for m in METRIC_KEYS if m in r},
+            }
+            for k, r in optimizer.results.items()
+        },
+    }
+    (out_dir / f"{name}.json").write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    return metrics
+
+
+def write_walk_forward(out_dir, name, optimizer, params):
+    """Backtest walk-forward: <nome>_walkforward.csv (rendimenti) e _walkforward.json."""
+    check_options('walk_forward', params['walk_forward'], WALK_FORWARD_OPTIONS)
+    wf = optimizer.walk_forward(parallel=params['parallel'], **params['walk_forward'])
+    wf['returns'].rename(columns=STRATEGY_NAMES).to_csv(
+        out_dir / f"{name}_walkforward.csv", float_format='%.6f')
+    report = {
+        'portfolio': name,
+        **params['walk_forward'],
+        'stats': {STRATEGY_NAMES[k]: v for k, v in wf['stats'].items()},
+        'failed_windows': {STRATEGY_NAMES[k]: v for k, v in wf['failed'].items()},
+    }
+    (out_dir / f"{name}_walkforward.json").write_text(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+def write_monte_carlo(out_dir, name, optimizer, params):
+    """Simulazione Monte Carlo: riepilogo per strategia in <nome>_montecarlo.csv."""
+    check_options('monte_carlo', params['monte_carlo'], MONTE_CARLO_OPTIONS)
+    mc = optimizer.monte_carlo(parallel=params['parallel'], **params['monte_carlo'])
+    mc['summary'].rename(index=STRATEGY_NAMES).rename_axis('strategy').to_csv(
+        out_dir / f"{name}_montecarlo.csv", float_format='%.6f')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Ottimizzazione di portafoglio in batch, senza interfaccia web.")
+    parser.add_argument('portfolios', nargs='+',
+                        help="file con la lista dei ticker, uno per portafoglio (il nome è quello del file)")
+    parser.add_argument('--params', help="file JSON con i parametri dell'ottimizzazione")
+    parser.add_argument('--out', default='risultati', help="cartella di output (default: risultati)")
+    parser.add_argument('--prices', help="CSV di prezzi giornalieri da usare al posto di Yahoo Finance")
+    parser.add_argument('--store', help="percorso dell'archivio prezzi SQLite")
+    parser.add_argument('--no-store', action='store_true', help="non usare l'archivio prezzi su disco")
+    args = parser.parse_args(argv)
+
+    params, overrides = read_params(args.params)
+    source = read_prices(args.prices) if args.prices else None
+
+    # Con prezzi locali l'archivio si usa solo se richiesto esplicitamente
+    store = None
+    if not args.no_store and (args.store or not args.prices):
+        store = PriceStore(args.store) if args.store else PriceStore()
+    cache = PriceWindowCache()
+
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    summary = []
+    failed = []
+    for path in args.portfolios:
+        name = Path(path).stem
+        portfolio_params = {**params, **overrides.get(name, {})}
+        print(f"▶ {name}...", file=sys.stderr)
+        try:
+            optimizer, errors = run_portfolio(read_tickers(path), portfolio_params,
+                                              source=source, store=store, cache=cache)
+        except Exception as e:
+            print(f"  ✗ {name}: {e}", file=sys.stderr)
+            failed.append(name)
+            continue
+        if optimizer is None:
+            print(f"  ✗ {name}: servono almeno 2 ETF validi", file=sys.stderr)
+            failed.append(name)
+            continue
+        if errors:
+            print(f"  ⚠ ticker esclusi: {', '.join(errors)}", file=sys.stderr)
+
+        metrics = write_results(out_dir, name, optimizer, errors, portfolio_params)
+        best = metrics['sharpe'].astype(float).idxmax()
+        print(f"  ✓ {name}: {len(optimizer.tickers)} ETF, miglior Sharpe {best}", file=sys.stderr)
+
+        # Passi opzionali: un errore si registra (summary.csv e codice di uscita) e si prosegue
+        failed_steps = []
+        steps = [('walk_forward', "walk-forward", write_walk_forward),
+                 ('monte_carlo', "Monte Carlo", write_monte_carlo)]
+        for key, label, write in steps:
+            if not portfolio_params[key]:
+                continue
+            try:
+                write(out_dir, name, optimizer, portfolio_params)
+            except Exception as e:
+                print(f"  ✗ {label} non eseguito: {e}", file=sys.stderr)
+                failed_steps.append(key)
+        if failed_steps:
+            failed.append(name)
+
+        metrics.insert(0, 'portfolio', name)
+        metrics['failed_steps'] = ';'.join(failed_steps)
+        summary.append(metrics.rename_axis('strategy').reset_index())
+
+    if summary:
+        pd.concat(summary, ignore_index=True).to_csv(out_dir / 'summary.csv', index=False,
+                                                     float_format='%.6f')
+    return 1 if failed else 0
+
+
+# La guardia è necessaria: i pool di processi (forkserver/spawn) reimportano questo modulo
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+"""Rende importabili i moduli della radice del repository nei test."""
@@ -0,0 +1,3439 @@
+"""
+╔════════════════════════════════════════════════════════════════════════════════════════════════════╗
+║                      PORTFOLIO OPTIMIZER - MOTORE DI CALCOLO                                       ║
+║                                                                                                    ║
+║  Download dei dati, selezione del benchmark, ottimizzazione e metriche del portafoglio.            ║
+║  Non importa Streamlit: è condiviso dalla web app (app.py) e dal batch headless (batch.py).       ║
+║  matplotlib e seaborn vengono caricati solo dai metodi di plotting.                                ║
+║                                                                                                    ║
+║  Autori: Ciullo, Elisabetta, Campeggio, De Pascalis                                               ║
+╚════════════════════════════════════════════════════════════════════════════════════════════════════╝
+"""
+
+import pandas as pd
+import numpy as np
+from dataclasses import dataclass
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import copy
+import hashlib
+import importlib
+import io
+import multiprocessing
+import os
+import sqlite3
+import sys
+import threading
+import time
+import warnings
+
+warnings.filterwarnings('ignore')
+
+
+# ════════════════════════════════════════════════════════════════════════════════
+# IMPORT DIFFERITI
+# ════════════════════════════════════════════════════════════════════════════════
+
+# Secondi spesi nel primo import di ogni modulo differito (nome -> secondi)
+IMPORT_TIMINGS = {}
+
+
+class LazyModule:
+    """
+    Modulo importato al primo accesso a un suo attributo.
+    yfinance, pypfopt, cvxpy, scipy e le librerie di plotting costano diversi
+    secondi di import: così si caricano solo quando servono davvero.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            fresh = self._name not in sys.modules
+            t0 = time.perf_counter()
+            self._module = importlib.import_module(self._name)
+            if fresh:
+                IMPORT_TIMINGS[self._name] = time.perf_counter() - t0
+        return self._module
+
+    def __getattr__(self, attr):
+        if attr.startswith('__'):
+            raise AttributeError(attr)
+        return getattr(self._load(), attr)
+
+
+yf = LazyModule('yfinance')
+pypfopt = LazyModule('pypfopt')
+expected_returns = LazyModule('pypfopt.expected_returns')
+risk_models = LazyModule('pypfopt.risk_models')
+optimize = LazyModule('scipy.optimize')
+linalg = LazyModule('scipy.linalg')
+hierarchy = LazyModule('scipy.cluster.hierarchy')
+distance = LazyModule('scipy.spatial.distance')
+cp = LazyModule('cvxpy')
+plt = LazyModule('matplotlib.pyplot')
+sns = LazyModule('seaborn')
+
+
+# ════════════════════════════════════════════════════════════════════════════════
+# CONFIGURAZIONI DEFAULT
+# ════════════════════════════════════════════════════════════════════════════════
+
+BENCHMARK_CANDIDATES = [
+    {'ticker': 'SPY', 'name': 'S&P 500'},
+    {'ticker': 'QQQ', 'name': 'NASDAQ 100'},
+    {'ticker': 'VTI', 'name': 'Total US'},
+    {'ticker': 'XLK', 'name': 'Tech SPDR'},
+    {'ticker': 'SMH', 'name': 'Semiconductor'},
+    {'ticker': 'VUG', 'name': 'Growth'},
+]
+
+DEFAULT_SECTOR_MAP = {
+    'SXLK': 'Technology', 'XDWT': 'Technology', 'XLK': 'Technology', 'VGT': 'Technology', 'IYW': 'Technology',
+    'CSNDX': 'NASDAQ', 'NQSE': 'NASDAQ', 'QQQ': 'NASDAQ', 'TQQQ': 'NASDAQ',
+    'AIQ': 'AI', 'WTAI': 'AI', 'BOTZ': 'AI', 'ROBO': 'AI', 'IRBO': 'AI',
+    'SMH': 'Semiconductor', 'SOXX': 'Semiconductor', 'FTXL': 'Semiconductor', 'HNSC': 'Semiconductor', 'PSI': 'Semiconductor',
+    'WTEC': 'Cloud', 'SKYY': 'Cloud', 'CLOU': 'Cloud', 'XNGI': 'Cloud', 'WCLD': 'Cloud',
+    'SIXG': 'EmergingTech', 'QTUM': 'EmergingTech', 'ARKQ': 'EmergingTech', 'ARKG': 'EmergingTech',
+    'CTEK': 'CleanEnergy', 'ICLN': 'CleanEnergy', 'TAN': 'CleanEnergy', 'QCLN': 'CleanEnergy',
+    'SEME': 'EmergingMarkets', 'EEM': 'EmergingMarkets', 'VWO': 'EmergingMarkets', 'IEMG': 'EmergingMarkets',
+    'CIBR': 'Cybersecurity', 'HACK': 'Cybersecurity', 'BUG': 'Cybersecurity',
+    'FINX': 'Fintech', 'ARKF': 'Fintech',
+    'IBB': 'HealthTech', 'XBI': 'HealthTech',
+}
+
+DEFAULT_SECTOR_LIMITS = {
+    'Technology': 0.35,
+    'NASDAQ': 0.30,
+    'AI': 0.25,
+    'Semiconductor': 0.30,
+    'Cloud': 0.25,
+    'EmergingTech': 0.20,
+    'CleanEnergy': 0.20,
+    'EmergingMarkets': 0.15,
+    'Cybersecurity': 0.20,
+    'Fintech': 0.15,
+    'HealthTech': 0.20,
+    'Other': 0.25,
+}
+
+# ════════════════════════════════════════════════════════════════════════════════
+# MOTORE DI DOWNLOAD CONCORRENTE
+# ════════════════════════════════════════════════════════════════════════════════
+
+EU_SUFFIXES = ['.L', '.DE', '.MI']
+MIN_HISTORY_DAYS = 50
+DOWNLOAD_BATCH_SIZE = 25
+DOWNLOAD_MAX_WORKERS = 8
+
+
+def _normalize_index(prices):
+    """Rimuove il fuso orario e porta l'indice a mezzanotte."""
+    idx = pd.to_datetime(prices.index)
+    if idx.tz is not None:
+        idx = idx.tz_localize(None)
+    prices.index = idx.normalize()
+    return prices
+
+
+def _extract_close(frame, symbol):
+    """Estrae la serie 'Close' di un simbolo da un download multi-ticker."""
+    if isinstance(frame.columns, pd.MultiIndex):
+        for level in range(frame.columns.nlevels):
+            if symbol in frame.columns.get_level_values(level):
+                frame = frame.xs(symbol, axis=1, level=level)
+                break
+        else:
+            return None
+    if 'Close' not in frame.columns:
+        return None
+    close = frame['Close']
+    if isinstance(close, pd.DataFrame):
+        close = close.squeeze(axis=1)
+    return _normalize_index(close.dropna().astype(float))
+
+
+def yahoo_price_source(symbols, start_date, end_date):
+    """
+    Sorgente prezzi Yahoo Finance: UNA richiesta per un gruppo di simboli.
+    Restituisce un dizionario simbolo -> Series dei prezzi di chiusura.
+    """
+    frame = yf.download(list(symbols), start=start_date, end=end_date, auto_adjust=True,
+                        group_by='ticker', threads=False, progress=False)
+    if frame is None or frame.empty:
+        return {}
+
+    out = {}
+    for s in symbols:
+        close = _extract_close(frame, s)
+        if close is not None and not close.empty:
+            out[s] = close
+    return out
+
+
+class LocalPriceSource:
+    """
+    Sorgente prezzi locale con la stessa interfaccia di yahoo_price_source.
+    Accetta un DataFrame (una colonna per simbolo) o un dizionario di Series;
+    registra ogni richiesta in `calls`. Utile per test offline e job batch.
+    """
+
+    def __init__(self, prices):
+        self.prices = {s: _normalize_index(pd.Series(p).dropna().astype(float))
+                       for s, p in prices.items()}
+        self.calls = []
+
+    def __call__(self, symbols, start_date, end_date):
+        self.calls.append((tuple(symbols), start_date, end_date))
+        start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+        out = {}
+        for s in symbols:
+            p = self.prices.get(s)
+            if p is None:
+                continue
+            p = p[(p.index >= start) & (p.index < end)]
+            if not p.empty:
+                out[s] = p
+        return out
+
+
+def _run_jobs(jobs, source, max_workers):
+    """
+    Esegue le richieste (simboli, inizio, fine) su un pool limitato di thread.
+    Restituisce (dizionari scaricati nello stesso ordine, simboli delle
+    richieste fallite): una richiesta fallita dà {} ma i suoi simboli
+    finiscono tra i falliti, distinti da quelli senza dati.
+    """
+    if not jobs:
+        return [], set()
+
+    def run(job):
+        try:
+            return source(*job), False
+        except Exception:
+            return {}, True
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(jobs)))) as pool:
+        outcomes = list(pool.map(run, jobs))
+    failed = {s for job, (_, error) in zip(jobs, outcomes) if error for s in job[0]}
+    return [data or {} for data, _ in outcomes], failed
+
+
+def _chunks(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _load_symbols(symbols, start_date, end_date, source, store, batch_size, max_workers):
+    """
+    Carica i simboli per la finestra richiesta. Senza archivio scarica tutto;
+    con l'archivio scarica solo gli intervalli mancanti, raggruppando i simboli
+    che condividono lo stesso buco (un refresh giornaliero diventa un'unica
+    richiesta multi-simbolo), salva le nuove barre e legge la finestra dal disco.
+    Restituisce (dict simbolo -> Series, simboli con almeno una richiesta fallita).
+    """
+    if store is None:
+        found = {}
+        jobs = [(b, start_date, end_date) for b in _chunks(list(symbols), batch_size)]
+        results, failed = _run_jobs(jobs, source, max_workers)
+        for data in results:
+            found.update(data)
+        return found, failed
+
+    gaps = {}
+    for s in symbols:
+        for rng in store.missing_ranges(s, start_date, end_date):
+            gaps.setdefault(rng, []).append(s)
+
+    jobs = [(b, rng[0], rng[1]) for rng, syms in gaps.items() for b in _chunks(syms, batch_size)]
+    results, failed = _run_jobs(jobs, source, max_workers)
+    for (batch, start, end), data in zip(jobs, results):
+        for s, prices in data.items():
+            store.save(s, prices, start, end)
+
+    found = {}
+    for s in symbols:
+        prices = store.load(s, start_date, end_date)
+        if not prices.empty:
+            found[s] = prices
+    return found, failed
+
+
+def fetch_prices(tickers, start_date, end_date, source=None, suffixes=EU_SUFFIXES, store=None,
+                 batch_size=DOWNLOAD_BATCH_SIZE, max_workers=DOWNLOAD_MAX_WORKERS):
+    """
+    Scarica i prezzi di chiusura giornalieri di molti ticker in parallelo.
+
+    Ogni fase invia richieste multi-simbolo: prima i ticker così come sono,
+    poi - solo per quelli ancora mancanti - con i suffissi europei, uno per fase.
+    Se viene passato un PriceStore, si scaricano solo le date non ancora in archivio
+    e si riusa l'indice di risoluzione: i ticker già risolti vanno direttamente
+    al simbolo giusto, quelli senza dati non generano richieste.
+    Un ticker è segnato come morto solo se tutte le sue richieste sono
+    riuscite senza dati: dopo un errore di rete resta tra i non trovati
+    ma verrà richiesto di nuovo.
+    Restituisce (dict ticker -> Series, lista dei ticker non trovati).
+    """
+    all_data, errors, _ = _fetch_prices(tickers, start_date, end_date, source, suffixes, store,
+                                        batch_size, max_workers)
+    return all_data, errors
+
+
+def _fetch_prices(tickers, start_date, end_date, source, suffixes, store, batch_size, max_workers):
+    """Come fetch_prices, ma restituisce anche l'insieme dei ticker con richieste fallite."""
+    source = source or yahoo_price_source
+    all_data = {}
+    pending = list(dict.fromkeys(tickers))
+
+    if store is not None:
+        known = {t: store.resolution(t) for t in pending}
+        resolved = {t: s for t, s in known.items() if s}
+        got, _ = _load_symbols(list(resolved.values()), start_date, end_date,
+                               source, store, batch_size, max_workers)
+        for t, s in resolved.items():
+            prices = got.get(s)
+            if prices is not None and len(prices) >= MIN_HISTORY_DAYS:
+                all_data[t] = prices
+        pending = [t for t in pending if known[t] is None]
+
+    seen = set()
+    failed = set()
+    for sfx in [''] + list(suffixes):
+        if not pending:
+            break
+        got, failed_symbols = _load_symbols([t + sfx for t in pending], start_date, end_date,
+                                            source, store, batch_size, max_workers)
+        still_missing = []
+        for t in pending:
+            prices = got.get(t + sfx)
+            if t + sfx in failed_symbols:
+                failed.add(t)
+            if prices is not None:
+                seen.add(t)
+            if prices is not None and len(prices) >= MIN_HISTORY_DAYS:
+                all_data[t] = prices
+                if store is not None:
+                    store.remember(t, t + sfx)
+            else:
+                still_missing.append(t)
+        pending = still_missing
+
+    if store is not None:
+        # Tutte le varianti hanno risposto senza dati: il ticker è considerato morto
+        for t in pending:
+            if t not in seen and t not in failed:
+                store.remember(t, None)
+
+    errors = [t for t in tickers if t not in all_data]
+    return all_data, errors, failed
+
+
+# ════════════════════════════════════════════════════════════════════════════════
+# ARCHIVIO PREZZI PERSISTENTE (SQLITE)
+# ════════════════════════════════════════════════════════════════════════════════
+
+DEAD_SYMBOL = ''
+DEAD_SYMBOL_TTL_DAYS = 30
+
+PRICE_STORE_PATH = os.environ.get(
+    'CDEC_PRICE_STORE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'cdec_optimizer', 'prices.sqlite')
+)
+
+
+class PriceStore:
+    """
+    Archivio locale dei prezzi giornalieri, una serie per simbolo.
+
+    Per ogni simbolo registra anche l'intervallo di date già richiesto
+    (`coverage`, fine esclusa), così i download successivi chiedono solo
+    le date mancanti. La giornata odierna non viene mai considerata coperta,
+    perché la sua barra può essere ancora provvisoria.
+
+    Conserva inoltre l'indice di risoluzione dei ticker: quale variante
+    (nuda o con suffisso europeo) ha funzionato e quali ticker non esistono.
+    """
+
+    def __init__(self, path=PRICE_STORE_PATH):
+        self.path = path
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS prices (
+                    symbol TEXT NOT NULL, date TEXT NOT NULL, close REAL NOT NULL,
+                    PRIMARY KEY (symbol, date)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS coverage (
+                    symbol TEXT PRIMARY KEY, start TEXT NOT NULL, end TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS symbols (
+                    ticker TEXT PRIMARY KEY, symbol TEXT, checked TEXT NOT NULL
+                );
+            """)
+
+    @staticmethod
+    def _day(value):
+        return pd.Timestamp(value).strftime('%Y-%m-%d')
+
+    def coverage(self, symbol):
+        """Intervallo [inizio, fine) già scaricato per il simbolo, o None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT start, end FROM coverage WHERE symbol = ?", (symbol,)
+            ).fetchone()
+        return row
+
+    def missing_ranges(self, symbol, start_date, end_date):
+        """
+        Intervalli [inizio, fine) da scaricare per coprire la finestra. Se la
+        finestra è tutta prima o dopo la copertura si scarica anche il buco
+        intermedio, così la copertura resta un unico intervallo.
+        """
+        start, end = self._day(start_date), self._day(end_date)
+        cov = self.coverage(symbol)
+        if cov is None:
+            return [(start, end)]
+
+        lo, hi = cov
+        missing = []
+        if start < lo:
+            missing.append((start, lo))
+        if end > hi:
+            missing.append((hi, end))
+        return [(a, b) for a, b in missing if a < b]
+
+    def load(self, symbol, start_date, end_date):
+        """Legge la serie dei prezzi di chiusura nella finestra [inizio, fine)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT date, close FROM prices WHERE symbol = ? AND date >= ? AND date < ? "
+                "ORDER BY date",
+                (symbol, self._day(start_date), self._day(end_date))
+            ).fetchall()
+        if not rows:
+            return pd.Series(dtype=float, name='Close')
+        dates, closes = zip(*rows)
+        return pd.Series(closes, index=pd.DatetimeIndex(dates), name='Close', dtype=float)
+
+    def save(self, symbol, prices, start_date, end_date):
+        """Salva le barre scaricate per [inizio, fine) ed estende la copertura."""
+        prices = prices.dropna()
+        rows = [(symbol, d.strftime('%Y-%m-%d'), float(v)) for d, v in prices.items()]
+        start = self._day(start_date)
+        end = min(self._day(end_date), pd.Timestamp.today().strftime('%Y-%m-%d'))
+
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO prices (symbol, date, close) VALUES (?, ?, ?)", rows
+            )
+            if start >= end:
+                return
+            row = self._conn.execute(
+                "SELECT start, end FROM coverage WHERE symbol = ?", (symbol,)
+            ).fetchone()
+            if row is None:
+                lo, hi = start, end
+            elif start <= row[1] and end >= row[0]:
+                # Intervalli contigui o sovrapposti: si uniscono
+                lo, hi = min(start, row[0]), max(end, row[1])
+            else:
+                return
+            self._conn.execute(
+                "INSERT OR REPLACE INTO coverage (symbol, start, end) VALUES (?, ?, ?)",
+                (symbol, lo, hi)
+            )
+
+    def resolution(self, ticker):
+        """
+        Simbolo risolto per il ticker (es. 'SXLK' -> 'SXLK.MI'), DEAD_SYMBOL se
+        nessuna variante ha dati, None se il ticker non è mai stato risolto.
+        I ticker morti vengono ricontrollati dopo DEAD_SYMBOL_TTL_DAYS giorni.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT symbol, checked FROM symbols WHERE ticker = ?", (ticker,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        symbol, checked = row
+        if symbol is not None:
+            return symbol
+        if pd.Timestamp(checked) < pd.Timestamp.today() - pd.Timedelta(days=DEAD_SYMBOL_TTL_DAYS):
+            return None
+        return DEAD_SYMBOL
+
+    def remember(self, ticker, symbol):
+        """Registra il simbolo risolto per il ticker (None = ticker senza dati)."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO symbols (ticker, symbol, checked) VALUES (?, ?, ?)",
+                (ticker, symbol, pd.Timestamp.today().strftime('%Y-%m-%d'))
+            )
+
+
+# ════════════════════════════════════════════════════════════════════════════════
+# CACHE IN MEMORIA DELLE FINESTRE GIÀ CARICATE
+# ════════════════════════════════════════════════════════════════════════════════
+
+# Validità delle finestre che includono la barra provvisoria di oggi
+PROVISIONAL_TTL_SECONDS = 15 * 60
+
+
+class PriceWindowCache:
+    """
+    Cache in memoria delle serie giornaliere già caricate, per ticker.
+
+    Per ogni ticker conserva la serie e la finestra [inizio, fine) da cui è
+    stata ottenuta: qualsiasi sotto-finestra viene servita tagliando la serie,
+    senza rete né disco. Un ticker senza dati in una finestra (meno di
+    MIN_HISTORY_DAYS barre) non ne ha neanche nelle sotto-finestre, quindi
+    viene memorizzato come None; i download falliti non vanno memorizzati.
+    Le finestre che arrivano a oggi contengono la barra provvisoria del
+    giorno (come in PriceStore) e scadono dopo provisional_ttl secondi.
+    """
+
+    def __init__(self, provisional_ttl=PROVISIONAL_TTL_SECONDS):
+        self.provisional_ttl = provisional_ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, start_date, end_date):
+        """Restituisce (trovato, serie o None) per la finestra richiesta."""
+        start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[3] is not None and time.monotonic() > entry[3]:
+                del self._entries[key]
+                entry = None
+        if entry is None or start < entry[1] or end > entry[2]:
+            return False, None
+
+        prices = entry[0]
+        if prices is None:
+            return True, None
+        return True, prices[(prices.index >= start) & (prices.index < end)]
+
+    def put(self, key, prices, start_date, end_date):
+        """Memorizza la serie, unendola a quella esistente se le finestre si toccano."""
+        start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+        expires = None
+        if end >= pd.Timestamp.today().normalize():
+            expires = time.monotonic() + self.provisional_ttl
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and start <= entry[2] and end >= entry[1]:
+                old, lo, hi, old_expires = entry
+                if prices is None or old is None:
+                    # Con dati parziali la finestra più ampia resta la più affidabile
+                    if (end - start) < (hi - lo):
+                        return
+                else:
+                    prices = prices.combine_first(old)
+                    start, end = min(start, lo), max(end, hi)
+                    if old_expires is not None:
+                        expires = old_expires if expires is None else min(expires, old_expires)
+            self._entries[key] = (prices, start, end, expires)
+
+
+def load_prices(tickers, start_date, end_date, suffixes=EU_SUFFIXES, source=None,
+                store=None, cache=None):
+    """
+    Carica le serie giornaliere dei ticker per la finestra richiesta.
+    I ticker già coperti dalla cache in memoria vengono tagliati localmente,
+    gli altri passano da fetch_prices (archivio su disco e rete).
+    Restituisce (dict ticker -> Series, lista dei ticker non trovati).
+    """
+    found, misses = {}, []
+    for t in dict.fromkeys(tickers):
+        hit, prices = cache.get((t, tuple(suffixes)), start_date, end_date) if cache else (False, None)
+        if hit:
+            found[t] = prices
+        else:
+            misses.append(t)
+
+    if misses:
+        fetched, _, failed = _fetch_prices(misses, start_date, end_date, source, suffixes, store,
+                                           DOWNLOAD_BATCH_SIZE, DOWNLOAD_MAX_WORKERS)
+        for t in misses:
+            found[t] = fetched.get(t)
+            # Un download fallito si riprova alla prossima richiesta
+            if cache is not None and t not in failed:
+                cache.put((t, tuple(suffixes)), found[t], start_date, end_date)
+
+    all_data = {t: p for t, p in found.items() if p is not None and len(p) >= MIN_HISTORY_DAYS}
+    errors = [t for t in tickers if t not in all_data]
+    return all_data, errors
+
+
+def build_weekly_series(daily):
+    """Prezzi settimanali e rendimenti (%) di una singola serie giornaliera."""
+    weekly = daily.resample('W').last().dropna()
+    
+    if isinstance(weekly, pd.DataFrame):
+        weekly = weekly.squeeze()
+    
+    returns = weekly.pct_change().dropna() * 100
+    return weekly, returns
+
+
+def build_weekly_panel(all_data):
+    """Allinea le serie giornaliere e calcola prezzi e rendimenti (%) settimanali."""
+    df = pd.DataFrame(all_data).ffill(limit=5).bfill(limit=5).dropna()
+    prices = df.resample('W').last().dropna()
+    returns = prices.pct_change().dropna() * 100
+    return prices, returns
+
+
+# ════════════════════════════════════════════════════════════════════════════════
+# KERNEL NUMERICI VETTORIZZATI
+# ════════════════════════════════════════════════════════════════════════════════
+
+def performance_kernel(rd, risk_free_rate, periods=52):
+    """
+    Metriche di performance per ogni colonna di una matrice di rendimenti
+    decimali (T x K), in un'unica passata NumPy. I NaN indicano periodi
+    mancanti e vengono esclusi colonna per colonna.
+
+    Restituisce array di lunghezza K con le stesse definizioni di
+    PortfolioOptimizer.stats: 'ret', 'vol', 'sharpe', 'sortino', 'mdd', 'calmar'.
+    """
+    rd = np.asarray(rd, dtype=float)
+    if rd.ndim == 1:
+        rd = rd[:, None]
+    valid = ~np.isnan(rd)
+    n = valid.sum(axis=0)
+    r0 = np.where(valid, rd, 0.0)
+    rf = risk_free_rate / periods
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # CAGR: prodotto dei (1 + r) elevato a periodi/osservazioni
+        log_growth = np.log1p(r0).sum(axis=0)
+        ret = np.where(n > 0, np.expm1(log_growth * periods / n) * 100, 0.0)
+
+        mean = r0.sum(axis=0) / n
+        dev = np.where(valid, rd - mean, 0.0)
+        vol = np.sqrt((dev ** 2).sum(axis=0) / (n - 1)) * np.sqrt(periods) * 100
+        vol = np.nan_to_num(vol)
+        excess = ret - risk_free_rate * 100
+        sharpe = np.where(vol > 0, excess / vol, 0.0)
+
+        down = valid & (rd < rf)
+        n_down = down.sum(axis=0)
+        dsq = np.where(down, (rd - rf) ** 2, 0.0).sum(axis=0)
+        dd = np.where(n_down > 0, np.sqrt(dsq / n_down) * np.sqrt(periods) * 100, vol * 0.7)
+        sortino = np.where(dd > 0, excess / dd, 0.0)
+
+        cum = np.exp(np.cumsum(np.log1p(r0), axis=0))
+        cum[~valid] = np.nan
+        peak = np.fmax.accumulate(cum, axis=0)
+        drawdown = np.where(valid, (cum - peak) / peak, 0.0)
+        mdd = np.abs(drawdown.min(axis=0)) * 100 if len(rd) else np.zeros(rd.shape[1])
+        calmar = np.where(mdd > 0, ret / mdd, 0.0)
+
+    return {'ret': ret, 'vol': vol, 'sharpe': sharpe,
+            'sortino': sortino, 'mdd': mdd, 'calmar': calmar}
+
+
+def pairwise_kernel(p, X, periods=52):
+    """
+    Correlazione, tracking error e beta di una serie (T) rispetto a ogni
+    colonna di X (T x K), usando per ogni colonna solo le date comuni.
+    Restituisce (corr, te, beta, n_comuni) come array di lunghezza K.
+    """
+    p = np.asarray(p, dtype=float)
+    X = np.asarray(X, dtype=float)
+    mask = ~np.isnan(X) & ~np.isnan(p)[:, None]
+    n = mask.sum(axis=0)
+    P = np.where(mask, p[:, None], 0.0)
+    B = np.where(mask, X, 0.0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dp = np.where(mask, P - P.sum(axis=0) / n, 0.0)
+        db = np.where(mask, B - B.sum(axis=0) / n, 0.0)
+        cov = (dp * db).sum(axis=0) / (n - 1)
+        var_p = (dp ** 2).sum(axis=0) / (n - 1)
+        var_b = (db ** 2).sum(axis=0) / (n - 1)
+        corr = cov / np.sqrt(var_p * var_b)
+
+        diff = dp - db
+        te = np.sqrt((diff ** 2).sum(axis=0) / (n - 1)) * np.sqrt(periods)
+        beta = np.where(var_b > 0, cov / var_b, 1.0)
+
+    return corr, te, beta, n
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Indici dei punti scelti da Largest-Triangle-Three-Buckets: riduce una
+    serie a n_out punti conservandone la forma (picchi e minimi inclusi).
+    Primo e ultimo punto sono sempre tenuti; x deve essere crescente.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    idx = np.empty(n_out, dtype=int)
+    idx[0], idx[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            nxt = slice(hi, edges[i + 2])
+            cx, cy = x[nxt].mean(), y[nxt].mean()
+        else:
+            cx, cy = x[-1], y[-1]
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        idx[i + 1] = a
+    return idx
+
+
+def downsample(series, max_points):
+    """Serie ridotta con LTTB a max_points punti (invariata se già più corta)."""
+    if max_points is None or len(series) <= max_points:
+        return series
+    x = series.index.asi8 if isinstance(series.index, pd.DatetimeIndex) else np.arange(len(series))
+    return series.iloc[lttb_indices(x, series.to_numpy(dtype=float), max_points)]
+
+
+def rebalance_flags(dates, schedule):
+    """
+    Calendario di ribilanciamento fisso: array bool (T) vero nei periodi
+    all'inizio dei quali si torna ai pesi target. schedule: 'weekly',
+    'monthly' o 'quarterly' (primo periodo di ogni mese/trimestre), oppure
+    'none' (buy & hold). Il primo periodo è sempre un ribilanciamento.
+    """
+    dates = pd.DatetimeIndex(dates)
+    if schedule == 'weekly':
+        flags = np.ones(len(dates), dtype=bool)
+    elif schedule in ('monthly', 'quarterly'):
+        period = dates.to_period('M' if schedule == 'monthly' else 'Q')
+        flags = np.r_[True, period[1:] != period[:-1]]
+    elif schedule == 'none':
+        flags = np.zeros(len(dates), dtype=bool)
+    else:
+        raise ValueError(f"Calendario di ribilanciamento sconosciuto: {schedule}")
+    flags[:1] = True
+    return flags
+
+
+def _drift(R, W, flags):
+    """
+    Crescita dei pesi tra un ribilanciamento e l'altro, per tutti i periodi
+    e le strategie insieme. R: T x n, W: K x n, flags: T x K.
+    Restituisce (valore del segmento V: T x K, pesi derivati D: T x K x n).
+    """
+    T = len(R)
+    logs = np.vstack([np.zeros(R.shape[1]), np.cumsum(np.log1p(R), axis=0)])
+    start = np.maximum.accumulate(np.where(flags, np.arange(T)[:, None], 0), axis=0)
+    growth = np.exp(logs[1:, None, :] - logs[start])
+    held = W[None, :, :] * growth
+    value = held.sum(axis=2)
+    return value, held / value[:, :, None]
+
+
+def threshold_flags(R, W, threshold):
+    """
+    Ribilanciamenti a soglia (T x K): si torna ai pesi target all'inizio del
+    periodo successivo a quello in cui un peso si è allontanato dal target
+    di più di `threshold`. Il ciclo è sugli eventi di ribilanciamento, non sui
+    periodi: da ogni ribilanciamento la deriva futura si calcola in blocco.
+    """
+    T = len(R)
+    flags = np.zeros((T, len(W)), dtype=bool)
+    logs = np.vstack([np.zeros(R.shape[1]), np.cumsum(np.log1p(R), axis=0)])
+    for k, w in enumerate(W):
+        start = 0
+        while start < T:
+            flags[start, k] = True
+            held = w * np.exp(logs[start + 1:] - logs[start])
+            gap = np.abs(held / held.sum(axis=1, keepdims=True) - w).max(axis=1)
+            breach = np.flatnonzero(gap > threshold)
+            if len(breach) == 0:
+                break
+            start += breach[0] + 1
+    return flags
+
+
+def simulate_rebalancing(R, W, flags, cost_bps=0.0):
+    """
+    Simula K portafogli con pesi target W (K x n) sui rendimenti decimali R
+    (T x n), ribilanciati nei periodi indicati da flags (T o T x K).
+    Tra un ribilanciamento e l'altro i pesi derivano con i prezzi; a ogni
+    ribilanciamento il turnover è Σ|w_target - w_derivati| e il costo è
+    turnover x cost_bps / 10000 (l'allocazione iniziale è gratuita).
+
+    Restituisce array NumPy: 'returns' netti (T x K), 'equity' netta base 1
+    (T x K), 'turnover' (T x K) e 'weights' derivati a fine periodo (T x K x n).
+    Con ribilanciamento a ogni periodo e costo nullo i rendimenti coincidono
+    con R @ W.T.
+    """
+    R = np.asarray(R, dtype=float)
+    W = np.atleast_2d(np.asarray(W, dtype=float))
+    flags = np.asarray(flags, dtype=bool)
+    if flags.ndim == 1:
+        flags = np.repeat(flags[:, None], len(W), axis=1)
+    flags = flags.copy()
+    flags[0] = True
+    
+    value, weights = _drift(R, W, flags)
+    prev_value = np.where(flags, 1.0, np.vstack([np.ones((1, len(W))), value[:-1]]))
+    gross = value / prev_value - 1
+    
+    turnover = np.zeros_like(gross)
+    turnover[1:] = np.where(flags[1:], np.abs(W[None, :, :] - weights[:-1]).sum(axis=2), 0.0)
+    net = (1 - turnover * cost_bps / 10000) * (1 + gross) - 1
+    
+    return {
+        'returns': net,
+        'equity': np.cumprod(1 + net, axis=0),
+        'turnover': turnover,
+        'weights': weights,
+    }
+
+
+# Elementi massimi (percorsi x settimane x strategie) di un blocco Monte Carlo
+MC_CHUNK_ELEMENTS = 2_000_000
+# Sotto questo numero di blocchi l'avvio del pool costa più della simulazione
+MC_MIN_PARALLEL_CHUNKS = 4
+# Simulazioni Monte Carlo ricordate per ottimizzatore
+MC_MEMO_SIZE = 4
+
+
+def monte_carlo_chunk(seed, n_paths, horizon, mean=None, factor=None, history=None, block_size=4):
+    """
+    Un blocco di n_paths percorsi futuri di `horizon` settimane per K
+    strategie, direttamente nello spazio dei portafogli. Con mean (K) e
+    factor (K x K, F @ F.T = covarianza settimanale) i rendimenti sono
+    normali multivariati; con history (T x K, rendimenti storici decimali)
+    sono un block bootstrap circolare a blocchi di block_size settimane.
+
+    Restituisce (ricchezza finale base 1, max drawdown), entrambi n_paths x K:
+    il tensore dei percorsi esiste solo per il blocco corrente.
+    """
+    rng = np.random.default_rng(seed)
+    if history is None:
+        r = rng.standard_normal((n_paths, horizon, len(mean))) @ factor.T
+        r += 1 + mean
+    else:
+        n_blocks = -(-horizon // block_size)
+        starts = rng.integers(0, len(history), size=(n_paths, n_blocks, 1))
+        idx = ((starts + np.arange(block_size)) % len(history)).reshape(n_paths, -1)[:, :horizon]
+        r = history[idx]
+        r += 1
+    
+    # Operazioni in place: oltre ai rendimenti serve un solo altro tensore del blocco
+    wealth = np.cumprod(r, axis=1, out=r)
+    ratio = np.maximum.accumulate(wealth, axis=1)
+    np.maximum(ratio, 1.0, out=ratio)
+    np.divide(wealth, ratio, out=ratio)
+    return wealth[:, -1].copy(), 1 - ratio.min(axis=1)
+
+
+# ════════════════════════════════════════════════════════════════════════════════
+# CLASSE BENCHMARK ANALYZER
+# ════════════════════════════════════════════════════════════════════════════════
+
+class BenchmarkAnalyzer:
+    """Analizza e seleziona automaticamente il benchmark più appropriato."""
+    
+    def __init__(self, start_date, end_date, risk_free_rate=0.02,
+                 store=None, cache=None, source=None):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.risk_free_rate = risk_free_rate
+        self.store = store
+        self.cache = cache
+        self.source = source
+        self.benchmark_prices = {}
+        self.benchmark_returns = {}
+        self.benchmark_metrics = {}
+        self.best_benchmark = None
+        self._prefetch = None
+        self._prefetch_failed = set()
+        self.ranking = None
+
+    def prefetch(self, candidates=None, store=None, cache=None, source=None):
+        """
+        Carica tutti i benchmark candidati con un unico download multi-simbolo.
+        I ticker senza dati sufficienti non verranno più richiesti.
+        """
+        tickers = [b['ticker'] for b in (candidates or BENCHMARK_CANDIDATES)]
+        data, errors = load_prices(tickers, self.start_date, self.end_date, suffixes=(),
+                                   source=source or self.source,
+                                   store=store or self.store,
+                                   cache=cache or self.cache)
+        for ticker, daily in data.items():
+            weekly, returns = build_weekly_series(daily)
+            self.benchmark_prices[ticker] = weekly
+            self.benchmark_returns[ticker] = returns
+        self._prefetch_failed.update(errors)
+
+    def start_prefetch(self, candidates=None, store=None, cache=None, source=None):
+        """
+        Avvia prefetch() in un thread in background e ritorna subito, così il
+        download dei benchmark si sovrappone a quello degli asset.
+        Archivio e cache vanno risolti nel thread chiamante.
+        """
+        pool = ThreadPoolExecutor(max_workers=1)
+        self._prefetch = pool.submit(self.prefetch, candidates, store, cache, source)
+        pool.shutdown(wait=False)
+        return self._prefetch
+
+    def detached_copy(self):
+        """
+        Copia con dizionari propri (serie e metriche condivise, non vengono
+        mai modificate sul posto); archivio, cache e sorgente restano comuni.
+        """
+        self._wait_prefetch()
+        new = copy.copy(self)
+        new.benchmark_prices = dict(self.benchmark_prices)
+        new.benchmark_returns = dict(self.benchmark_returns)
+        new.benchmark_metrics = dict(self.benchmark_metrics)
+        new.best_benchmark = copy.deepcopy(self.best_benchmark)
+        new._prefetch_failed = set(self._prefetch_failed)
+        return new
+
+    def _wait_prefetch(self):
+        """Attende l'eventuale prefetch in corso (gli errori ricadono sul download singolo)."""
+        if self._prefetch is None:
+            return
+        try:
+            self._prefetch.result()
+        except Exception:
+            pass
+        self._prefetch = None
+
+    def download_benchmark_data(self, ticker):
+        """Scarica dati benchmark con cache."""
+        self._wait_prefetch()
+        if ticker in self.benchmark_prices:
+            return True
+        if ticker in self._prefetch_failed:
+            return False
+        
+        try:
+            data, _ = load_prices([ticker], self.start_date, self.end_date, suffixes=(),
+                                  source=self.source, store=self.store, cache=self.cache)
+        except Exception:
+            return False
+        if ticker not in data:
+            return False
+        
+        prices, returns = build_weekly_series(data[ticker])
+        self.benchmark_prices[ticker] = prices
+        self.benchmark_returns[ticker] = returns
+        return len(returns) >= 20
+
+    def calculate_metrics(self, ticker):
+        """Calcola le metriche di performance per un benchmark."""
+        if not self.download_benchmark_data(ticker):
+            return None
+        
+        ret = self.benchmark_returns[ticker]
+        prices = self.benchmark_prices[ticker]
+        
+        # Rendimento annualizzato
+        mu = float(expected_returns.mean_historical_return(
+            pd.DataFrame({ticker: prices}), frequency=52
+        ).iloc[0]) * 100
+        
+        rd = ret / 100
+        vol = float(rd.std() * np.sqrt(52) * 100)
+        excess = mu - self.risk_free_rate * 100
+        sharpe = excess / vol if vol > 0 else 0
+        
+        ds = rd[rd < self.risk_free_rate/52]
+        dd = float(np.sqrt(((ds - self.risk_free_rate/52)**2).mean()) * np.sqrt(52) * 100) if len(ds) > 0 else vol * 0.7
+        sortino = excess / dd if dd > 0 else 0
+        
+        cum = (1 + rd).cumprod()
+        mdd = float(abs(((cum - cum.expanding().max()) / cum.expanding().max()).min()) * 100)
+        
+        self.benchmark_metrics[ticker] = {
+            'ticker': ticker,
+            'mean_return': mu,
+            'volatility': vol,
+            'sharpe': sharpe,
+            'sortino': sortino,
+            'max_drawdown': mdd,
+            'calmar': mu/mdd if mdd > 0 else 0
+        }
+        return self.benchmark_metrics[ticker]
+
+    def find_best(self, port_returns, port_metrics, candidates=None, vectorized=False):
+        """
+        Trova il benchmark più appropriato.
+        Con vectorized=True tutti i candidati vengono valutati in un'unica
+        passata su una matrice di rendimenti allineata (vedi _score_matrix):
+        adatto a universi di centinaia di indici.
+        """
+        candidates = candidates or BENCHMARK_CANDIDATES
+        if vectorized:
+            return self._score_matrix(port_returns, port_metrics, candidates)
+        
+        results = []
+        
+        for b in candidates:
+            m = self.calculate_metrics(b['ticker'])
+            if not m:
+                continue
+            
+            br = self.benchmark_returns[b['ticker']].copy()
+            pr = port_returns.copy()
+            pr.index = pd.to_datetime(pr.index).normalize()
+            br.index = pd.to_datetime(br.index).normalize()
+            common = pr.index.intersection(br.index)
+            
+            if len(common) < 20:
+                continue
+            
+            corr = float(pr.loc[common].corr(br.loc[common]))
+            te = float((pr.loc[common] - br.loc[common]).std() * np.sqrt(52))
+            
+            cov = np.cov(pr.loc[common]/100, br.loc[common]/100)
+            beta = cov[0,1]/cov[1,1] if cov[1,1] > 0 else 1.0
+            
+            score = (corr * 0.5 + 
+                    (1/(1+te/10)) * 0.35 + 
+                    (1/(1+abs(m['volatility']-port_metrics['vol'])/10)) * 0.15)
+            
+            results.append({
+                **m,
+                'name': b['name'],
+                'correlation': corr,
+                'tracking_error': te,
+                'beta': beta,
+                'score': score
+            })
+        
+        if not results:
+            return None
+        
+        self.best_benchmark = max(results, key=lambda x: x['score'])
+        return self.best_benchmark
+
+    def _score_matrix(self, port_returns, port_metrics, candidates):
+        """Punteggio vettorizzato di tutti i candidati (stessa formula di find_best)."""
+        self._wait_prefetch()
+        missing = [b for b in candidates
+                   if b['ticker'] not in self.benchmark_returns and b['ticker'] not in self._prefetch_failed]
+        if missing:
+            self.prefetch(missing, store=self.store, cache=self.cache, source=self.source)
+        
+        names = {b['ticker']: b['name'] for b in candidates}
+        tickers = [t for t in names
+                   if t in self.benchmark_returns and len(self.benchmark_returns[t]) >= 20]
+        if not tickers:
+            return None
+        
+        bench = pd.concat({t: self.benchmark_returns[t] for t in tickers}, axis=1)
+        bench.index = pd.to_datetime(bench.index).normalize()
+        m = performance_kernel(bench.to_numpy(dtype=float) / 100, self.risk_free_rate)
+        
+        pr = port_returns.copy()
+        pr.index = pd.to_datetime(pr.index).normalize()
+        aligned = bench.reindex(pr.index).to_numpy(dtype=float)
+        corr, te, beta, n_common = pairwise_kernel(pr.to_numpy(dtype=float), aligned)
+        
+        score = (corr * 0.5 +
+                 (1/(1+te/10)) * 0.35 +
+                 (1/(1+np.abs(m['vol']-port_metrics['vol'])/10)) * 0.15)
+        
+        ranking = pd.DataFrame({
+            'ticker': tickers,
+            'name': [names[t] for t in tickers],
+            'mean_return': m['ret'], 'volatility': m['vol'],
+            'sharpe': m['sharpe'], 'sortino': m['sortino'],
+            'max_drawdown': m['mdd'], 'calmar': m['calmar'],
+            'correlation': corr, 'tracking_error': te, 'beta': beta, 'score': score,
+        })[n_common >= 20].sort_values('score', ascending=False)
+        self.ranking = ranking
+        
+        for row in ranking.to_dict('records'):
+            self.benchmark_metrics[row['ticker']] = {
+                k: row[k] for k in ('ticker', 'mean_return', 'volatility', 'sharpe',
+                                    'sortino', 'max_drawdown', 'calmar')
+            }
+        if ranking.empty:
+            return None
+        
+        self.best_benchmark = ranking.iloc[0].to_dict()
+        return self.best_benchmark
+
+
+# ════════════════════════════════════════════════════════════════════════════════
+# MOTORE FRONTIERA EFFICIENTE PARAMETRICO
+# ════════════════════════════════════════════════════════════════════════════════
+
+def _psd_factor(S):
+    """Fattore F con F @ F.T = S (Cholesky, con piccola regolarizzazione se serve)."""
+    S = np.asarray(S, dtype=float)
+    S = (S + S.T) / 2
+    jitter = 0.0
+    for _ in range(6):
+        try:
+            return np.linalg.cholesky(S + jitter * np.eye(len(S)))
+        except np.linalg.LinAlgError:
+            jitter = max(jitter * 10, 1e-10 * float(np.trace(S)) / len(S))
+    vals, vecs = np.linalg.eigh(S)
+    return vecs * np.sqrt(np.clip(vals, 0, None))
+
+
+class FrontierEngine:
+    """
+    Frontiera efficiente con problema cvxpy compilato una sola volta.
+
+    Minimizza la varianza con il rendimento target come cp.Parameter: ogni
+    punto della frontiera è una nuova risoluzione dello stesso problema,
+    con warm start dal punto precedente. Vincoli come optimize_max_sharpe:
+    limiti sui pesi (weight_bounds) e limiti settoriali (lista di coppie
+    indici asset -> peso massimo).
+    """
+
+    ACCEPTED = ('optimal', 'optimal_inaccurate')
+
+    def __init__(self, mu, S, weight_bounds=(0, 1), sector_groups=None, factor=None):
+        self.mu = np.asarray(mu, dtype=float)
+        n = len(self.mu)
+        self.w = cp.Variable(n)
+        self.target = cp.Parameter()
+        
+        self.constraints = [cp.sum(self.w) == 1,
+                            self.w >= weight_bounds[0], self.w <= weight_bounds[1]]
+        for idx, upper in (sector_groups or []):
+            self.constraints.append(cp.sum(self.w[idx]) <= upper)
+        
+        factor = factor if factor is not None else _psd_factor(S)
+        risk = cp.sum_squares(factor.T @ self.w)
+        self.problem = cp.Problem(cp.Minimize(risk),
+                                  self.constraints + [self.mu @ self.w >= self.target])
+        self.solver = cp.OSQP if cp.OSQP in cp.installed_solvers() else None
+
+    def _solve(self, target):
+        self.target.value = float(target)
+        try:
+            self.problem.solve(solver=self.solver, warm_start=True)
+        except cp.error.SolverError:
+            return None, 'solver_error'
+        if self.problem.status not in self.ACCEPTED or self.w.value is None:
+            return None, self.problem.status
+        return self.w.value.copy(), self.problem.status
+
+    def return_range(self):
+        """Rendimento del portafoglio a varianza minima e massimo raggiungibile."""
+        w_min, _ = self._solve(self.mu.min() - 1)
+        top = cp.Problem(cp.Maximize(self.mu @ self.w), self.constraints)
+        try:
+            top.solve()
+        except cp.error.SolverError:
+            return None
+        if w_min is None or top.status not in self.ACCEPTED:
+            return None
+        return float(self.mu @ w_min), float(top.value)
+
+    def sweep(self, n_points=40):
+        """
+        Risolve la frontiera su n_points rendimenti target equispaziati tra
+        il portafoglio a varianza minima e il massimo raggiungibile.
+        Restituisce (targets, pesi n_points x n_assets, stati): le righe dei
+        punti non risolti sono NaN e il loro stato spiega il motivo.
+        """
+        bounds = self.return_range()
+        if bounds is None:
+            return np.array([]), np.empty((0, len(self.mu))), []
+        
+        targets = np.linspace(bounds[0], bounds[1], n_points)
+        weights = np.full((n_points, len(self.mu)), np.nan)
+        statuses = []
+        for i, t in enumerate(targets):
+            w, status = self._solve(t)
+            statuses.append(status)
+            if w is not None:
+                w = np.clip(w, 0, None)
+                weights[i] = w / w.sum()
+        return targets, weights, statuses
+
+
+# ════════════════════════════════════════════════════════════════════════════════
+# MOTORE RESAMPLING (FRONTIERA DI MICHAUD)
+# ════════════════════════════════════════════════════════════════════════════════
+
+def bootstrap_indices(n_periods, n_resamples, seed=None):
+    """Tensore n_resamples x n_periods di indici di settimane estratti con reimmissione."""
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, n_periods, size=(n_resamples, n_periods))
+
+
+def bootstrap_moments(R, idx, periods=52):
+    """
+    mu e S annualizzati di tutti i campioni bootstrap in un'unica passata.
+    R è la matrice T x n dei rendimenti decimali, idx il tensore B x T di
+    bootstrap_indices; restituisce mu (B x n, rendimento composto come
+    mean_historical_return) e S (B x n x n, come sample_cov).
+    """
+    Rb = R[idx]
+    n_periods = idx.shape[1]
+    mu = np.expm1(np.log1p(Rb).sum(axis=1) * periods / n_periods)
+    X = Rb - Rb.mean(axis=1, keepdims=True)
+    S = np.einsum('bti,btj->bij', X, X) * periods / (n_periods - 1)
+    return mu, S
+
+
+class MaxSharpeEngine:
+    """
+    Max Sharpe con problema cvxpy compilato una sola volta, per risolvere
+    molti campioni con gli stessi vincoli di optimize_max_sharpe.
+
+    Rendimenti in eccesso e fattore della covarianza sono cp.Parameter.
+    Il Max Sharpe usa la riformulazione omogenea di pypfopt (min yᵀSy con
+    (mu - rf)ᵀy = 1, vincoli scalati per κ, pesi = y/κ); con la volatilità
+    target si massimizza il rendimento sotto σ ≤ target e, se il campione
+    non lo consente, si ripiega sul Max Sharpe.
+    """
+
+    ACCEPTED = FrontierEngine.ACCEPTED
+
+    def __init__(self, n_assets, weight_bounds=(0, 1), sector_groups=None, target_volatility=None):
+        self.excess = cp.Parameter(n_assets)
+        self.factor = cp.Parameter((n_assets, n_assets))
+        self.solver = cp.OSQP if cp.OSQP in cp.installed_solvers() else None
+        lower, upper = weight_bounds
+        
+        self.y = cp.Variable(n_assets)
+        self.kappa = cp.Variable()
+        constraints = [cp.sum(self.y) == self.kappa, self.kappa >= 0,
+                       self.excess @ self.y == 1,
+                       self.y >= lower * self.kappa, self.y <= upper * self.kappa]
+        for idx, limit in (sector_groups or []):
+            constraints.append(cp.sum(self.y[idx]) <= limit * self.kappa)
+        self.sharpe = cp.Problem(cp.Minimize(cp.sum_squares(self.factor.T @ self.y)), constraints)
+        
+        self.risk = None
+        if target_volatility is not None:
+            self.mu = cp.Parameter(n_assets)
+            self.w = cp.Variable(n_assets)
+            constraints = [cp.sum(self.w) == 1, self.w >= lower, self.w <= upper,
+                           cp.sum_squares(self.factor.T @ self.w) <= target_volatility ** 2]
+            for idx, limit in (sector_groups or []):
+                constraints.append(cp.sum(self.w[idx]) <= limit)
+            self.risk = cp.Problem(cp.Maximize(self.mu @ self.w), constraints)
+
+    def _solve(self, problem, solver=None):
+        try:
+            problem.solve(solver=solver, warm_start=True)
+        except cp.error.SolverError:
+            return False
+        return problem.status in self.ACCEPTED
+
+    def solve(self, mu, S, risk_free_rate):
+        """Pesi ottimi per un campione (mu, S); None se il problema non ha soluzione."""
+        self.factor.value = _psd_factor(S)
+        
+        if self.risk is not None:
+            self.mu.value = mu
+            # Vincolo conico: OSQP non lo gestisce, si usa il solver di default
+            if self._solve(self.risk) and self.w.value is not None:
+                return self.w.value.copy()
+        
+        # Senza rendimenti in eccesso positivi il Max Sharpe non esiste
+        if np.all(mu <= risk_free_rate):
+            return None
+        self.excess.value = mu - risk_free_rate
+        if not self._solve(self.sharpe, self.solver) or self.y.value is None or self.kappa.value <= 0:
+            return None
+        return self.y.value / self.kappa.value
+
+
+def _solve_resamples(R, idx, risk_free_rate, weight_bounds, sector_groups, target_volatility):
+    """
+    Risolve in un worker un blocco di campioni bootstrap: momenti calcolati
+    in blocco, un solo problema compilato. Righe NaN per i campioni falliti.
+    """
+    mu, S = bootstrap_moments(R, idx)
+    engine = MaxSharpeEngine(R.shape[1], weight_bounds, sector_groups, target_volatility)
+    W = np.full(mu.shape, np.nan)
+    for b in range(len(idx)):
+        w = engine.solve(mu[b], S[b], risk_free_rate)
+        if w is not None:
+            W[b] = w
+    return W
+
+
+# ════════════════════════════════════════════════════════════════════════════════
+# MOTORE RISK PARITY
+# ════════════════════════════════════════════════════════════════════════════════
+
+def erc_weights(cov, tol=1e-12, max_iter=100):
+    """
+    Pesi Equal Risk Contribution con il metodo di Newton.
+
+    Risolve il problema convesso min 0.5·yᵀΣy - Σ log(yᵢ)/n, la cui soluzione
+    normalizzata ha contributi al rischio identici. Gradiente Σy - b/y ed
+    hessiana Σ + diag(b/y²) sono analitici; il passo viene dimezzato finché
+    y resta positivo e l'obiettivo scende. Converge in poche decine di
+    iterazioni, ciascuna una singola fattorizzazione n x n.
+    """
+    cov = np.asarray(cov, dtype=float)
+    n = len(cov)
+    b = np.full(n, 1.0 / n)
+    y = 1 / np.sqrt(np.diag(cov))
+    y /= np.sqrt(y @ cov @ y)
+    
+    def f(y):
+        return 0.5 * y @ cov @ y - b @ np.log(y)
+    
+    fy = f(y)
+    for _ in range(max_iter):
+        grad = cov @ y - b / y
+        step = np.linalg.solve(cov + np.diag(b / y**2), grad)
+        decrement = grad @ step
+        if decrement / 2 < tol:
+            break
+        t = 1.0
+        while np.any(y - t * step <= 0) or f(y - t * step) > fy - 0.25 * t * decrement:
+            t *= 0.5
+            if t < 1e-12:
+                break
+        y = y - t * step
+        fy = f(y)
+    return y / y.sum()
+
+
+def _max_step(v, dv):
+    """Passo massimo (fino a 1) che lascia v + t·dv positivo, con margine."""
+    neg = dv < 0
+    return min(1.0, 0.995 * np.min(-v[neg] / dv[neg])) if neg.any() else 1.0
+
+
+def constrained_erc_weights(cov, lower, upper, sector_groups=(), tol=1e-9, max_iter=100):
+    """
+    Risk budgeting vincolato (Richard e Roncalli) con un metodo a punto
+    interno primale-duale.
+
+    Per un dato λ risolve il problema convesso
+        min 0.5·xᵀΣx - λ·Σ log(xᵢ)/n   con lower ≤ x ≤ upper e tetti settoriali
+    e sceglie λ in modo che Σx = 1: gli asset lontani dai vincoli hanno
+    contributi al rischio identici, quelli vincolati contribuiscono di meno
+    (o di più, se fermi al minimo). λ è un'incognita del passo di Newton,
+    quindi basta una fattorizzazione di Cholesky n x n per iterazione e
+    una ventina di iterazioni anche con centinaia di asset.
+
+    Restituisce None se i vincoli non ammettono un punto interno, se il
+    minimo varianza vincolato pesa già più di 1 (allora nessun λ > 0 porta
+    a Σx = 1 e λ crolla verso zero) o se il metodo non converge: in quei
+    casi si ripiega su SLSQP.
+    """
+    cov = np.asarray(cov, dtype=float)
+    n = len(cov)
+    b = np.full(n, 1.0 / n)
+    G = np.zeros((len(sector_groups), n))
+    c = np.array([mw for _, mw in sector_groups], dtype=float)
+    for k, (idx, _) in enumerate(sector_groups):
+        G[k, idx] = 1.0
+    sizes = G.sum(axis=1)
+    
+    # Serve un punto strettamente interno, e pesi che possano sommare a 1
+    if upper <= lower or n * lower >= 1 or np.any(lower * sizes >= c):
+        return None
+    if (n - sizes.sum()) * upper + np.minimum(c, sizes * upper).sum() <= 1:
+        return None
+    
+    # Vincoli come A·x - h = s ≥ 0: righe [I; -I; -G] per minimo, massimo e settori
+    def A(v):
+        return np.concatenate([v, -v, -(G @ v)])
+    
+    def At(w):
+        return w[:n] - w[n:2 * n] - G.T @ w[2 * n:]
+    
+    h = np.concatenate([np.full(n, lower), np.full(n, -upper), -c])
+    
+    # Punto iniziale interno con Σx = 1: ogni asset sale dal minimo della stessa
+    # frazione θ dello spazio che il suo settore gli lascia
+    room = np.ones(n)
+    for k, (idx, _) in enumerate(sector_groups):
+        room[idx] = min(1.0, (c[k] - lower * sizes[k]) / ((upper - lower) * sizes[k]))
+    theta = (1 - n * lower) / ((upper - lower) * room.sum())
+    x = lower + theta * room * (upper - lower)
+    lam = lam0 = x @ cov @ x
+    # Scarti tenuti come variabili: ricavarli da x perde precisione vicino ai limiti
+    s = A(x) - h
+    z = lam / n / s
+    
+    def residual(x, lam, s, z, target, scale):
+        rd = cov @ x - lam * b / x - At(z)
+        return np.concatenate([rd / scale, A(x) - h - s, [x.sum() - 1], (z * s - target) / scale])
+    
+    for it in range(max_iter):
+        rd = cov @ x - lam * b / x - At(z)
+        rs = A(x) - h - s
+        rp = x.sum() - 1
+        mu = z @ s / len(s)
+        if not np.isfinite(mu) or lam < 1e-6 * lam0:
+            return None
+        if np.abs(rd).max() <= tol * lam and abs(rp) <= tol and mu <= tol * lam:
+            return np.clip(x, lower, upper)
+        
+        # Complementarità z·s = σμ linearizzata; scarti e duali si eliminano dal sistema.
+        # Sotto la tolleranza non si scende: scarti più piccoli rendono H singolare
+        target = max((0.1 if it < 3 else min(0.1, np.sqrt(mu / lam))) * mu, 0.1 * tol * lam)
+        q = (target - z * s - z * rs) / s
+        d = z / s
+        H = cov + np.diag(lam * b / x**2 + d[:n] + d[n:2 * n]) + (G.T * d[2 * n:]) @ G
+        try:
+            factor = linalg.cho_factor(H, check_finite=False)
+        except (np.linalg.LinAlgError, ValueError):
+            return None
+        # Sistema orlato in (dx, dλ): dx = s1 + dλ·s2, con Σdx = -rp
+        s1 = -linalg.cho_solve(factor, rd - At(q), check_finite=False)
+        s2 = linalg.cho_solve(factor, b / x, check_finite=False)
+        dlam = (-rp - s1.sum()) / s2.sum()
+        dx = s1 + dlam * s2
+        Adx = A(dx)
+        ds, dz = Adx + rs, q - d * Adx
+        
+        # Passo comune dentro la regione, ridotto finché il residuo KKT scende
+        t = min(_max_step(s, ds), _max_step(z, dz), _max_step(x, dx),
+                _max_step(np.array([lam]), np.array([dlam])))
+        norm = np.linalg.norm(residual(x, lam, s, z, target, lam))
+        while t > 1e-10:
+            new = (x + t * dx, lam + t * dlam, s + t * ds, z + t * dz)
+            if np.linalg.norm(residual(*new, target, lam)) <= (1 - 1e-4 * t) * norm:
+                break
+            t *= 0.5
+        else:
+            return None
+        x, lam, s, z = new
+    return None
+
+
+def _rp_objective(w, cov):
+    """Scarto quadratico dei contributi al rischio e suo gradiente analitico."""
+    m = cov @ w
+    pv = np.sqrt(w @ m)
+    if pv < 1e-10:
+        return 1e10, np.zeros_like(w)
+    
+    n = len(w)
+    d = w * m / pv - pv / n
+    grad = 2 * ((d * m + cov @ (d * w)) / pv
+                - (d @ (w * m)) * m / pv**3
+                - d.sum() * m / (n * pv))
+    return float(d @ d), grad
+
+
+def solve_risk_parity(cov, lower, upper, sector_groups=(), cov_annual=None,
+                      target_volatility=None, x0=None):
+    """
+    Portafoglio Risk Parity sotto vincoli di peso, settore e volatilità.
+
+    Prima calcola la soluzione ERC esatta con erc_weights: se rispetta già
+    tutti i vincoli è anche l'ottimo vincolato. Altrimenti, con vincoli di
+    peso e di settore, risolve il risk budgeting vincolato con
+    constrained_erc_weights (qualche decina di millisecondi anche con
+    300 asset).
+
+    SLSQP resta solo come ripiego: se serve il vincolo di volatilità, se
+    il punto interno non esiste o se il metodo non converge. Minimizza lo
+    scarto quadratico dei contributi al rischio con gradiente e jacobiani
+    analitici, partendo da x0 (pesi precedenti) o dalla soluzione migliore
+    disponibile.
+    """
+    n = len(cov)
+    w = erc_weights(cov)
+    
+    feasible = (np.all(w >= lower - 1e-9) and np.all(w <= upper + 1e-9) and
+                all(w[idx].sum() <= mw + 1e-9 for idx, mw in sector_groups))
+    if not feasible:
+        crb = constrained_erc_weights(cov, lower, upper, sector_groups)
+        if crb is not None:
+            w, feasible = crb, True
+    if feasible and target_volatility is not None:
+        feasible = w @ cov_annual @ w <= target_volatility**2
+    if feasible:
+        return w
+    
+    init = np.clip(x0 if x0 is not None else w, lower, upper)
+    init = init / init.sum()
+    
+    constraints = [{'type': 'eq', 'fun': lambda w: np.sum(w) - 1,
+                    'jac': lambda w: np.ones(n)}]
+    for idx, mw in sector_groups:
+        mask = np.zeros(n)
+        mask[idx] = 1.0
+        constraints.append({
+            'type': 'ineq',
+            'fun': lambda w, mask=mask, mw=mw: mw - mask @ w,
+            'jac': lambda w, mask=mask: -mask
+        })
+    if target_volatility is not None:
+        constraints.append({
+            'type': 'ineq',
+            'fun': lambda w: target_volatility**2 - (w @ cov_annual @ w),
+            'jac': lambda w: -2 * (cov_annual @ w)
+        })
+    
+    res = optimize.minimize(
+        _rp_objective, init, args=(cov,), jac=True, method='SLSQP',
+        bounds=optimize.Bounds(np.full(n, lower), np.full(n, upper)),
+        constraints=constraints
+    )
+    return res.x
+
+
+def _cluster_variance(cov, idx):
+    """Varianza di un cluster con pesi inversamente proporzionali alla varianza."""
+    sub = cov[np.ix_(idx, idx)]
+    ivp = 1 / np.diag(sub)
+    ivp /= ivp.sum()
+    return ivp @ sub @ ivp
+
+
+def hrp_weights(cov, corr):
+    """
+    Hierarchical Risk Parity in NumPy, con le stesse scelte di HRPOpt di
+    pypfopt (single linkage sulla distanza sqrt((1 - ρ) / 2), bisezione
+    ricorsiva dell'ordine delle foglie) ma senza indicizzare per ticker.
+    """
+    cov = np.asarray(cov, dtype=float)
+    dist = np.sqrt(np.clip((1.0 - np.asarray(corr, dtype=float)) / 2.0, 0.0, 1.0))
+    link = hierarchy.linkage(distance.squareform(dist, checks=False), 'single')
+    
+    w = np.ones(len(cov))
+    clusters = [hierarchy.leaves_list(link)]
+    while clusters:
+        clusters = [c[j:k] for c in clusters
+                    for j, k in ((0, len(c) // 2), (len(c) // 2, len(c))) if len(c) > 1]
+        for first, second in zip(clusters[::2], clusters[1::2]):
+            var_first = _cluster_variance(cov, first)
+            var_second = _cluster_variance(cov, second)
+            alpha = 1 - var_first / (var_first + var_second)
+            w[first] *= alpha
+            w[second] *= 1 - alpha
+    return w
+
+
+# ════════════════════════════════════════════════════════════════════════════════
+# CONTESTO DATI DI MERCATO CONDIVISO
+# ════════════════════════════════════════════════════════════════════════════════
+
+def _readonly(array):
+    array = np.ascontiguousarray(array, dtype=float)
+    array.setflags(write=False)
+    return array
+
+
+@dataclass(frozen=True)
+class MarketContext:
+    """
+    Dati di mercato precalcolati una sola volta per analisi e condivisi da
+    tutte le strategie, le metriche e i grafici. I campi non si possono
+    riassegnare e gli array NumPy sono in sola lettura; gli oggetti pandas
+    invece sono condivisi (anche con PortfolioOptimizer.prices, .mu, ...)
+    e non vanno modificati sul posto: nuovi dati richiedono un nuovo
+    contesto (vedi extend).
+
+    - prices / returns_pct: prezzi settimanali e rendimenti settimanali in %
+    - period_returns: rendimenti settimanali decimali (pct_change dei prezzi),
+      usati dalla semivarianza
+    - returns_matrix: rendimenti decimali T x n in float64 contiguo
+    - mu, S / cov, chol, corr: momenti annualizzati, fattore di Cholesky della
+      covarianza e correlazione dei rendimenti
+    - dates: date normalizzate dei rendimenti
+    """
+
+    tickers: tuple
+    dates: pd.DatetimeIndex
+    prices: pd.DataFrame
+    returns_pct: pd.DataFrame
+    period_returns: pd.DataFrame
+    returns_matrix: np.ndarray
+    mu: pd.Series
+    S: pd.DataFrame
+    cov: np.ndarray
+    chol: np.ndarray
+    corr: pd.DataFrame
+
+    @classmethod
+    def from_prices(cls, prices, returns=None, mu=None, S=None):
+        """
+        Costruisce il contesto dai prezzi settimanali (e dai rendimenti in %).
+        mu e S già noti (es. da RollingMoments) evitano di ricalcolarli; la
+        correlazione deriva sempre da S, come in extend.
+        """
+        if returns is None:
+            returns = prices.pct_change().dropna() * 100
+        
+        if mu is None:
+            mu = expected_returns.mean_historical_return(prices, frequency=52)
+        if S is None:
+            S = risk_models.sample_cov(prices, frequency=52)
+        sd = np.sqrt(np.diag(S.values))
+        
+        return cls(
+            tickers=tuple(prices.columns),
+            dates=pd.DatetimeIndex(pd.to_datetime(returns.index).normalize()),
+            prices=prices,
+            returns_pct=returns,
+            period_returns=prices.pct_change().dropna(),
+            returns_matrix=_readonly(returns.to_numpy(dtype=float) / 100),
+            mu=mu,
+            S=S,
+            cov=_readonly(S.values),
+            chol=_readonly(_psd_factor(S.values)),
+            corr=pd.DataFrame(S.values / np.outer(sd, sd), index=S.index, columns=S.columns),
+        )
+
+    def portfolio_returns(self, weights):
+        """Rendimenti settimanali (%) di un portafoglio, indicizzati per data."""
+        return pd.Series(self.returns_matrix @ np.asarray(weights, dtype=float) * 100,
+                         index=self.dates)
+
+    def extend(self, prices, returns, mu, S, replace_last=False):
+        """
+        Nuovo contesto con rendimenti (%) accodati, senza ricalcolare nulla
+        sull'intera storia: prices è il pannello prezzi già aggiornato, mu e S
+        i momenti già aggiornati (vedi RollingMoments); la correlazione deriva
+        da S. Con replace_last l'ultima settimana viene sostituita.
+        """
+        keep = len(self.returns_pct) - (1 if replace_last else 0)
+        returns_pct = pd.concat([self.returns_pct.iloc[:keep], returns])
+        sd = np.sqrt(np.diag(S.values))
+        return MarketContext(
+            tickers=self.tickers,
+            dates=self.dates[:keep].append(pd.DatetimeIndex(pd.to_datetime(returns.index).normalize())),
+            prices=prices,
+            returns_pct=returns_pct,
+            period_returns=pd.concat([self.period_returns.iloc[:keep], returns / 100]),
+            returns_matrix=_readonly(np.vstack([self.returns_matrix[:keep],
+                                                returns.to_numpy(dtype=float) / 100])),
+            mu=mu,
+            S=S,
+            cov=_readonly(S.values),
+            chol=_readonly(_psd_factor(S.values)),
+            corr=pd.DataFrame(S.values / np.outer(sd, sd), index=S.index, columns=S.columns),
+        )
+
+
+class RollingMoments:
+    """
+    Momenti annualizzati di una finestra mobile di rendimenti decimali,
+    aggiornati con somme correnti (Σr, Σrrᵀ, Σlog(1+r)) quando la finestra
+    scorre: O(n²) per riga invece di ricalcolare sample_cov da zero.
+    Stesse definizioni di mean_historical_return e sample_cov di pypfopt.
+    """
+
+    def __init__(self, R, periods=52):
+        R = np.atleast_2d(np.asarray(R, dtype=float))
+        self.periods = periods
+        self.count = len(R)
+        self.s1 = R.sum(axis=0)
+        self.s2 = R.T @ R
+        self.slog = np.log1p(R).sum(axis=0)
+
+    def slide(self, added, removed=()):
+        """Aggiunge le righe entranti e toglie quelle uscenti dalla finestra."""
+        added = np.asarray(added, dtype=float).reshape(-1, len(self.s1))
+        removed = np.asarray(removed, dtype=float).reshape(-1, len(self.s1))
+        self.count += len(added) - len(removed)
+        self.s1 += added.sum(axis=0) - removed.sum(axis=0)
+        self.s2 += added.T @ added - removed.T @ removed
+        self.slog += np.log1p(added).sum(axis=0) - np.log1p(removed).sum(axis=0)
+
+    def mean(self):
+        """Rendimento medio geometrico annualizzato."""
+        return np.expm1(self.slog * self.periods / self.count)
+
+    def cov(self):
+        """Covarianza campionaria annualizzata."""
+        m = self.s1 / self.count
+        cov = (self.s2 - self.count * np.outer(m, m)) / (self.count - 1) * self.periods
+        return (cov + cov.T) / 2
+
+    def as_pandas(self, tickers):
+        """(mu, S) come Series/DataFrame, con la correzione PSD di pypfopt."""
+        tickers = list(tickers)
+        mu = pd.Series(self.mean(), index=tickers)
+        S = risk_models.fix_nonpositive_semidefinite(
+            pd.DataFrame(self.cov(), index=tickers, columns=tickers), 'spectral')
+        return mu, S
+
+
+# ════════════════════════════════════════════════════════════════════════════════
+# AGGIORNAMENTO INCREMENTALE
+# ════════════════════════════════════════════════════════════════════════════════
+
+def merge_weekly_bars(prices, bars):
+    """
+    Accoda nuove barre (giornaliere o settimanali) a prezzi settimanali.
+    Le barre della settimana già in coda la aggiornano (settimana in corso).
+    Restituisce (prezzi aggiornati, rendimenti decimali delle settimane
+    nuove o aggiornate, True se l'ultima settimana è stata sostituita).
+    """
+    weekly = bars.resample('W').last().dropna(how='all')
+    if weekly.empty:
+        return prices, weekly.iloc[:0], False
+    last = prices.index[-1]
+    if weekly.index[0] < last:
+        raise ValueError(f"Le nuove barre precedono l'ultima settimana disponibile ({last.date()})")
+    
+    replaced = weekly.index[0] == last
+    base = prices.iloc[:-1] if replaced else prices
+    combined = pd.concat([base, weekly]).ffill()
+    returns = combined.iloc[len(base) - 1:].pct_change().iloc[1:]
+    return combined, returns, replaced
+
+
+class RunningStats:
+    """
+    Accumulatori delle metriche di performance_kernel per K serie di
+    rendimenti decimali: ogni nuovo periodo costa O(K), qualunque sia la
+    lunghezza della storia. Stesse definizioni (CAGR, volatilità, Sortino,
+    drawdown massimo dal primo valore).
+    """
+
+    def __init__(self, n_series, risk_free_rate, periods=52):
+        self.risk_free_rate = risk_free_rate
+        self.periods = periods
+        self.n = np.zeros(n_series)
+        self.slog = np.zeros(n_series)
+        self.s1 = np.zeros(n_series)
+        self.s2 = np.zeros(n_series)
+        self.n_down = np.zeros(n_series)
+        self.dsq = np.zeros(n_series)
+        self.value = np.ones(n_series)
+        self.peak = np.zeros(n_series)
+        self.mdd = np.zeros(n_series)
+
+    def update(self, rd):
+        """Aggiunge periodi (righe di rd, m x K; NaN = periodo mancante)."""
+        rd = np.asarray(rd, dtype=float).reshape(-1, len(self.n))
+        if not len(rd):
+            return
+        rf = self.risk_free_rate / self.periods
+        valid = ~np.isnan(rd)
+        r0 = np.where(valid, rd, 0.0)
+        logs = np.log1p(r0)
+        
+        self.n += valid.sum(axis=0)
+        self.slog += logs.sum(axis=0)
+        self.s1 += r0.sum(axis=0)
+        self.s2 += (r0 ** 2).sum(axis=0)
+        down = valid & (rd < rf)
+        self.n_down += down.sum(axis=0)
+        self.dsq += np.where(down, (rd - rf) ** 2, 0.0).sum(axis=0)
+        
+        cum = self.value * np.exp(np.cumsum(logs, axis=0))
+        peak = np.maximum(self.peak, np.maximum.accumulate(cum, axis=0))
+        self.mdd = np.maximum(self.mdd, ((peak - cum) / peak).max(axis=0))
+        self.value = cum[-1]
+        self.peak = peak[-1]
+
+    def metrics(self):
+        """Metriche correnti, come performance_kernel: array di lunghezza K."""
+        n, periods = self.n, self.periods
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ret = np.where(n > 0, np.expm1(self.slog * periods / n) * 100, 0.0)
+            var = np.maximum(self.s2 - self.s1 ** 2 / n, 0) / (n - 1)
+            vol = np.nan_to_num(np.sqrt(var) * np.sqrt(periods) * 100)
+            excess = ret - self.risk_free_rate * 100
+            sharpe = np.where(vol > 0, excess / vol, 0.0)
+            dd = np.where(self.n_down > 0,
+                          np.sqrt(self.dsq / self.n_down) * np.sqrt(periods) * 100, vol * 0.7)
+            sortino = np.where(dd > 0, excess / dd, 0.0)
+            mdd = self.mdd * 100
+            calmar = np.where(mdd > 0, ret / mdd, 0.0)
+        return {'ret': ret, 'vol': vol, 'sharpe': sharpe,
+                'sortino': sortino, 'mdd': mdd, 'calmar': calmar}
+
+
+class RunningRelativeStats:
+    """
+    Accumulatori delle metriche relative al benchmark di calc_bench_metrics
+    (beta, tracking error, alpha, information ratio) per K portafogli,
+    sulle sole date in cui esistono entrambi i rendimenti. O(K) per periodo.
+    """
+
+    def __init__(self, n_series, periods=52):
+        self.periods = periods
+        self.n = 0
+        self.sb = 0.0
+        self.sbb = 0.0
+        self.slog_b = 0.0
+        self.sp = np.zeros(n_series)
+        self.spb = np.zeros(n_series)
+        self.sd = np.zeros(n_series)
+        self.sdd = np.zeros(n_series)
+        self.slog_p = np.zeros(n_series)
+
+    def update(self, P, b):
+        """Aggiunge periodi: P rendimenti decimali m x K, b del benchmark (m)."""
+        P = np.asarray(P, dtype=float).reshape(-1, len(self.sp))
+        b = np.asarray(b, dtype=float).reshape(-1)
+        keep = ~np.isnan(b)
+        P, b = P[keep], b[keep]
+        self.n += len(b)
+        self.sb += b.sum()
+        self.sbb += b @ b
+        self.slog_b += np.log1p(b).sum()
+        self.sp += P.sum(axis=0)
+        self.spb += b @ P
+        d = P - b[:, None]
+        self.sd += d.sum(axis=0)
+        self.sdd += (d ** 2).sum(axis=0)
+        self.slog_p += np.log1p(P).sum(axis=0)
+
+    def metrics(self, ret, mdd, risk_free_rate):
+        """
+        Metriche relative correnti (None se meno di 20 periodi comuni);
+        ret e mdd sono le metriche complete dei portafogli.
+        """
+        n = self.n
+        if n < 20:
+            return None
+        cov = (self.spb - self.sp * self.sb / n) / (n - 1)
+        var_b = (self.sbb - self.sb ** 2 / n) / (n - 1)
+        beta = cov / var_b if var_b > 0 else np.ones_like(cov)
+        te = np.sqrt(np.maximum(self.sdd - self.sd ** 2 / n, 0) / (n - 1)) * 100 * np.sqrt(self.periods)
+        alpha = (np.expm1(self.slog_p * self.periods / n) - np.expm1(self.slog_b * self.periods / n)) * 100
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ir = np.where(te > 0, alpha / te, 0.0)
+            treynor = np.where(beta != 0, (ret - risk_free_rate * 100) / beta, 0.0)
+            calmar = np.where(mdd > 0, ret / mdd, 0.0)
+        return {'beta': beta, 'te': te, 'alpha': alpha, 'ir': ir,
+                'treynor': treynor, 'calmar': calmar, 'n_weeks': np.full(len(beta), n)}
+
+
+# ════════════════════════════════════════════════════════════════════════════════
+# CLASSE PORTFOLIO OPTIMIZER
+# ════════════════════════════════════════════════════════════════════════════════
+
+# Punti massimi per serie nei grafici temporali (oltre si riduce con LTTB)
+PLOT_MAX_POINTS = 1000
+# Simulazioni di ribilanciamento ricordate per ottimizzatore (grafici e turnover)
+SIMULATION_MEMO_SIZE = 4
+# Oltre questa soglia la heatmap passa alla modalità per grandi universi
+CORR_ANNOTATE_MAX_ASSETS = 25
+# Oltre questa soglia gli assi della heatmap non mostrano i ticker
+CORR_LABEL_MAX_ASSETS = 80
+
+STRATEGY_STEPS = [
+    ('sharpe', "Ottimizzazione Max Sharpe...", 'optimize_max_sharpe'),
+    ('sortino', "Ottimizzazione Max Sortino...", 'optimize_max_sortino'),
+    ('rp', "Ottimizzazione Risk Parity...", 'optimize_risk_parity'),
+    ('hrp', "Ottimizzazione HRP...", 'optimize_hrp'),
+]
+
+# Strategia opzionale (n_resamples > 0): esclusa dal walk-forward per il costo
+RESAMPLED_STEP = ('resampled', "Ottimizzazione Resampled...", 'optimize_resampled')
+
+
+# Moduli precaricati una volta nel processo forkserver, ereditati da ogni worker
+WORKER_PRELOAD = ['optimizer_core', 'pypfopt', 'cvxpy', 'scipy.optimize']
+
+
+def _process_pool(max_workers=None):
+    """
+    Pool di processi per i calcoli CPU-bound. Mai 'fork': il processo
+    principale ha thread attivi (prefetch dei benchmark, server Streamlit)
+    e un figlio forkato potrebbe ereditare un lock già acquisito. Si usa
+    'forkserver', i cui worker nascono da un processo pulito che ha già
+    importato WORKER_PRELOAD, altrimenti 'spawn'. Le funzioni dei worker
+    sono a livello di modulo e ricevono tutto come argomenti.
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context('forkserver')
+        ctx.set_forkserver_preload(WORKER_PRELOAD)
+    else:
+        ctx = multiprocessing.get_context('spawn')
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx)
+
+
+def _run_in_pool(run, max_workers=None):
+    """
+    Chiama run(pool) con un pool di processi e ne restituisce il risultato.
+    Con 'forkserver' e 'spawn' i worker reimportano lo script principale:
+    se questo avvia i calcoli senza la guardia `if __name__ == '__main__'`
+    i worker muoiono all'avvio e il pool si rompe. In quel caso run viene
+    ripetuto in sequenza nel processo principale, con un avviso su stderr
+    (i warning del modulo sono silenziati).
+    """
+    try:
+        with _process_pool(max_workers) as pool:
+            return run(pool)
+    except BrokenProcessPool:
+        print("⚠ Pool di processi non avviabile (manca la guardia "
+              "if __name__ == '__main__' nello script?): calcolo sequenziale", file=sys.stderr)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return run(pool)
+
+
+def _run_strategy(optimizer, method):
+    """Esegue una strategia in un worker e restituisce (chiave, risultato)."""
+    getattr(optimizer, method)()
+    key = next(k for k, _, m in STRATEGY_STEPS if m == method)
+    return key, optimizer.results[key]
+
+
+def _run_windows(params, windows):
+    """
+    Ottimizza in sequenza un blocco di finestre contigue del walk-forward e
+    restituisce, per ognuna, {strategia: pesi} (None se la strategia fallisce).
+    Il Risk Parity parte dai pesi della finestra precedente.
+    """
+    out = []
+    previous = {}
+    for prices, returns, mu, S in windows:
+        context = MarketContext.from_prices(prices, returns, mu=mu, S=S)
+        opt = PortfolioOptimizer(list(prices.columns), prices, returns, context=context, **params)
+        opt._previous = previous
+        weights = {}
+        for key, _, method in STRATEGY_STEPS:
+            try:
+                weights[key] = getattr(opt, method)()
+            except Exception:
+                weights[key] = None
+        previous = {k: w for k, w in weights.items() if w is not None}
+        out.append(weights)
+    return out
+
+
+class PortfolioOptimizer:
+    """Classe principale per l'ottimizzazione del portafoglio."""
+    
+    def __init__(self, tickers, prices, returns, min_weight=0.01, max_concentration=0.25,
+                 risk_free_rate=0.02, sector_map=None, sector_limits=None, 
+                 target_volatility=None, start_date=None, end_date=None, benchmark_analyzer=None,
+                 context=None, n_resamples=0, resample_seed=0):
+        
+        # Dati di mercato precalcolati una volta e condivisi (vedi MarketContext)
+        self.context = context or MarketContext.from_prices(prices, returns)
+        self.tickers = list(self.context.tickers)
+        self.n_assets = len(self.tickers)
+        self.prices = self.context.prices
+        self.returns = self.context.returns_pct
+        self.min_weight = min_weight
+        self.max_concentration = max_concentration
+        self.risk_free_rate = risk_free_rate
+        self.start_date = start_date
+        self.end_date = end_date
+        
+        self.mu = self.context.mu
+        self.S = self.context.S
+        
+        self.sector_map = sector_map if sector_map else DEFAULT_SECTOR_MAP.copy()
+        
+        if sector_limits is False:
+            self.sector_limits = None
+            self.use_sector_constraints = False
+        elif sector_limits is None:
+            self.sector_limits = DEFAULT_SECTOR_LIMITS.copy()
+            self.use_sector_constraints = True
+        else:
+            self.sector_limits = sector_limits
+            self.use_sector_constraints = True
+        
+        self.target_volatility = target_volatility
+        self.use_volatility_constraint = target_volatility is not None
+        
+        # Frontiera ricampionata: 0 = strategia disattivata
+        self.n_resamples = n_resamples
+        self.resample_seed = resample_seed
+        
+        # Un analyzer già avviato (es. con prefetch in corso) viene riusato
+        self.bench = benchmark_analyzer or BenchmarkAnalyzer(start_date, end_date, risk_free_rate)
+        self.best_benchmark = None
+        self.results = {}
+        self.frontier = None
+        # Stato riusabile da reoptimize(): pesi precedenti e pesi HRP grezzi
+        self._previous = {}
+        self._hrp_raw = None
+        # Accumulatori di append_bars, costruiti alla prima chiamata
+        self._live = None
+        # Ultime simulazioni (ribilanciamento e Monte Carlo) per opzioni, vedi _memoized
+        self._simulations = OrderedDict()
+        self._monte_carlo = OrderedDict()
+
+    def _build_sector_mapper(self):
+        """Costruisce il mapping ticker->settore."""
+        return {ticker: self.sector_map.get(ticker, 'Other') for ticker in self.tickers}
+
+    def _get_active_sectors(self):
+        """Ottiene i settori attivi nel portafoglio."""
+        sector_mapper = self._build_sector_mapper()
+        sectors = {}
+        for ticker, sector in sector_mapper.items():
+            if sector not in sectors:
+                sectors[sector] = []
+            sectors[sector].append(ticker)
+        return sectors
+
+    def _sector_groups(self):
+        """Vincoli settoriali come lista di (indici degli asset, peso massimo)."""
+        if not self.use_sector_constraints:
+            return []
+        
+        groups = []
+        for sector, tickers_in_sector in self._get_active_sectors().items():
+            max_weight = self.sector_limits.get(sector, self.sector_limits.get('Other', 1.0))
+            indices = [self.tickers.index(t) for t in tickers_in_sector if t in self.tickers]
+            if indices:
+                groups.append((indices, max_weight))
+        return groups
+
+    def _apply_sector_constraints(self, ef):
+        """Applica vincoli settoriali a EfficientFrontier."""
+        if not self.use_sector_constraints:
+            return ef
+        
+        sector_mapper = self._build_sector_mapper()
+        sector_lower = {}
+        sector_upper = {}
+        active_sectors = set(sector_mapper.values())
+        
+        for sector in active_sectors:
+            sector_lower[sector] = 0
+            sector_upper[sector] = self.sector_limits.get(sector, self.sector_limits.get('Other', 1.0))
+        
+        try:
+            ef.add_sector_constraints(sector_mapper, sector_lower, sector_upper)
+        except Exception:
+            pass
+        
+        return ef
+
+    def stats(self, w):
+        """Calcola le statistiche del portafoglio."""
+        batch = self.stats_batch(np.atleast_2d(w))
+        return {k: float(v[0]) for k, v in batch.items()}
+
+    def stats_batch(self, W):
+        """
+        Statistiche di K portafogli in un'unica passata NumPy.
+        W è una matrice K x n_assets (un vettore di pesi per riga); restituisce
+        un dizionario di array di lunghezza K con le stesse chiavi di stats().
+        """
+        W = np.asarray(W, dtype=float)
+        if W.ndim == 1:
+            W = W[None, :]
+        port_returns = self.context.returns_matrix @ W.T
+        return performance_kernel(port_returns, self.risk_free_rate)
+
+    def optimize_max_sharpe(self):
+        """Ottimizzazione Max Sharpe."""
+        ef = pypfopt.EfficientFrontier(self.mu, self.S, 
+                                      weight_bounds=(self.min_weight, self.max_concentration))
+        
+        if self.use_sector_constraints:
+            ef = self._apply_sector_constraints(ef)
+        
+        if self.use_volatility_constraint:
+            try:
+                ef.efficient_risk(target_volatility=self.target_volatility)
+            except:
+                ef = pypfopt.EfficientFrontier(self.mu, self.S, 
+                                              weight_bounds=(self.min_weight, self.max_concentration))
+                if self.use_sector_constraints:
+                    ef = self._apply_sector_constraints(ef)
+                ef.max_sharpe(risk_free_rate=self.risk_free_rate)
+        else:
+            ef.max_sharpe(risk_free_rate=self.risk_free_rate)
+        
+        w = np.array([ef.clean_weights().get(t, 0) for t in self.tickers])
+        s = self.stats(w)
+        self.results['sharpe'] = {'weights': w, **s}
+        return w
+
+    def optimize_max_sortino(self):
+        """Ottimizzazione Max Sortino."""
+        es = pypfopt.EfficientSemivariance(
+            self.mu, self.context.period_returns, frequency=52,
+            weight_bounds=(self.min_weight, self.max_concentration)
+        )
+        
+        if self.use_sector_constraints:
+            es = self._apply_sector_constraints(es)
+        
+        if self.use_volatility_constraint:
+            try:
+                target_semidev = self.target_volatility * 0.8
+                es.efficient_risk(target_semideviation=target_semidev)
+            except:
+                es = pypfopt.EfficientSemivariance(
+                    self.mu, self.context.period_returns, frequency=52,
+                    weight_bounds=(self.min_weight, self.max_concentration)
+                )
+                if self.use_sector_constraints:
+                    es = self._apply_sector_constraints(es)
+                es.max_quadratic_utility(risk_aversion=1)
+        else:
+            es.max_quadratic_utility(risk_aversion=1)
+        
+        w = np.array([es.clean_weights().get(t, 0) for t in self.tickers])
+        s = self.stats(w)
+        self.results['sortino'] = {'weights': w, **s}
+        return w
+
+    def optimize_risk_parity(self):
+        """Ottimizzazione Risk Parity."""
+        w = solve_risk_parity(
+            self.context.cov * 10000, self.min_weight, self.max_concentration,
+            sector_groups=self._sector_groups(),
+            cov_annual=self.context.cov,
+            target_volatility=self.target_volatility if self.use_volatility_constraint else None,
+            x0=self._previous.get('rp')
+        )
+        
+        s = self.stats(w)
+        self.results['rp'] = {'weights': w, **s}
+        return w
+
+    def optimize_hrp(self):
+        """Ottimizzazione HRP."""
+        if self._hrp_raw is None:
+            # Covarianza settimanale e correlazione dal contesto, senza ripassare i rendimenti
+            w = hrp_weights(self.context.cov / 52, self.context.corr.values)
+            # Stessa pulizia di clean_weights() di pypfopt
+            self._hrp_raw = np.where(np.abs(w) < 1e-4, 0, w).round(5)
+        w = self._hrp_raw.copy()
+        
+        if self.use_volatility_constraint:
+            cov_annual = self.context.cov
+            port_vol = np.sqrt(w.T @ cov_annual @ w)
+            if port_vol > self.target_volatility:
+                scale_factor = self.target_volatility / port_vol
+                w = w * scale_factor
+                w = w / w.sum()
+        
+        s = self.stats(w)
+        self.results['hrp'] = {'weights': w, **s}
+        return w
+
+    def optimize_resampled(self, parallel=True, max_workers=None):
+        """
+        Ottimizzazione Resampled (frontiera ricampionata di Michaud).
+        
+        Estrae n_resamples campioni bootstrap delle settimane in un unico
+        tensore di indici, risolve il Max Sharpe di ciascuno con gli stessi
+        vincoli di optimize_max_sharpe e media i pesi: la media di portafogli
+        ammissibili rispetta ancora tutti i vincoli (sono convessi). I campioni
+        sono divisi in un blocco per core e risolti in un pool di processi:
+        negli script serve la guardia __main__ (vedi run_full_optimization),
+        con parallel=False si resta nel processo principale.
+        """
+        n_resamples = self.n_resamples or 500
+        R = self.context.returns_matrix
+        idx = bootstrap_indices(len(R), n_resamples, self.resample_seed)
+        params = (self.risk_free_rate, (self.min_weight, self.max_concentration), self._sector_groups(),
+                  self.target_volatility if self.use_volatility_constraint else None)
+        
+        n_blocks = min(n_resamples, max_workers or os.cpu_count() or 1) if parallel else 1
+        if n_blocks == 1:
+            W = _solve_resamples(R, idx, *params)
+        else:
+            def run(pool):
+                futures = [pool.submit(_solve_resamples, R, block, *params)
+                           for block in np.array_split(idx, n_blocks)]
+                return np.vstack([fut.result() for fut in futures])
+            W = _run_in_pool(run, n_blocks)
+        
+        solved = ~np.isnan(W).any(axis=1)
+        if not solved.any():
+            raise ValueError("Nessun campione bootstrap risolto per la strategia Resampled")
+        w = W[solved].mean(axis=0)
+        # Stessa pulizia di clean_weights() di pypfopt
+        w = np.where(np.abs(w) < 1e-4, 0, w).round(5)
+        
+        s = self.stats(w)
+        self.results['resampled'] = {'weights': w, **s, 'resamples': int(solved.sum())}
+        return w
+
+    def _strategy_steps(self):
+        """Strategie da eseguire: le quattro di base più la Resampled se attiva."""
+        return STRATEGY_STEPS + ([RESAMPLED_STEP] if self.n_resamples else [])
+
+    def find_benchmark(self):
+        """Trova il benchmark migliore."""
+        eq = np.array([1/self.n_assets] * self.n_assets)
+        pr = self.context.portfolio_returns(eq)
+        s = self.stats(eq)
+        self.best_benchmark = self.bench.find_best(pr, {'vol': s['vol'], 'ret': s['ret']})
+
+    def calc_bench_metrics(self):
+        """Calcola le metriche relative al benchmark."""
+        if not self.best_benchmark:
+            return
+        
+        br = self.bench.benchmark_returns[self.best_benchmark['ticker']].copy()
+        br.index = pd.to_datetime(br.index).normalize()
+        
+        for name, data in self.results.items():
+            pr = self.context.portfolio_returns(data['weights'])
+            common = pr.index.intersection(br.index)
+            
+            if len(common) < 20:
+                continue
+            
+            pa, ba = pr.loc[common], br.loc[common]
+            cov = np.cov(pa/100, ba/100)
+            beta = cov[0,1]/cov[1,1] if cov[1,1] > 0 else 1.0
+            te = float((pa - ba).std() * np.sqrt(52))
+            n = len(pa)/52
+            pc = ((1+pa/100).prod()**(1/n)-1)*100
+            bc = ((1+ba/100).prod()**(1/n)-1)*100
+            alpha = pc - bc
+            ir = alpha/te if te > 0 else 0
+            excess_return = data['ret'] - self.risk_free_rate * 100
+            treynor = excess_return / beta if beta != 0 else 0
+            calmar = data['ret'] / data['mdd'] if data['mdd'] > 0 else 0
+            
+            self.results[name].update({
+                'beta': beta, 'te': te, 'alpha': alpha, 'ir': ir,
+                'treynor': treynor, 'calmar': calmar, 'n_weeks': len(common)
+            })
+
+    # ════════════════════════════════════════════════════════════════════════════
+    # METODI DI PLOTTING (restituiscono oggetti figure)
+    # ════════════════════════════════════════════════════════════════════════════
+
+    def compute_frontier(self, n_points=40, method='parametric'):
+        """
+        Calcola la frontiera efficiente e la restituisce come DataFrame con
+        target, statistiche storiche (ret, vol, sharpe) e pesi di ogni punto.
+
+        - method='parametric': FrontierEngine, con gli stessi vincoli su pesi
+          e settori di optimize_max_sharpe.
+        - method='cla': frontiera esatta dai portafogli d'angolo del Critical
+          Line Algorithm (solo vincoli box), interpolata senza altri solve.
+        """
+        if method == 'cla':
+            corners = self.critical_line_frontier()
+            targets = np.linspace(corners['target'].min(), corners['target'].max(), n_points)
+            weights = self.interpolate_frontier(targets, corners)
+            statuses = ['optimal'] * n_points
+        else:
+            engine = FrontierEngine(self.mu.values, self.context.cov,
+                                    weight_bounds=(self.min_weight, self.max_concentration),
+                                    sector_groups=self._sector_groups(),
+                                    factor=self.context.chol)
+            targets, weights, statuses = engine.sweep(n_points)
+            targets = targets * 100
+        ok = ~np.isnan(weights).any(axis=1)
+        
+        s = self.stats_batch(weights[ok])
+        frontier = pd.DataFrame({'target': targets[ok], 'ret': s['ret'],
+                                 'vol': s['vol'], 'sharpe': s['sharpe']})
+        frontier = pd.concat([frontier, pd.DataFrame(weights[ok], columns=self.tickers)], axis=1)
+        frontier.attrs['method'] = method
+        frontier.attrs['failed'] = [status for status, good in zip(statuses, ok) if not good]
+        self.frontier = frontier
+        return frontier
+
+    def critical_line_frontier(self):
+        """
+        Portafogli d'angolo della frontiera con il Critical Line Algorithm,
+        sotto i soli vincoli box (min_weight, max_concentration): i vincoli
+        settoriali non sono supportati dal CLA.
+        Restituisce un DataFrame ordinato per rendimento atteso crescente con
+        'target' (rendimento atteso %), 'model_vol' (volatilità attesa %) e pesi.
+        """
+        cla = pypfopt.CLA(self.mu, self.S, weight_bounds=(self.min_weight, self.max_concentration))
+        # min_volatility() esegue l'algoritmo completo: i portafogli d'angolo restano in cla.w
+        cla.min_volatility()
+        W = np.hstack(cla.w).T
+        
+        corners = pd.DataFrame(W, columns=self.tickers)
+        corners.insert(0, 'target', W @ self.mu.values * 100)
+        corners.insert(1, 'model_vol', np.sqrt(np.einsum('ij,jk,ik->i', W, self.context.cov, W)) * 100)
+        return corners.sort_values('target').drop_duplicates('target').reset_index(drop=True)
+
+    def interpolate_frontier(self, targets, corners=None):
+        """
+        Pesi della frontiera per qualsiasi rendimento atteso target (%), per
+        interpolazione lineare tra i due portafogli d'angolo adiacenti: tra
+        due angoli la frontiera è esattamente lineare nei pesi.
+        """
+        corners = corners if corners is not None else self.critical_line_frontier()
+        r = corners['target'].to_numpy()
+        W = corners[self.tickers].to_numpy()
+        t = np.clip(np.asarray(targets, dtype=float), r[0], r[-1])
+        
+        if len(r) == 1:
+            return np.repeat(W, len(t), axis=0)
+        hi = np.clip(np.searchsorted(r, t), 1, len(r) - 1)
+        alpha = ((t - r[hi - 1]) / (r[hi] - r[hi - 1]))[:, None]
+        return (1 - alpha) * W[hi - 1] + alpha * W[hi]
+
+    def plot_frontier(self, method='parametric'):
+        """Genera il grafico della frontiera efficiente."""
+        frontier = self.frontier
+        if frontier is None or frontier.attrs.get('method') != method:
+            frontier = self.compute_frontier(method=method)
+        
+        if frontier.empty:
+            return None
+        
+        v, r, sh = frontier['vol'], frontier['ret'], frontier['sharpe']
+        fig, ax = plt.subplots(figsize=(12, 8))
+        fig.patch.set_facecolor('#0f172a')
+        ax.set_facecolor('#1e293b')
+        
+        sc = ax.scatter(v, r, c=sh, cmap='viridis', s=50, alpha=0.7)
+        cbar = plt.colorbar(sc, ax=ax)
+        cbar.set_label('Sharpe Ratio', color='white')
+        cbar.ax.yaxis.set_tick_params(color='white')
+        plt.setp(plt.getp(cbar.ax.axes, 'yticklabels'), color='white')
+        
+        colors = {
+            'sharpe': ('#2ecc71', '*', 'MAX SHARPE'),
+            'sortino': ('#9b59b6', 'P', 'MAX SORTINO'),
+            'rp': ('#f39c12', 'D', 'RISK PARITY'),
+            'hrp': ('#00bcd4', 'H', 'HRP'),
+            'resampled': ('#e74c3c', 'v', 'RESAMPLED')
+        }
+        
+        for name, data in self.results.items():
+            c, m, label = colors.get(name, ('gray', 'o', name.upper()))
+            ax.scatter(data['vol'], data['ret'], c=c, s=300, marker=m,
+                      edgecolors='white', linewidth=2, label=label, zorder=10)
+        
+        ax.set_xlabel('Volatilità Annualizzata (%)', color='white', fontsize=12)
+        ax.set_ylabel('Rendimento Annualizzato (%)', color='white', fontsize=12)
+        ax.set_title('FRONTIERA EFFICIENTE', color='#00d4ff', fontsize=14, fontweight='bold')
+        ax.legend(facecolor='#1e293b', edgecolor='#334155', labelcolor='white',
+                 loc='upper left', bbox_to_anchor=(0.02, 0.98), fontsize=10)
+        ax.tick_params(colors='white')
+        ax.grid(True, alpha=0.3, color='#334155')
+        
+        for spine in ax.spines.values():
+            spine.set_color('#334155')
+        
+        plt.tight_layout()
+        return fig
+
+    def simulate(self, schedule='weekly', cost_bps=0.0, threshold=0.05):
+        """
+        Simula tutte le strategie con un calendario di ribilanciamento
+        ('weekly', 'monthly', 'quarterly', 'none' o 'threshold' con soglia
+        `threshold` sul peso) e un costo proporzionale al turnover in bps.
+        Vedi simulate_rebalancing; 'weekly' senza costi riproduce stats().
+        Le ultime SIMULATION_MEMO_SIZE simulazioni sono ricordate: grafici e
+        tabella del turnover condividono la stessa. Il risultato è condiviso,
+        non va modificato sul posto.
+
+        Restituisce DataFrame (date x strategie): 'returns' netti in %,
+        'equity' base 100 (con il punto iniziale), 'turnover'; 'weights':
+        {strategia: pesi derivati a fine periodo}; 'stats': come stats().
+        """
+        names = list(self.results)
+        W = np.array([self.results[n]['weights'] for n in names], dtype=float)
+        key = (schedule, float(cost_bps), threshold if schedule == 'threshold' else None,
+               tuple(names), W.tobytes())
+        return self._memoized(self._simulations, key, SIMULATION_MEMO_SIZE,
+                              lambda: self._simulate(names, W, schedule, cost_bps, threshold))
+
+    def _simulate(self, names, W, schedule, cost_bps, threshold):
+        """Corpo di simulate, senza memo."""
+        R = self.context.returns_matrix
+        dates = self.context.dates
+        
+        if schedule == 'threshold':
+            flags = threshold_flags(R, W, threshold)
+        else:
+            flags = rebalance_flags(dates, schedule)
+        sim = simulate_rebalancing(R, W, flags, cost_bps)
+        
+        start = self.prices.index[:1]
+        equity = pd.DataFrame(np.vstack([np.ones(len(names)), sim['equity']]) * 100,
+                              index=start.append(pd.DatetimeIndex(self.returns.index)), columns=names)
+        batch = performance_kernel(sim['returns'], self.risk_free_rate)
+        return {
+            'returns': pd.DataFrame(sim['returns'] * 100, index=dates, columns=names),
+            'equity': equity,
+            'turnover': pd.DataFrame(sim['turnover'], index=dates, columns=names),
+            'weights': {n: pd.DataFrame(sim['weights'][:, k], index=dates, columns=self.tickers)
+                        for k, n in enumerate(names)},
+            'stats': {n: {m: float(v[k]) for m, v in batch.items()} for k, n in enumerate(names)},
+        }
+
+    def _memoized(self, memo, key, maxsize, compute):
+        """
+        Risultato di compute() ricordato in memo (OrderedDict LRU) sotto key,
+        che include i pesi delle strategie: valido finché il contesto di
+        mercato è lo stesso. Si tengono al più maxsize voci.
+        """
+        entry = memo.get(key)
+        if entry is not None and entry[0] is self.context:
+            memo.move_to_end(key)
+            return entry[1]
+        
+        result = compute()
+        memo[key] = (self.context, result)
+        while len(memo) > maxsize:
+            memo.popitem(last=False)
+        return result
+
+    def performance_curves(self, schedule='weekly', cost_bps=0.0):
+        """
+        Curve di tutte le strategie dalla stessa simulazione (vedi simulate),
+        come DataFrame con una colonna per strategia:
+        - 'equity': valore netto base 100
+        - 'drawdown': perdita % dal massimo del valore netto
+        Con i default le curve sono coerenti con stats() (ribilanciamento
+        settimanale, nessun costo).
+        """
+        equity = self.simulate(schedule, cost_bps)['equity']
+        cum = equity.iloc[1:].to_numpy()
+        peak = np.maximum.accumulate(cum, axis=0)
+        drawdown = pd.DataFrame((cum - peak) / peak * 100, index=self.context.dates,
+                                columns=equity.columns)
+        return {'equity': equity, 'drawdown': drawdown}
+
+    def monte_carlo(self, horizon=52, n_paths=100_000, method='normal', block_size=4, seed=0,
+                    parallel=True, max_workers=None):
+        """
+        Simulazione Monte Carlo in avanti di tutte le strategie, su `horizon`
+        settimane con ribilanciamento settimanale (come stats()).
+
+        method='normal' estrae i rendimenti da una normale con i momenti
+        stimati (media aritmetica settimanale, S/52), 'bootstrap' ricampiona a blocchi di
+        block_size settimane i rendimenti storici. Si simulano direttamente
+        i K portafogli, non gli n asset. I percorsi sono generati a blocchi
+        di al più MC_CHUNK_ELEMENTS valori, distribuiti su un pool di
+        processi se sono almeno MC_MIN_PARALLEL_CHUNKS (guardia __main__
+        negli script, vedi run_full_optimization); i semi derivano da
+        un'unica SeedSequence, quindi il risultato non dipende dal numero di
+        worker. Le ultime MC_MEMO_SIZE simulazioni sono ricordate finché il
+        contesto di mercato non cambia.
+
+        Restituisce un dizionario con:
+        - 'terminal': ricchezza finale base 100 (percorsi x strategie)
+        - 'mdd': max drawdown in % (percorsi x strategie)
+        - 'summary': media, mediana, percentili 5/95 della ricchezza finale,
+          probabilità di perdita (%), mediana e 95° percentile del drawdown
+        """
+        if method not in ('normal', 'bootstrap'):
+            raise ValueError(f"Metodo Monte Carlo sconosciuto: {method}")
+        
+        names = list(self.results)
+        W = np.array([self.results[n]['weights'] for n in names], dtype=float)
+        key = (horizon, n_paths, method, block_size, seed, tuple(names), W.tobytes())
+        return self._memoized(self._monte_carlo, key, MC_MEMO_SIZE, lambda: self._monte_carlo_run(
+            names, W, horizon, n_paths, method, block_size, seed, parallel, max_workers))
+
+    def _monte_carlo_run(self, names, W, horizon, n_paths, method, block_size, seed,
+                         parallel, max_workers):
+        """Corpo di monte_carlo, senza memo."""
+        R = self.context.returns_matrix
+        if method == 'normal':
+            model = {'mean': W @ R.mean(axis=0),
+                     'factor': _psd_factor(W @ self.context.cov @ W.T / 52)}
+        else:
+            model = {'history': R @ W.T, 'block_size': block_size}
+        
+        chunk = max(1, min(n_paths, MC_CHUNK_ELEMENTS // (horizon * len(names))))
+        sizes = [min(chunk, n_paths - start) for start in range(0, n_paths, chunk)]
+        seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+        
+        n_workers = 1
+        if parallel and len(sizes) >= MC_MIN_PARALLEL_CHUNKS:
+            n_workers = min(len(sizes), max_workers or os.cpu_count() or 1)
+        if n_workers == 1:
+            parts = [monte_carlo_chunk(s, size, horizon, **model) for s, size in zip(seeds, sizes)]
+        else:
+            def run(pool):
+                futures = [pool.submit(monte_carlo_chunk, s, size, horizon, **model)
+                           for s, size in zip(seeds, sizes)]
+                return [fut.result() for fut in futures]
+            parts = _run_in_pool(run, n_workers)
+        
+        terminal = np.vstack([p[0] for p in parts]) * 100
+        mdd = np.vstack([p[1] for p in parts]) * 100
+        summary = pd.DataFrame({
+            'mean': terminal.mean(axis=0),
+            'median': np.median(terminal, axis=0),
+            'p5': np.percentile(terminal, 5, axis=0),
+            'p95': np.percentile(terminal, 95, axis=0),
+            'prob_loss': (terminal < 100).mean(axis=0) * 100,
+            'mdd_median': np.median(mdd, axis=0),
+            'mdd_p95': np.percentile(mdd, 95, axis=0),
+        }, index=names)
+        
+        return {
+            'terminal': pd.DataFrame(terminal, columns=names),
+            'mdd': pd.DataFrame(mdd, columns=names),
+            'summary': summary,
+        }
+
+    def plot_cumulative(self, max_points=PLOT_MAX_POINTS, schedule='weekly', cost_bps=0.0):
+        """
+        Genera il grafico dei rendimenti cumulativi, con il ribilanciamento
+        e i costi indicati (vedi simulate).
+        Ogni serie è ridotta con LTTB a max_points punti (None = tutti).
+        """
+        equity = self.performance_curves(schedule, cost_bps)['equity']
+        fig, ax = plt.subplots(figsize=(12, 7))
+        fig.patch.set_facecolor('#0f172a')
+        ax.set_facecolor('#1e293b')
+        
+        colors = {
+            'sharpe': '#2ecc71',
+            'sortino': '#9b59b6',
+            'rp': '#f39c12',
+            'hrp': '#00bcd4',
+            'resampled': '#e74c3c'
+        }
+        
+        for name in equity:
+            ax.plot(downsample(equity[name], max_points),
+                   color=colors.get(name, 'gray'), linewidth=2, label=name.upper())
+        
+        if self.best_benchmark and self.best_benchmark['ticker'] in self.bench.benchmark_prices:
+            bp = self.bench.benchmark_prices[self.best_benchmark['ticker']]
+            common = equity.index.intersection(bp.index)
+            if len(common) > 0:
+                ax.plot(downsample(bp.loc[common]/bp.loc[common].iloc[0]*100, max_points),
+                       'w--', linewidth=2, alpha=0.7,
+                       label=f"Benchmark: {self.best_benchmark['ticker']}")
+        
+        ax.axhline(100, color='gray', linestyle=':', alpha=0.5, label='Base 100')
+        ax.set_xlabel('Data', color='white', fontsize=12)
+        ax.set_ylabel('Valore Portafoglio (Base 100€)', color='white', fontsize=12)
+        ax.set_title('RENDIMENTI CUMULATIVI', color='#00d4ff', fontsize=14, fontweight='bold')
+        ax.legend(facecolor='#1e293b', edgecolor='#334155', labelcolor='white',
+                 loc='upper left', bbox_to_anchor=(0.02, 0.98), fontsize=10)
+        ax.tick_params(colors='white')
+        ax.grid(True, alpha=0.3, color='#334155')
+        
+        for spine in ax.spines.values():
+            spine.set_color('#334155')
+        
+        plt.tight_layout()
+        return fig
+
+    def plot_drawdown(self, max_points=PLOT_MAX_POINTS, schedule='weekly', cost_bps=0.0):
+        """
+        Genera il grafico del drawdown, con il ribilanciamento e i costi
+        indicati (vedi simulate).
+        Ogni serie è ridotta con LTTB a max_points punti (None = tutti);
+        il massimo in legenda è calcolato sulla serie completa.
+        """
+        drawdown = self.performance_curves(schedule, cost_bps)['drawdown']
+        fig, ax = plt.subplots(figsize=(12, 6))
+        fig.patch.set_facecolor('#0f172a')
+        ax.set_facecolor('#1e293b')
+        
+        colors = {
+            'sharpe': '#2ecc71',
+            'sortino': '#9b59b6',
+            'rp': '#f39c12',
+            'hrp': '#00bcd4',
+            'resampled': '#e74c3c'
+        }
+        
+        for name in drawdown:
+            dd = downsample(drawdown[name], max_points)
+            ax.fill_between(dd.index, dd.values, 0, alpha=0.3, color=colors.get(name, 'gray'))
+            ax.plot(dd.index, dd.values, color=colors.get(name, 'gray'),
+                   label=f"{name.upper()} (Max: {drawdown[name].min():.1f}%)")
+        
+        ax.set_xlabel('Data', color='white', fontsize=12)
+        ax.set_ylabel('Drawdown (%)', color='white', fontsize=12)
+        ax.set_title('DRAWDOWN NEL TEMPO', color='#00d4ff', fontsize=14, fontweight='bold')
+        ax.legend(facecolor='#1e293b', edgecolor='#334155', labelcolor='white',
+                 loc='lower left', bbox_to_anchor=(0.02, 0.02), fontsize=10)
+        ax.tick_params(colors='white')
+        ax.grid(True, alpha=0.3, color='#334155')
+        
+        for spine in ax.spines.values():
+            spine.set_color('#334155')
+        
+        plt.tight_layout()
+        return fig
+
+    def plot_monte_carlo(self, horizon=52, n_paths=100_000, method='normal'):
+        """
+        Distribuzioni Monte Carlo (vedi monte_carlo) della ricchezza finale
+        e del max drawdown; in legenda la probabilità di perdita.
+        """
+        sim = self.monte_carlo(horizon, n_paths, method)
+        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 6))
+        fig.patch.set_facecolor('#0f172a')
+        
+        colors = {
+            'sharpe': '#2ecc71',
+            'sortino': '#9b59b6',
+            'rp': '#f39c12',
+            'hrp': '#00bcd4',
+            'resampled': '#e74c3c'
+        }
+        
+        # Code estreme escluse dal range degli istogrammi
+        for ax, data, title, xlabel in (
+                (ax1, sim['terminal'], 'RICCHEZZA FINALE (BASE 100)', 'Valore finale'),
+                (ax2, sim['mdd'], 'MAX DRAWDOWN', 'Max Drawdown (%)')):
+            ax.set_facecolor('#1e293b')
+            bins = np.linspace(*np.percentile(data.values, [0.5, 99.5]), 80)
+            for name in data:
+                label = name.upper()
+                if ax is ax1:
+                    label += f" (P. perdita {sim['summary'].loc[name, 'prob_loss']:.1f}%)"
+                ax.hist(data[name].values, bins=bins, histtype='step', linewidth=2,
+                        color=colors.get(name, 'gray'), label=label)
+            ax.set_title(title, color='#00d4ff', fontsize=14, fontweight='bold')
+            ax.set_xlabel(xlabel, color='white', fontsize=12)
+            ax.set_ylabel('Percorsi', color='white', fontsize=12)
+            ax.tick_params(colors='white')
+            ax.grid(True, alpha=0.3, color='#334155')
+            for spine in ax.spines.values():
+                spine.set_color('#334155')
+        
+        ax1.axvline(100, color='white', linestyle='--', alpha=0.7)
+        ax1.legend(facecolor='#1e293b', edgecolor='#334155', labelcolor='white', fontsize=9)
+        fig.suptitle(f'SIMULAZIONE MONTE CARLO · {n_paths:,} PERCORSI · {horizon} SETTIMANE',
+                     fontsize=14, fontweight='bold', color='#00d4ff')
+        
+        plt.tight_layout()
+        return fig
+
+    def correlation_order(self):
+        """
+        Ordine degli asset dal clustering gerarchico (average linkage sulla
+        distanza sqrt((1 - ρ) / 2)): gli asset correlati finiscono vicini.
+        """
+        corr = np.nan_to_num(self.context.corr.values, nan=0.0)
+        dist = np.sqrt(np.clip((1 - corr) / 2, 0, 1))
+        np.fill_diagonal(dist, 0)
+        link = hierarchy.linkage(distance.squareform(dist, checks=False), method='average')
+        return hierarchy.leaves_list(link)
+
+    def plot_correlation_matrix(self, top_k=None):
+        """
+        Genera la matrice di correlazione.
+        Fino a CORR_ANNOTATE_MAX_ASSETS asset: heatmap annotata nell'ordine
+        originale. Oltre: asset ordinati per cluster, nessuna annotazione e
+        un'unica immagine raster a dimensione fissa, così tempo di rendering
+        e memoria non crescono con N. Con top_k si mostrano solo le k
+        correlazioni più forti (in valore assoluto) di ogni asset.
+        """
+        n_assets = len(self.tickers)
+        if n_assets <= CORR_ANNOTATE_MAX_ASSETS and not top_k:
+            return self._plot_correlation_annotated()
+        
+        order = self.correlation_order()
+        labels = [self.tickers[i] for i in order]
+        corr = self.context.corr.values[np.ix_(order, order)]
+        
+        if top_k:
+            strength = np.abs(np.nan_to_num(corr))
+            np.fill_diagonal(strength, -np.inf)
+            k = min(int(top_k), n_assets - 1)
+            top = np.argpartition(-strength, k - 1, axis=1)[:, :k] if k > 0 else np.empty((n_assets, 0), int)
+            keep = np.eye(n_assets, dtype=bool)
+            keep[np.repeat(np.arange(n_assets), top.shape[1]), top.ravel()] = True
+            corr = np.where(keep | keep.T, corr, np.nan)
+        
+        fig, ax = plt.subplots(figsize=(12, 10))
+        fig.patch.set_facecolor('#0f172a')
+        ax.set_facecolor('#1e293b')
+        
+        cmap = plt.get_cmap('RdBu_r').copy()
+        cmap.set_bad('#1e293b')
+        image = ax.imshow(np.ma.masked_invalid(corr), cmap=cmap, vmin=-1, vmax=1,
+                          interpolation='nearest', aspect='equal')
+        
+        if n_assets <= CORR_LABEL_MAX_ASSETS:
+            ax.set_xticks(range(n_assets))
+            ax.set_yticks(range(n_assets))
+            ax.set_xticklabels(labels, rotation=90, fontsize=6, color='white')
+            ax.set_yticklabels(labels, fontsize=6, color='white')
+        else:
+            ax.set_xticks([])
+            ax.set_yticks([])
+            ax.set_xlabel(f'{n_assets} asset ordinati per cluster', color='white')
+        
+        title = 'MATRICE DI CORRELAZIONE (ordinata per cluster'
+        title += f', top {top_k} per asset)' if top_k else ')'
+        ax.set_title(title, color='#00d4ff', fontsize=14, fontweight='bold', pad=20)
+        
+        cbar = fig.colorbar(image, ax=ax, shrink=0.8)
+        cbar.ax.yaxis.set_tick_params(color='white')
+        plt.setp(plt.getp(cbar.ax.axes, 'yticklabels'), color='white')
+        cbar.set_label('Correlazione', color='white')
+        
+        plt.tight_layout()
+        return fig
+
+    def _plot_correlation_annotated(self):
+        """Heatmap annotata, per universi piccoli."""
+        corr_matrix = self.context.corr
+        n_assets = len(self.tickers)
+        
+        fig_width = max(12, n_assets * 0.6)
+        fig_height = max(10, n_assets * 0.5)
+        
+        fig, ax = plt.subplots(figsize=(fig_width, fig_height))
+        fig.patch.set_facecolor('#0f172a')
+        ax.set_facecolor('#1e293b')
+        
+        sns.heatmap(
+            corr_matrix,
+            annot=True,
+            fmt='.2f',
+            cmap='RdBu_r',
+            center=0,
+            vmin=-1, vmax=1,
+            square=True,
+            linewidths=0.5,
+            linecolor='#334155',
+            cbar_kws={'label': 'Correlazione', 'shrink': 0.8},
+            annot_kws={'size': max(6, 10 - n_assets // 4), 'color': 'white'},
+            ax=ax
+        )
+        
+        ax.set_xticklabels(ax.get_xticklabels(), rotation=45, ha='right', color='white')
+        ax.set_yticklabels(ax.get_yticklabels(), rotation=0, color='white')
+        ax.set_title('MATRICE DI CORRELAZIONE', color='#00d4ff', fontsize=14, fontweight='bold', pad=20)
+        
+        cbar = ax.collections[0].colorbar
+        cbar.ax.yaxis.set_tick_params(color='white')
+        plt.setp(plt.getp(cbar.ax.axes, 'yticklabels'), color='white')
+        cbar.set_label('Correlazione', color='white')
+        
+        plt.tight_layout()
+        return fig
+
+    def plot_risk_return_map(self):
+        """Genera la mappa risk-return."""
+        if not self.best_benchmark:
+            return None
+        
+        fig, ax = plt.subplots(figsize=(14, 10))
+        fig.patch.set_facecolor('#0f172a')
+        ax.set_facecolor('#1e293b')
+        
+        colors = {
+            'sharpe': ('#2ecc71', '*', 'MAX SHARPE'),
+            'sortino': ('#9b59b6', 'P', 'MAX SORTINO'),
+            'rp': ('#f39c12', 'D', 'RISK PARITY'),
+            'hrp': ('#00bcd4', 'H', 'HRP'),
+            'resampled': ('#e74c3c', 'v', 'RESAMPLED')
+        }
+        
+        # Risk-free point
+        ax.scatter(0, self.risk_free_rate * 100, c='gray', s=200, marker='s',
+                  edgecolors='white', linewidth=2,
+                  label=f'Risk-Free ({self.risk_free_rate*100:.1f}%)', zorder=5)
+        
+        # Benchmark
+        b = self.best_benchmark
+        ax.scatter(b['volatility'], b['mean_return'], c='#3b82f6', s=400, marker='X',
+                  edgecolors='white', linewidth=2,
+                  label=f"BENCHMARK ({b['ticker']})", zorder=10)
+        
+        # CML line
+        if b['sharpe'] > 0:
+            vol_range = np.linspace(0, max(b['volatility'] * 1.5, 40), 100)
+            cml_returns = self.risk_free_rate * 100 + b['sharpe'] * vol_range
+            ax.plot(vol_range, cml_returns, 'w--', alpha=0.3, linewidth=1.5,
+                   label=f"CML (Sharpe = {b['sharpe']:.2f})")
+        
+        # Strategie
+        for name, data in self.results.items():
+            c, m, label = colors.get(name, ('gray', 'o', name.upper()))
+            ax.scatter(data['vol'], data['ret'], c=c, s=350, marker=m,
+                      edgecolors='white', linewidth=2, label=label, zorder=10)
+        
+        ax.set_xlabel('Volatilità Annualizzata (%)', color='white', fontsize=12)
+        ax.set_ylabel('Rendimento Annualizzato (%)', color='white', fontsize=12)
+        ax.set_title('MAPPA RISK-RETURN', color='#00d4ff', fontsize=14, fontweight='bold')
+        ax.legend(facecolor='#1e293b', edgecolor='#334155', labelcolor='white', 
+                 loc='upper left', bbox_to_anchor=(0.02, 0.98), fontsize=10)
+        ax.tick_params(colors='white')
+        ax.grid(True, alpha=0.3, color='#334155')
+        ax.axhline(0, color='gray', linestyle='-', alpha=0.3)
+        
+        for spine in ax.spines.values():
+            spine.set_color('#334155')
+        
+        plt.tight_layout()
+        return fig
+
+    def plot_allocation_pie(self):
+        """Genera i pie chart dell'allocazione."""
+        MIN_WEIGHT_THRESHOLD = 0.02
+        colors_palette = ['#2ecc71', '#3498db', '#9b59b6', '#f39c12', '#1abc9c',
+                         '#e74c3c', '#34495e', '#e67e22', '#27ae60', '#8e44ad',
+                         '#2980b9', '#c0392b', '#16a085', '#d35400', '#7f8c8d']
+        others_color = '#bdc3c7'
+        
+        strategy_styles = {
+            'sharpe': {'title': 'MAX SHARPE', 'color': '#2ecc71'},
+            'sortino': {'title': 'MAX SORTINO', 'color': '#9b59b6'},
+            'rp': {'title': 'RISK PARITY', 'color': '#f39c12'},
+            'hrp': {'title': 'HRP', 'color': '#00bcd4'},
+            'resampled': {'title': 'RESAMPLED', 'color': '#e74c3c'}
+        }
+        
+        # Due pie per riga: la griglia cresce con il numero di strategie
+        n_rows = (len(self.results) + 1) // 2
+        fig, axes = plt.subplots(n_rows, 2, figsize=(16, 7 * n_rows))
+        fig.patch.set_facecolor('#0f172a')
+        axes = axes.flatten()
+        for ax in axes[len(self.results):]:
+            ax.set_visible(False)
+        
+        for idx, (name, data) in enumerate(self.results.items()):
+            ax = axes[idx]
+            ax.set_facecolor('#1e293b')
+            
+            weights = data['weights']
+            sorted_indices = np.argsort(weights)[::-1]
+            labels, sizes, colors, explode_list = [], [], [], []
+            others_weight = 0
+            color_idx = 0
+            
+            for i in sorted_indices:
+                w = weights[i]
+                if w < 0.001:
+                    continue
+                if w < MIN_WEIGHT_THRESHOLD:
+                    others_weight += w
+                else:
+                    labels.append(self.tickers[i])
+                    sizes.append(w * 100)
+                    colors.append(colors_palette[color_idx % len(colors_palette)])
+                    explode_list.append(0.03 if color_idx < 3 else 0)
+                    color_idx += 1
+            
+            if others_weight > 0.001:
+                labels.append('Altri')
+                sizes.append(others_weight * 100)
+                colors.append(others_color)
+                explode_list.append(0)
+            
+            wedges, texts, autotexts = ax.pie(
+                sizes, labels=None, colors=colors,
+                autopct=lambda pct: f'{pct:.1f}%' if pct >= 3 else '',
+                explode=explode_list, startangle=90, pctdistance=0.75,
+                wedgeprops={'edgecolor': 'white', 'linewidth': 2},
+                textprops={'fontsize': 9, 'fontweight': 'bold', 'color': 'white'}
+            )
+            
+            for autotext in autotexts:
+                autotext.set_color('white')
+            
+            centre_circle = plt.Circle((0, 0), 0.4, fc='#1e293b', ec='#334155', linewidth=2)
+            ax.add_patch(centre_circle)
+            
+            style = strategy_styles.get(name, {'title': name.upper(), 'color': 'gray'})
+            center_text = f"Sharpe\n{data['sharpe']:.2f}"
+            ax.text(0, 0, center_text, ha='center', va='center',
+                   fontsize=12, fontweight='bold', color='white')
+            
+            ax.set_title(style['title'], fontsize=14, fontweight='bold',
+                        color=style['color'], pad=10)
+            
+            legend_labels = [f"{l} ({s:.1f}%)" for l, s in zip(labels, sizes)]
+            leg = ax.legend(wedges, legend_labels, title="Asset", loc='center left',
+                           bbox_to_anchor=(1, 0, 0.5, 1), fontsize=8, title_fontsize=9)
+            leg.get_frame().set_facecolor('#1e293b')
+            leg.get_frame().set_edgecolor('#334155')
+            for text in leg.get_texts():
+                text.set_color('white')
+            leg.get_title().set_color('white')
+        
+        fig.suptitle('ALLOCAZIONE PORTAFOGLIO', fontsize=16, fontweight='bold',
+                    color='#00d4ff', y=0.98)
+        
+        plt.tight_layout(rect=[0, 0.02, 1, 0.95])
+        return fig
+
+    def run_full_optimization(self, progress_callback=None, parallel=False, max_workers=None):
+        """
+        Esegue l'ottimizzazione completa.
+        Con parallel=True le quattro strategie girano in un pool di processi
+        e la ricerca del benchmark si sovrappone a esse (vedi _run_parallel);
+        la Resampled, se attiva, distribuisce da sé i campioni sui core.
+        Come per gli altri metodi con parallel=True, in uno script i calcoli
+        vanno avviati sotto `if __name__ == '__main__'`: senza la guardia
+        i worker non partono e si ripiega sul calcolo sequenziale.
+        """
+        if parallel:
+            return self._run_parallel(progress_callback, max_workers)
+        
+        steps = [(msg, getattr(self, method)) for _, msg, method in self._strategy_steps()] + [
+            ("Ricerca benchmark...", self.find_benchmark),
+            ("Calcolo metriche benchmark...", self.calc_bench_metrics),
+        ]
+        
+        for i, (msg, func) in enumerate(steps):
+            if progress_callback:
+                progress_callback((i + 1) / len(steps), msg)
+            func()
+        
+        return self.results
+
+    def reoptimize(self, progress_callback=None, parallel=False, max_workers=None, **constraints):
+        """
+        Riesegue le strategie cambiando solo i vincoli (min_weight,
+        max_concentration, sector_limits, target_volatility) o il numero di
+        campioni della Resampled (n_resamples).
+
+        Restituisce un nuovo ottimizzatore che condivide contesto (mu, S,
+        rendimenti), analyzer e benchmark già selezionato: la scelta del
+        benchmark usa il portafoglio equipesato e non dipende dai vincoli.
+        I pesi HRP grezzi (clustering) vengono riusati e SLSQP del Risk Parity
+        parte dai pesi precedenti. Con parallel=True le strategie girano in un
+        pool di processi come in run_full_optimization. L'ottimizzatore
+        corrente non viene modificato.
+        """
+        allowed = {'min_weight', 'max_concentration', 'sector_limits', 'target_volatility',
+                   'n_resamples'}
+        unknown = set(constraints) - allowed
+        if unknown:
+            raise TypeError(f"Parametri non modificabili con reoptimize: {', '.join(sorted(unknown))}")
+        
+        params = {**self._constraint_params(), 'n_resamples': self.n_resamples}
+        params.update(constraints)
+        
+        new = PortfolioOptimizer(
+            self.tickers, self.prices, self.returns, risk_free_rate=self.risk_free_rate,
+            sector_map=self.sector_map, start_date=self.start_date, end_date=self.end_date,
+            benchmark_analyzer=self.bench, context=self.context,
+            resample_seed=self.resample_seed, **params
+        )
+        new._previous = {name: data['weights'] for name, data in self.results.items()}
+        new._hrp_raw = self._hrp_raw
+        new.best_benchmark = copy.deepcopy(self.best_benchmark)
+        
+        if parallel:
+            new._run_parallel(progress_callback, max_workers,
+                              find_benchmark=new.best_benchmark is None)
+            return new
+        
+        steps = [(msg, getattr(new, method)) for _, msg, method in new._strategy_steps()]
+        if new.best_benchmark is None:
+            steps.append(("Ricerca benchmark...", new.find_benchmark))
+        steps.append(("Calcolo metriche benchmark...", new.calc_bench_metrics))
+        
+        for i, (msg, func) in enumerate(steps):
+            if progress_callback:
+                progress_callback((i + 1) / len(steps), msg)
+            func()
+        
+        return new
+
+    def _constraint_params(self):
+        """Vincoli correnti, nella forma accettata dal costruttore."""
+        return {
+            'min_weight': self.min_weight,
+            'max_concentration': self.max_concentration,
+            'sector_limits': self.sector_limits if self.use_sector_constraints else False,
+            'target_volatility': self.target_volatility,
+        }
+
+    def walk_forward(self, lookback=156, rebalance_every=4, parallel=True, max_workers=None,
+                     progress_callback=None):
+        """
+        Backtest out-of-sample walk-forward di tutte le strategie.
+
+        Ogni rebalance_every settimane le strategie vengono riottimizzate sulle
+        ultime `lookback` settimane e i pesi ottenuti si applicano alle
+        settimane successive, fino al ribilanciamento seguente. mu e S di
+        ogni finestra si aggiornano in modo incrementale (RollingMoments);
+        le finestre, divise in blocchi contigui, vengono ottimizzate in un
+        pool di processi (negli script serve la guardia __main__, vedi
+        run_full_optimization). Se una strategia fallisce si mantengono i pesi
+        precedenti (equipesati alla prima finestra).
+
+        Restituisce un dizionario con:
+        - 'returns': rendimenti settimanali out-of-sample in % (date x strategie)
+        - 'weights': {strategia: DataFrame dei pesi per data di ribilanciamento}
+        - 'stats': {strategia: statistiche come stats()}
+        - 'failed': numero di finestre fallite per strategia
+        """
+        R = self.context.returns_matrix
+        n_periods = len(R)
+        if lookback < 2 or n_periods <= lookback:
+            raise ValueError(f"Servono più di {lookback} settimane di dati per il walk-forward")
+        
+        params = {'risk_free_rate': self.risk_free_rate, 'sector_map': self.sector_map,
+                  **self._constraint_params()}
+        
+        # Finestra [t - lookback, t) sui rendimenti = prezzi [t - lookback, t]
+        rebalances = list(range(lookback, n_periods, rebalance_every))
+        moments = RollingMoments(R[:lookback])
+        windows = []
+        for i, t in enumerate(rebalances):
+            if i > 0:
+                prev = rebalances[i - 1]
+                moments.slide(R[prev:t], R[prev - lookback:t - lookback])
+            mu, S = moments.as_pandas(self.tickers)
+            windows.append((self.prices.iloc[t - lookback:t + 1],
+                            self.returns.iloc[t - lookback:t], mu, S))
+        
+        n_blocks = min(len(windows), (max_workers or os.cpu_count() or 1) * 2) if parallel else 1
+        blocks = [list(b) for b in np.array_split(np.arange(len(windows)), n_blocks)]
+        
+        solved = [None] * len(windows)
+        
+        def run(pool):
+            futures = {pool.submit(_run_windows, params, [windows[j] for j in block]): block
+                       for block in blocks}
+            done = 0
+            for fut in as_completed(futures):
+                for j, weights in zip(futures[fut], fut.result()):
+                    solved[j] = weights
+                done += len(futures[fut])
+                if progress_callback:
+                    progress_callback(done / len(windows), "Backtest walk-forward...")
+        
+        if parallel:
+            _run_in_pool(run, max_workers)
+        else:
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                run(pool)
+        
+        keys = [key for key, _, _ in STRATEGY_STEPS]
+        rebalance_dates = self.context.dates[[t - 1 for t in rebalances]]
+        W = {key: np.empty((len(windows), self.n_assets)) for key in keys}
+        failed = dict.fromkeys(keys, 0)
+        for key in keys:
+            last = np.full(self.n_assets, 1 / self.n_assets)
+            for j, weights in enumerate(solved):
+                if weights[key] is None:
+                    failed[key] += 1
+                else:
+                    last = weights[key]
+                W[key][j] = last
+        
+        oos = np.empty((n_periods - lookback, len(keys)))
+        for j, t in enumerate(rebalances):
+            end = min(t + rebalance_every, n_periods)
+            oos[t - lookback:end - lookback] = R[t:end] @ np.column_stack([W[k][j] for k in keys])
+        
+        batch = performance_kernel(oos, self.risk_free_rate)
+        return {
+            'returns': pd.DataFrame(oos * 100, index=self.context.dates[lookback:], columns=keys),
+            'weights': {k: pd.DataFrame(W[k], index=rebalance_dates, columns=self.tickers) for k in keys},
+            'stats': {k: {m: float(v[i]) for m, v in batch.items()} for i, k in enumerate(keys)},
+            'failed': failed,
+        }
+
+    def _live_state(self):
+        """
+        Accumulatori per append_bars, costruiti (O(T)) alla prima chiamata o
+        quando i pesi delle strategie cambiano. Contengono tutta la storia
+        tranne l'ultima settimana, che resta "aperta" e può essere aggiornata.
+        """
+        names = list(self.results)
+        W = np.array([self.results[n]['weights'] for n in names], dtype=float)
+        live = self._live
+        if live is not None and live['names'] == names and np.array_equal(live['W'], W):
+            return live
+        
+        R = self.context.returns_matrix
+        P = R @ W.T
+        stats = RunningStats(len(names), self.risk_free_rate)
+        stats.update(P[:-1])
+        live = {'names': names, 'W': W, 'moments': RollingMoments(R[:-1]),
+                'stats': stats, 'bench': None}
+        
+        ticker = (self.best_benchmark or {}).get('ticker')
+        if ticker in self.bench.benchmark_returns:
+            br = self._benchmark_decimal(ticker)
+            bench_stats = RunningStats(1, self.risk_free_rate)
+            bench_stats.update(br.to_numpy()[:-1])
+            relative = RunningRelativeStats(len(names))
+            relative.update(P[:-1], br.reindex(self.context.dates[:-1]).to_numpy())
+            live['bench'] = {'ticker': ticker, 'stats': bench_stats, 'relative': relative}
+        
+        self._live = live
+        return live
+
+    def _benchmark_decimal(self, ticker):
+        """Rendimenti decimali del benchmark su date normalizzate."""
+        br = self.bench.benchmark_returns[ticker] / 100
+        br.index = pd.to_datetime(br.index).normalize()
+        return br
+
+    @staticmethod
+    def _split_open(last_row, last_date, rows, dates, replaced):
+        """
+        Divide le righe (m x n) dopo un merge_weekly_bars in (righe da
+        consolidare, loro date, nuova riga aperta, sua data). La vecchia riga
+        aperta si consolida, a meno che la sua settimana non sia stata sostituita.
+        """
+        if replaced:
+            committed, committed_dates = rows[:-1], dates[:-1]
+        else:
+            committed = np.vstack([np.reshape(last_row, (1, -1)), rows[:-1]])
+            committed_dates = pd.DatetimeIndex([last_date]).append(dates[:-1])
+        return committed, committed_dates, rows[-1], dates[-1]
+
+    def append_bars(self, new_prices, benchmark_prices=None, reoptimize=False):
+        """
+        Aggiorna l'analisi con nuove barre di prezzo (giornaliere o
+        settimanali) senza rifare la pipeline: rendimenti, mu e S
+        (RollingMoments), metriche delle strategie con i pesi correnti,
+        equity e drawdown massimo (RunningStats) e, se si passano le barre
+        del benchmark selezionato, le sue metriche e quelle relative
+        (RunningRelativeStats). Gli accumulatori costano O(nuove barre);
+        non lo è l'intera chiamata: il nuovo contesto copia la storia
+        (O(T·n), vedi MarketContext.extend) e la correzione PSD di S costa
+        O(n³). Si evitano comunque download, ricampionamento e ricalcolo
+        di momenti e metriche sull'intera storia.
+
+        Analyzer, benchmark scelto e risultati non vengono modificati sul
+        posto ma sostituiti con copie aggiornate: possono essere condivisi
+        con altri ottimizzatori (reoptimize, cache dei risultati).
+
+        Barre della settimana già in coda la aggiornano (settimana in corso).
+        Con reoptimize=True le strategie vengono anche riottimizzate sui
+        dati aggiornati (partendo dai pesi correnti). Restituisce results.
+        """
+        missing = [t for t in self.tickers if t not in new_prices.columns]
+        if missing:
+            raise ValueError(f"Barre mancanti per: {', '.join(missing)}")
+        
+        live = self._live_state()
+        bench = live['bench']
+        
+        br = self._benchmark_decimal(bench['ticker']) if bench is not None else None
+        
+        # Benchmark per primo: le date consolidate dei portafogli lo cercano
+        if benchmark_prices is not None and bench is not None:
+            ticker = bench['ticker']
+            bp, b_new, b_replaced = merge_weekly_bars(self.bench.benchmark_prices[ticker],
+                                                      benchmark_prices)
+            if len(b_new):
+                b_dates = pd.DatetimeIndex(pd.to_datetime(b_new.index).normalize())
+                committed, _, _, _ = self._split_open(
+                    br.iloc[-1], br.index[-1], b_new.to_numpy(dtype=float)[:, None],
+                    b_dates, b_replaced)
+                bench['stats'].update(committed)
+                keep = len(br) - (1 if b_replaced else 0)
+                analyzer = self.bench.detached_copy()
+                analyzer.benchmark_prices[ticker] = bp
+                analyzer.benchmark_returns[ticker] = pd.concat(
+                    [analyzer.benchmark_returns[ticker].iloc[:keep], b_new * 100])
+                self.bench = analyzer
+                b_new = b_new.copy()
+                b_new.index = b_dates
+                br = pd.concat([br.iloc[:keep], b_new])
+        
+        prices, new_returns, replaced = merge_weekly_bars(self.prices, new_prices[self.tickers])
+        if len(new_returns):
+            dates = pd.DatetimeIndex(pd.to_datetime(new_returns.index).normalize())
+            committed, committed_dates, open_row, open_date = self._split_open(
+                self.context.returns_matrix[-1], self.context.dates[-1],
+                new_returns.to_numpy(dtype=float), dates, replaced)
+            
+            live['moments'].slide(committed)
+            moments = copy.deepcopy(live['moments'])
+            moments.slide(open_row)
+            mu, S = moments.as_pandas(self.tickers)
+            
+            self.context = self.context.extend(prices, new_returns * 100, mu, S, replace_last=replaced)
+            self.prices = self.context.prices
+            self.returns = self.context.returns_pct
+            self.mu = self.context.mu
+            self.S = self.context.S
+            self.frontier = None
+            
+            live['stats'].update(committed @ live['W'].T)
+            if bench is not None:
+                bench['relative'].update(committed @ live['W'].T,
+                                         br.reindex(committed_dates).to_numpy())
+        
+        # Metriche correnti: accumulatori + settimana aperta, su copie
+        W = live['W']
+        stats = copy.deepcopy(live['stats'])
+        stats.update(self.context.returns_matrix[-1] @ W.T)
+        metrics = stats.metrics()
+        results = {name: dict(data) for name, data in self.results.items()}
+        for k, name in enumerate(live['names']):
+            results[name].update({m: float(v[k]) for m, v in metrics.items()})
+        
+        if bench is not None:
+            bench_stats = copy.deepcopy(bench['stats'])
+            bench_stats.update(br.to_numpy()[-1:])
+            b = {m: float(v[0]) for m, v in bench_stats.metrics().items()}
+            self.best_benchmark = {
+                **self.best_benchmark,
+                'mean_return': b['ret'], 'volatility': b['vol'], 'sharpe': b['sharpe'],
+                'sortino': b['sortino'], 'max_drawdown': b['mdd'], 'calmar': b['calmar'],
+            }
+            
+            relative = copy.deepcopy(bench['relative'])
+            relative.update(self.context.returns_matrix[-1] @ W.T,
+                            br.reindex(self.context.dates[-1:]).to_numpy())
+            rel = relative.metrics(metrics['ret'], metrics['mdd'], self.risk_free_rate)
+            if rel is not None:
+                for k, name in enumerate(live['names']):
+                    results[name].update({m: float(v[k]) for m, v in rel.items()})
+        self.results = results
+        
+        if reoptimize:
+            self._previous = {name: data['weights'] for name, data in self.results.items()}
+            self._hrp_raw = None
+            for _, _, method in self._strategy_steps():
+                getattr(self, method)()
+            self.calc_bench_metrics()
+        
+        return self.results
+
+    def detached_copy(self):
+        """
+        Copia indipendente, ad es. per la cache condivisa tra sessioni:
+        risultati, benchmark scelto e analyzer sono copiati, così le
+        modifiche di una copia (append_bars, grafici, Monte Carlo) non
+        toccano le altre. Contesto di mercato e pesi HRP grezzi, mai
+        modificati sul posto, restano condivisi.
+        """
+        new = copy.copy(self)
+        new.results = copy.deepcopy(self.results)
+        new.best_benchmark = copy.deepcopy(self.best_benchmark)
+        new.bench = self.bench.detached_copy() if self.bench is not None else None
+        new._previous = dict(self._previous)
+        new._live = None
+        new._simulations = OrderedDict()
+        new._monte_carlo = OrderedDict()
+        return new
+
+    def _worker_copy(self):
+        """Copia leggera da inviare ai processi worker (senza analyzer né risultati)."""
+        worker = copy.copy(self)
+        worker.bench = None
+        worker.results = {}
+        worker.frontier = None
+        worker._simulations = OrderedDict()
+        worker._monte_carlo = OrderedDict()
+        return worker
+
+    def _run_parallel(self, progress_callback=None, max_workers=None, find_benchmark=True):
+        """
+        Strategie in parallelo su processi separati (dipendono solo da mu, S e
+        rendimenti), ricerca del benchmark su un thread del processo principale.
+        Il progresso viene riportato man mano che ogni passo termina; il calcolo
+        delle metriche relative al benchmark chiude la sequenza. Con
+        find_benchmark=False si tiene il benchmark già scelto.
+        """
+        total = len(self._strategy_steps()) + (2 if find_benchmark else 1)
+        worker = self._worker_copy()
+        finished = set()
+        
+        with ThreadPoolExecutor(max_workers=1) as threads:
+            bench_future = threads.submit(self.find_benchmark) if find_benchmark else None
+            
+            def run(procs):
+                futures = {procs.submit(_run_strategy, worker, method): msg
+                           for _, msg, method in STRATEGY_STEPS}
+                # Se il pool si rompe run viene ripetuto: il benchmark non si riattende
+                waiting = list(futures)
+                if bench_future is not None and 'benchmark' not in finished:
+                    waiting.append(bench_future)
+                
+                for fut in as_completed(waiting):
+                    if fut is bench_future:
+                        fut.result()
+                        key, msg = 'benchmark', "Ricerca benchmark..."
+                    else:
+                        key, result = fut.result()
+                        self.results[key] = result
+                        msg = futures[fut]
+                    finished.add(key)
+                    if progress_callback:
+                        progress_callback(len(finished) / total, msg)
+            
+            _run_in_pool(run, max_workers)
+        done = len(finished)
+        
+        # La Resampled usa un proprio pool: parte dopo, con tutti i core liberi
+        if self.n_resamples:
+            self.optimize_resampled(max_workers=max_workers)
+            done += 1
+            if progress_callback:
+                progress_callback(done / total, RESAMPLED_STEP[1])
+        
+        # Stesso ordine dell'esecuzione sequenziale
+        self.results = {key: self.results[key] for key, _, _ in self._strategy_steps()
+                        if key in self.results}
+        
+        if progress_callback:
+            progress_callback(1.0, "Calcolo metriche benchmark...")
+        self.calc_bench_metrics()
+        return self.results
+
+
+# ════════════════════════════════════════════════════════════════════════════════
+# CACHE DEI RISULTATI
+# ════════════════════════════════════════════════════════════════════════════════
+
+# Metriche delle strategie che entrano nell'impronta dei risultati
+RESULT_METRIC_KEYS = ('ret', 'vol', 'sharpe', 'sortino', 'mdd', 'calmar',
+                      'beta', 'te', 'alpha', 'ir', 'treynor', 'n_weeks', 'resamples')
+
+
+def price_fingerprint(prices):
+    """Impronta del pannello prezzi: colonne, date e valori."""
+    h = hashlib.sha1()
+    h.update(repr(tuple(prices.columns)).encode())
+    h.update(pd.util.hash_pandas_object(prices, index=True).values.tobytes())
+    return h.hexdigest()
+
+
+def results_fingerprint(optimizer):
+    """
+    Impronta di tutto ciò che finisce nei grafici di un ottimizzatore:
+    prezzi, parametri, pesi e metriche delle strategie, benchmark scelto.
+    """
+    h = hashlib.sha1(price_fingerprint(optimizer.prices).encode())
+    h.update(repr((
+        optimizer.risk_free_rate, optimizer.min_weight, optimizer.max_concentration,
+        optimizer.sector_limits, optimizer.target_volatility,
+        optimizer.start_date, optimizer.end_date, optimizer.n_resamples,
+        (optimizer.best_benchmark or {}).get('ticker'),
+    )).encode())
+    for name, data in optimizer.results.items():
+        h.update(name.encode())
+        h.update(np.asarray(data['weights'], dtype=float).tobytes())
+        for key in RESULT_METRIC_KEYS:
+            if key in data:
+                h.update(key.encode())
+                h.update(np.float64(data[key]).tobytes())
+    return h.hexdigest()
+
+
+class LRUCache:
+    """
+    Base delle cache LRU limitate e thread-safe: al più maxsize voci,
+    scarta la meno usata e conta hit e miss.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _lookup(self, key):
+        """Restituisce (trovato, valore); aggiorna l'ordine LRU e i contatori."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def _store(self, key, value):
+        """Inserisce un valore, scartando il meno usato oltre maxsize."""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        """Contatori della cache: hit, miss, dimensione attuale e massima."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'size': len(self._entries), 'maxsize': self.maxsize}
+
+
+class ResultCache(LRUCache):
+    """
+    Cache LRU limitata degli ottimizzatori già eseguiti.
+
+    La chiave combina l'impronta dei prezzi con i parametri che cambiano il
+    risultato (pesi min/max, risk-free, limiti settoriali, volatilità target,
+    periodo, da cui dipende il benchmark, e campioni della Resampled).
+    Conta hit e miss. La cache è condivisa tra sessioni: put e get lavorano
+    su copie indipendenti (detached_copy), mai sull'oggetto in cache.
+    """
+
+    def __init__(self, maxsize=16):
+        super().__init__(maxsize)
+
+    @staticmethod
+    def make_key(prices, min_weight, max_weight, risk_free_rate, sector_limits,
+                 target_volatility, start_date=None, end_date=None, n_resamples=0):
+        """Chiave di cache per un pannello prezzi e un insieme di parametri."""
+        if isinstance(sector_limits, dict):
+            sector_limits = tuple(sorted((k, round(float(v), 6)) for k, v in sector_limits.items()))
+        return (
+            price_fingerprint(prices),
+            round(float(min_weight), 6), round(float(max_weight), 6),
+            round(float(risk_free_rate), 6), sector_limits,
+            None if target_volatility is None else round(float(target_volatility), 6),
+            str(start_date), str(end_date), int(n_resamples or 0),
+        )
+
+    @staticmethod
+    def data_part(key):
+        """Parte della chiave che non dipende dai vincoli: prezzi, risk-free e periodo."""
+        return key[0], key[3], key[6], key[7]
+
+    def get(self, key):
+        """Copia del valore in cache (None se assente)."""
+        found, value = self._lookup(key)
+        return value.detached_copy() if found else None
+
+    def put(self, key, value):
+        """Inserisce una copia del valore, scartando il meno usato oltre maxsize."""
+        self._store(key, value.detached_copy())
+
+
+# ════════════════════════════════════════════════════════════════════════════════
+# CACHE DEI GRAFICI
+# ════════════════════════════════════════════════════════════════════════════════
+
+def render_figure(fig, fmt='png', dpi=150):
+    """Serializza una figura matplotlib in bytes (PNG o SVG) e la chiude."""
+    buf = io.BytesIO()
+    fig.savefig(buf, format=fmt, dpi=dpi, bbox_inches='tight', facecolor=fig.get_facecolor())
+    plt.close(fig)
+    return buf.getvalue()
+
+
+class FigureCache(LRUCache):
+    """
+    Cache LRU dei grafici già renderizzati, come bytes PNG/SVG.
+
+    La chiave è (results_fingerprint, nome del grafico, formato, opzioni): a parità di
+    risultati un rerun serve i bytes senza ricostruire la figura, né rifare
+    i solve della frontiera. I grafici non disponibili (None) sono memorizzati
+    anch'essi.
+    """
+
+    def __init__(self, maxsize=64):
+        super().__init__(maxsize)
+
+    def render(self, optimizer, name, fmt='png', fingerprint=None, **options):
+        """
+        Bytes del grafico optimizer.plot_<name>(**options) (None se non
+        disponibile). fingerprint evita di ricalcolare results_fingerprint
+        se già noto; le opzioni fanno parte della chiave.
+        """
+        key = (fingerprint or results_fingerprint(optimizer), name, fmt,
+               tuple(sorted(options.items())))
+        found, data = self._lookup(key)
+        if found:
+            return data
+        
+        fig = getattr(optimizer, f'plot_{name}')(**options)
+        data = None if fig is None else render_figure(fig, fmt)
+        self._store(key, data)
+        return data
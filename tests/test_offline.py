@@ -0,0 +1,279 @@
+"""Test offline del download e di una strategia, con una sorgente prezzi locale."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import optimizer_core as oc
+
+
+@pytest.fixture
+def prices():
+    rng = np.random.default_rng(0)
+    days = pd.bdate_range('2020-01-01', '2023-12-29')
+    symbols = ['AAA', 'BBB.DE', 'CCC', 'DDD.L', 'EEE', 'FFF']
+    walk = np.cumsum(rng.normal(3e-4, 0.01, (len(days), len(symbols))), axis=0)
+    return pd.DataFrame(100 * np.exp(walk), index=days, columns=symbols)
+
+
+def test_fetch_prices_batches_and_resolves_suffixes(prices):
+    source = oc.LocalPriceSource(prices)
+    tickers = ['AAA', 'BBB', 'CCC', 'DDD', 'ZZZ']
+
+    data, errors = oc.fetch_prices(tickers, '2020-01-01', '2024-01-01', source=source)
+
+    assert sorted(data) == ['AAA', 'BBB', 'CCC', 'DDD']
+    assert errors == ['ZZZ']
+    pd.testing.assert_series_equal(data['BBB'], source.prices['BBB.DE'], check_names=False)
+    # Prima fase: una sola richiesta multi-simbolo con tutti i ticker
+    assert source.calls[0][0] == tuple(tickers)
+    # Le fasi con suffisso chiedono solo i ticker ancora mancanti
+    assert all(set(symbols).isdisjoint({'AAA', 'CCC'}) for symbols, _, _ in source.calls[1:])
+
+
+def test_load_prices_serves_repeated_windows_from_cache(prices):
+    source = oc.LocalPriceSource(prices)
+    cache = oc.PriceWindowCache()
+    tickers = ['AAA', 'CCC', 'ZZZ']
+
+    first, errors = oc.load_prices(tickers, '2020-01-01', '2023-01-01', source=source, cache=cache)
+    n_calls = len(source.calls)
+    second, _ = oc.load_prices(tickers, '2021-01-01', '2022-01-01', source=source, cache=cache)
+
+    assert errors == ['ZZZ']
+    assert len(source.calls) == n_calls
+    assert second['AAA'].index.min() >= pd.Timestamp('2021-01-01')
+    assert second['AAA'].index.max() < pd.Timestamp('2022-01-01')
+
+
+def test_max_sharpe_on_local_prices(prices):
+    data, _ = oc.fetch_prices(['AAA', 'BBB', 'CCC', 'DDD', 'EEE', 'FFF'], '2020-01-01',
+                              '2024-01-01', source=oc.LocalPriceSource(prices))
+    weekly, returns = oc.build_weekly_panel(data)
+    optimizer = oc.PortfolioOptimizer(list(weekly.columns), weekly, returns, min_weight=0.05,
+                                      max_concentration=0.4, sector_limits=False)
+
+    optimizer.optimize_max_sharpe()
+
+    weights = optimizer.results['sharpe']['weights']
+    assert weights.sum() == pytest.approx(1, abs=1e-6)
+    assert weights.min() >= 0.05 - 1e-6
+    assert weights.max() <= 0.4 + 1e-6
+    assert np.isfinite(optimizer.results['sharpe']['sharpe'])
+
+
+def test_price_store_bridges_windows_outside_coverage(prices):
+    source = oc.LocalPriceSource(prices)
+    store = oc.PriceStore(':memory:')
+    oc.fetch_prices(['AAA'], '2022-01-01', '2023-06-01', source=source, store=store)
+
+    data, _ = oc.fetch_prices(['AAA'], '2020-01-01', '2021-01-01', source=source, store=store)
+    n_calls = len(source.calls)
+    again, _ = oc.fetch_prices(['AAA'], '2020-01-01', '2021-01-01', source=source, store=store)
+
+    assert store.coverage('AAA') == ('2020-01-01', '2023-06-01')
+    assert len(source.calls) == n_calls
+    pd.testing.assert_series_equal(again['AAA'], data['AAA'])
+
+
+class FlakySource(oc.LocalPriceSource):
+    """Sorgente locale che fallisce finché `down` è vero, come una rete assente."""
+
+    down = True
+
+    def __call__(self, symbols, start_date, end_date):
+        if self.down:
+            self.calls.append((tuple(symbols), start_date, end_date))
+            raise ConnectionError("rete non disponibile")
+        return super().__call__(symbols, start_date, end_date)
+
+
+def test_failed_download_does_not_mark_ticker_dead(prices):
+    source = FlakySource(prices)
+    store = oc.PriceStore(':memory:')
+
+    data, errors = oc.fetch_prices(['AAA'], '2020-01-01', '2021-01-01', source=source, store=store)
+    assert data == {} and errors == ['AAA']
+    assert store.resolution('AAA') is None
+
+    source.down = False
+    data, errors = oc.fetch_prices(['AAA'], '2020-01-01', '2021-01-01', source=source, store=store)
+    assert errors == [] and 'AAA' in data
+    assert store.resolution('AAA') == 'AAA'
+
+
+def test_window_cache_expires_provisional_windows(prices, monkeypatch):
+    cache = oc.PriceWindowCache(provisional_ttl=60)
+    series = prices['AAA']
+    today = pd.Timestamp.today().normalize()
+    cache.put('AAA', series, '2020-01-01', today + pd.Timedelta(days=1))
+    cache.put('CCC', prices['CCC'], '2020-01-01', '2021-01-01')
+    assert cache.get('AAA', '2021-01-01', today)[0]
+
+    now = oc.time.monotonic()
+    monkeypatch.setattr(oc.time, 'monotonic', lambda: now + 120)
+    assert cache.get('AAA', '2021-01-01', today) == (False, None)
+    # Le finestre interamente passate non scadono
+    assert cache.get('CCC', '2020-06-01', '2020-12-01')[0]
+
+
+def test_window_cache_keeps_wider_empty_window(prices):
+    cache = oc.PriceWindowCache()
+    cache.put('AAA', None, '2020-01-01', '2023-01-01')
+    cache.put('AAA', prices['AAA'], '2021-01-01', '2022-01-01')
+
+    assert cache.get('AAA', '2020-01-01', '2023-01-01') == (True, None)
+    assert cache.get('AAA', '2021-01-01', '2022-01-01') == (True, None)
+
+    # Una finestra più ampia con dati sostituisce quella vuota più stretta
+    cache.put('BBB', None, '2021-01-01', '2022-01-01')
+    cache.put('BBB', prices['CCC'], '2020-01-01', '2023-01-01')
+    hit, series = cache.get('BBB', '2021-01-01', '2022-01-01')
+    assert hit and len(series) > 0
+
+
+def test_constrained_risk_parity_equalizes_free_contributions():
+    rng = np.random.default_rng(1)
+    n = 40
+    B = rng.normal(0, 1, (n, 3))
+    vol = rng.uniform(0.05, 0.6, n)
+    corr = B @ B.T + np.diag(rng.uniform(0.5, 2, n))
+    corr /= np.outer(np.sqrt(np.diag(corr)), np.sqrt(np.diag(corr)))
+    cov = corr * np.outer(vol, vol)
+    sectors = [(list(range(10)), 0.15)]
+
+    w = oc.constrained_erc_weights(cov, 0.005, 0.05, sectors)
+
+    assert w is not None and w.sum() == pytest.approx(1, abs=1e-8)
+    assert w.min() >= 0.005 - 1e-9 and w.max() <= 0.05 + 1e-9
+    assert w[:10].sum() <= 0.15 + 1e-9
+    # Gli asset lontani dai vincoli hanno lo stesso contributo al rischio
+    rc = w * (cov @ w)
+    free = (w > 0.005 + 1e-6) & (w < 0.05 - 1e-6)
+    free[:10] &= w[:10].sum() < 0.15 - 1e-6
+    assert free.sum() > 5
+    assert np.ptp(rc[free]) <= 1e-6 * rc[free].mean()
+    pd.testing.assert_series_equal(pd.Series(oc.solve_risk_parity(cov, 0.005, 0.05, sectors)),
+                                   pd.Series(w))
+
+
+# ════════════════════════════════════════════════════════════════════════════════
+# EQUIVALENZA DELLE VERSIONI VELOCI CON QUELLE DI RIFERIMENTO
+# ════════════════════════════════════════════════════════════════════════════════
+
+@pytest.fixture
+def weekly(prices):
+    data, _ = oc.fetch_prices(list(prices.columns), '2020-01-01', '2024-01-01',
+                              source=oc.LocalPriceSource(prices))
+    return oc.build_weekly_panel(data)
+
+
+def test_simulate_rebalancing_matches_reference_loop(weekly):
+    R = weekly[1].to_numpy() / 100
+    W = np.random.default_rng(2).dirichlet(np.ones(R.shape[1]), 3)
+    flags = oc.rebalance_flags(weekly[1].index, 'monthly')
+
+    sim = oc.simulate_rebalancing(R, W, flags, cost_bps=25)
+
+    for k, target in enumerate(W):
+        held, net = target.copy(), []
+        for t, r in enumerate(R):
+            turnover = np.abs(target - held / held.sum()).sum() if flags[t] and t else 0.0
+            if flags[t]:
+                held = target.copy()
+            value = held.sum()
+            held = held * (1 + r)
+            net.append((1 - turnover * 25 / 10000) * held.sum() / value - 1)
+        np.testing.assert_allclose(sim['returns'][:, k], net, atol=1e-12)
+    # Ribilanciamento settimanale senza costi: rendimenti R @ W.T
+    weekly_sim = oc.simulate_rebalancing(R, W, oc.rebalance_flags(weekly[1].index, 'weekly'))
+    np.testing.assert_allclose(weekly_sim['returns'], R @ W.T, atol=1e-12)
+
+
+def test_append_bars_matches_full_rebuild(prices):
+    cut = pd.Timestamp('2023-06-30')
+
+    def build(end):
+        data, _ = oc.fetch_prices(list(prices.columns), '2020-01-01', '2024-01-01',
+                                  source=oc.LocalPriceSource(prices[:end]))
+        weekly, returns = oc.build_weekly_panel(data)
+        return oc.PortfolioOptimizer(list(weekly.columns), weekly, returns, sector_limits=False)
+
+    optimizer = build(cut)
+    optimizer.optimize_max_sharpe()
+    weights = optimizer.results['sharpe']['weights']
+    for day in prices.index[prices.index > cut]:
+        optimizer.append_bars(prices.loc[[day]])
+
+    reference = build(prices.index[-1])
+    pd.testing.assert_frame_equal(optimizer.prices, reference.prices, check_freq=False)
+    np.testing.assert_allclose(optimizer.mu, reference.mu, atol=1e-10)
+    np.testing.assert_allclose(optimizer.S, reference.S, atol=1e-10)
+    expected = reference.stats(weights)
+    for metric, value in expected.items():
+        assert optimizer.results['sharpe'][metric] == pytest.approx(value, abs=1e-8), metric
+
+
+def test_rolling_moments_match_pypfopt(weekly):
+    prices = weekly[0]
+    R = prices.pct_change().dropna().to_numpy()
+    moments = oc.RollingMoments(R[:100])
+    moments.slide(R[100:150], R[:50])
+
+    window = prices.iloc[50:151]
+    np.testing.assert_allclose(moments.mean(),
+                               oc.expected_returns.mean_historical_return(window, frequency=52),
+                               rtol=1e-10)
+    np.testing.assert_allclose(moments.cov(), oc.risk_models.sample_cov(window, frequency=52),
+                               rtol=1e-10, atol=1e-14)
+
+
+def test_hrp_weights_match_hrpopt(weekly):
+    returns = weekly[1] / 100
+    expected = oc.pypfopt.HRPOpt(returns).optimize()
+
+    w = oc.hrp_weights(returns.cov(), returns.corr())
+
+    np.testing.assert_allclose(w, [expected[t] for t in returns.columns], atol=1e-12)
+
+
+def test_erc_weights_equalize_risk_contributions(weekly):
+    cov = oc.risk_models.sample_cov(weekly[0], frequency=52).to_numpy()
+
+    w = oc.erc_weights(cov)
+
+    rc = w * (cov @ w)
+    assert w.sum() == pytest.approx(1) and w.min() > 0
+    np.testing.assert_allclose(rc, rc.mean(), rtol=1e-8)
+
+
+def test_lttb_keeps_endpoints_and_one_point_per_bucket():
+    rng = np.random.default_rng(3)
+    x = np.arange(1000)
+    y = np.cumsum(rng.normal(size=1000))
+
+    idx = oc.lttb_indices(x, y, 100)
+
+    assert len(idx) == 100 and idx[0] == 0 and idx[-1] == 999
+    assert np.all(np.diff(idx) > 0)
+    edges = np.linspace(1, 999, 99).astype(int)
+    assert np.array_equal(np.searchsorted(edges, idx[1:-1], side='right'), np.arange(1, 99))
+    assert np.array_equal(oc.lttb_indices(x[:50], y[:50], 100), np.arange(50))
+
+
+def test_vectorized_find_best_matches_loop(prices, weekly):
+    candidates = [{'ticker': t, 'name': t} for t in ['AAA', 'CCC', 'EEE', 'FFF']]
+    port_returns = weekly[1][['BBB.DE', 'DDD.L']].mean(axis=1)
+    port_metrics = {'vol': float(port_returns.std() * np.sqrt(52))}
+
+    def analyzer():
+        return oc.BenchmarkAnalyzer('2020-01-01', '2024-01-01',
+                                    source=oc.LocalPriceSource(prices))
+
+    loop = analyzer().find_best(port_returns, port_metrics, candidates)
+    fast = analyzer().find_best(port_returns, port_metrics, candidates, vectorized=True)
+
+    assert fast['ticker'] == loop['ticker']
+    for key in ('score', 'correlation', 'tracking_error', 'beta', 'sharpe', 'volatility',
+                'max_drawdown'):
+        assert fast[key] == pytest.approx(loop[key], rel=1e-9), key